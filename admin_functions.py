@@ -31,13 +31,19 @@ from database import (
     cargar_configuracion_usuarios, guardar_configuracion_usuarios,
     cargar_config_sistema, guardar_config_sistema,
     cargar_config_pvd, guardar_config_pvd,
-    cargar_cola_pvd_grupo, guardar_cola_pvd_grupo,
+    cargar_cola_pvd_grupo, actualizar_pausa_pvd,
     obtener_todas_colas_pvd, consolidar_colas_pvd,
-    limpiar_todas_colas_antiguas
+    limpiar_todas_colas_antiguas, estado_pvd, migrar_colas_pvd_a_sqlite
 )
+import pvd_cola_db
 
 # Sistema PVD
-from pvd_system import temporizador_pvd_mejorado
+from pvd_system import temporizador_pvd_mejorado, INTERVALO_REVISION_COMPLETA
+from pvd_supervisor import obtener_supervisor
+from pvd_lista_espera import ListaEspera
+from pvd_tiempos import sello, epoch, limites_dia, es_del_dia
+from pvd_refresco import refrescar_al_cambiar
+import pvd_historico
 
 # Utilidades
 from utils import obtener_hora_madrid, formatear_hora_madrid
@@ -1008,6 +1014,28 @@ def _crear_usuario_tab(usuarios_config, grupos_pvd):
 # FUNCIONES DE GESTIÓN PVD (PAUSAS VISUALES DINÁMICAS)
 # ==============================================
 
+def _mostrar_almacenamiento_colas_pvd():
+    """Dónde se guardan las colas PVD y migración a SQLite para varias réplicas"""
+    st.write("### 🗄️ Almacenamiento de Colas PVD")
+    
+    if pvd_cola_db.backend_activo():
+        st.success("✅ Colas en SQLite: varias réplicas pueden compartir data/ sin perder cambios")
+        return
+    
+    st.info(
+        "Las colas se guardan en archivos JSON, válidos con un solo proceso. "
+        "Si la aplicación corre en varias réplicas sobre el mismo data/, migra "
+        "las colas a SQLite (o arranca con PVD_COLAS_SQLITE=1)."
+    )
+    if st.button("🗄️ Migrar colas PVD a SQLite", key="migrar_colas_sqlite"):
+        grupos = migrar_colas_pvd_a_sqlite()
+        if grupos < 0:
+            st.error("❌ Error migrando las colas PVD a SQLite")
+        else:
+            st.success(f"✅ Colas PVD en SQLite ({grupos} grupos migrados)")
+            st.rerun()
+
+
 def gestion_pvd_admin():
     """Administración del sistema PVD con grupos"""
     st.subheader("👁️ Administración PVD (Pausa Visual Dinámica)")
@@ -1015,6 +1043,9 @@ def gestion_pvd_admin():
     hora_actual_madrid = obtener_hora_madrid().strftime('%H:%M:%S')
     st.caption(f"🕒 **Hora del servidor (Madrid):** {hora_actual_madrid}")
     
+    # El panel se actualiza solo cuando cambia alguna cola
+    refrescar_al_cambiar(estado_pvd.grupos(), clave='admin')
+    
     config_pvd = cargar_config_pvd()
     todas_colas = obtener_todas_colas_pvd()
     cola_consolidada = consolidar_colas_pvd()
@@ -1095,6 +1126,8 @@ def gestion_pvd_admin():
         st.session_state.active_admin_tab = "Usuarios"
         st.rerun()
     
+    _mostrar_almacenamiento_colas_pvd()
+    
     # Estadísticas actuales
     st.markdown("---")
     st.write("### 📊 Estado Actual del Sistema")
@@ -1104,28 +1137,18 @@ def gestion_pvd_admin():
     en_espera = 0
     completados_hoy = 0
     cancelados_hoy = 0
-    hoy = obtener_hora_madrid().date()
+    hoy = limites_dia(obtener_hora_madrid())
     
     for grupo_id, cola_grupo in todas_colas.items():
         en_pausa += len([p for p in cola_grupo if p['estado'] == 'EN_CURSO'])
         en_espera += len([p for p in cola_grupo if p['estado'] == 'ESPERANDO'])
         
         for pausa in cola_grupo:
-            if pausa['estado'] == 'COMPLETADO' and 'timestamp_fin' in pausa:
-                try:
-                    fecha_fin = datetime.fromisoformat(pausa['timestamp_fin']).date()
-                    if fecha_fin == hoy:
-                        completados_hoy += 1
-                except:
-                    pass
+            if pausa['estado'] == 'COMPLETADO' and es_del_dia(pausa, 'timestamp_fin', hoy):
+                completados_hoy += 1
             
-            if pausa['estado'] == 'CANCELADO' and 'timestamp_solicitud' in pausa:
-                try:
-                    fecha_solicitud = datetime.fromisoformat(pausa['timestamp_solicitud']).date()
-                    if fecha_solicitud == hoy:
-                        cancelados_hoy += 1
-                except:
-                    pass
+            if pausa['estado'] == 'CANCELADO' and es_del_dia(pausa, 'timestamp_solicitud', hoy):
+                cancelados_hoy += 1
     
     temporizadores_activos = len(temporizador_pvd_mejorado.temporizadores_activos)
     notificaciones_pendientes = len(temporizador_pvd_mejorado.notificaciones_pendientes)
@@ -1144,10 +1167,8 @@ def gestion_pvd_admin():
     with col_stat6:
         st.metric("🔔 Notificaciones", notificaciones_pendientes)
     
-    # Información del temporizador automático
-    st.info(f"⏱️ **Temporizador automático:** Ejecutándose cada {config_pvd.get('intervalo_temporizador', 60)} segundos")
-    if hasattr(temporizador_pvd_mejorado, 'ultima_actualizacion'):
-        st.caption(f"Última ejecución: {formatear_hora_madrid(temporizador_pvd_mejorado.ultima_actualizacion)}")
+    # Salud del temporizador automático
+    _mostrar_salud_temporizador()
     
     # Pausas en curso
     st.markdown("---")
@@ -1174,6 +1195,110 @@ def gestion_pvd_admin():
     # Temporizadores activos
     if temporizadores_activos > 0:
         _mostrar_temporizadores_activos_grupos(temporizador_pvd_mejorado, todas_colas)
+    
+    # Histórico de pausas
+    _mostrar_historico_pvd()
+
+
+def _mostrar_salud_temporizador():
+    """Estado del hilo del temporizador PVD (pvd_supervisor)"""
+    st.markdown("---")
+    st.write("### 🩺 Salud del Temporizador")
+    
+    supervisor = obtener_supervisor()
+    estado = supervisor.estado()
+    
+    col_s1, col_s2, col_s3, col_s4, col_s5 = st.columns(5)
+    with col_s1:
+        st.metric("Hilo", "🟢 Vivo" if estado['vivo'] else "🔴 Parado")
+    with col_s2:
+        st.metric("Líder", "✅ Sí" if estado['lider'] else "➖ No")
+    with col_s3:
+        segundos = estado['segundos_desde_ultima']
+        st.metric("Última vuelta", f"hace {segundos:.0f} s" if segundos is not None else "—")
+    with col_s4:
+        st.metric("Vueltas", estado['vueltas'])
+    with col_s5:
+        st.metric("Errores", estado['errores'])
+    
+    detalles = []
+    if estado['p50_ms'] is not None:
+        detalles.append(f"Duración p50 {estado['p50_ms']:.1f} ms · p95 {estado['p95_ms']:.1f} ms")
+    if estado['proximo_plazo_segundos'] is not None:
+        detalles.append(f"próximo plazo en {estado['proximo_plazo_segundos']:.0f} s")
+    if estado['iniciado']:
+        detalles.append(f"arrancado a las {formatear_hora_madrid(estado['iniciado'])}")
+    if detalles:
+        st.caption(" · ".join(detalles))
+    
+    if estado['vivo'] and not estado['lider']:
+        st.info("ℹ️ Otro proceso es el líder: es quien procesa las colas")
+    if estado['ultimo_error']:
+        st.error(f"Último error ({formatear_hora_madrid(estado['momento_ultimo_error'])}): {estado['ultimo_error']}")
+    
+    col_hist, col_colas = st.columns(2)
+    with col_hist:
+        st.write("**⏱️ Duración de las vueltas**")
+        if estado['vueltas']:
+            df_hist = pd.DataFrame({'Vueltas': list(estado['histograma'].values())},
+                                   index=list(estado['histograma'].keys()))
+            st.bar_chart(df_hist)
+        else:
+            st.caption("Sin vueltas todavía")
+    with col_colas:
+        st.write("**📋 Tamaño de las colas**")
+        if estado['colas']:
+            df_colas = pd.DataFrame.from_dict(estado['colas'], orient='index')
+            st.dataframe(df_colas.rename(columns={'esperando': 'Esperando', 'en_curso': 'En curso',
+                                                  'total': 'Total'}),
+                         use_container_width=True)
+        else:
+            st.caption("No hay colas")
+    
+    col_b1, col_b2 = st.columns(2)
+    with col_b1:
+        if st.button("▶️ Iniciar temporizador", disabled=estado['vivo'], key="iniciar_temporizador_pvd"):
+            supervisor.iniciar(temporizador_pvd_mejorado, INTERVALO_REVISION_COMPLETA)
+            st.success("✅ Temporizador iniciado")
+            st.rerun()
+    with col_b2:
+        if st.button("⏹️ Detener temporizador", disabled=not estado['vivo'], key="detener_temporizador_pvd"):
+            if supervisor.detener():
+                st.success("✅ Temporizador detenido")
+            else:
+                st.error("❌ El hilo no se detuvo a tiempo")
+            st.rerun()
+
+
+def _mostrar_historico_pvd():
+    """Estadísticas diarias del histórico PVD (agregados ya calculados)"""
+    st.markdown("---")
+    st.write("### 📚 Histórico de Pausas")
+    
+    fechas = pvd_historico.fechas_disponibles()
+    if not fechas:
+        st.info("📭 Todavía no hay pausas archivadas")
+        return
+    
+    fecha = st.selectbox("Día", fechas, key="historico_pvd_fecha")
+    resumen = pvd_historico.resumen_dia(fecha)
+    
+    columnas = {'pausas': 'Pausas', 'minutos': 'Minutos', 'espera_media': 'Espera media (min)',
+                'canceladas': 'Canceladas'}
+    
+    st.write("**👥 Por grupo**")
+    df_grupos = pd.DataFrame.from_dict(resumen['grupos'], orient='index')
+    st.dataframe(df_grupos.rename(columns=columnas), use_container_width=True)
+    
+    st.write("**👤 Por agente**")
+    df_agentes = pd.DataFrame.from_dict(resumen['agentes'], orient='index')
+    if not df_agentes.empty:
+        df_agentes = df_agentes.sort_values('pausas', ascending=False)
+    st.dataframe(df_agentes.rename(columns={**columnas, 'nombre': 'Nombre'}), use_container_width=True)
+    
+    with open(pvd_historico.ruta_csv(fecha), 'rb') as f:
+        st.download_button("📥 Descargar CSV del día", f.read(), file_name=f"pvd_{fecha}.csv",
+                           mime="text/csv", key="descargar_historico_pvd")
 
 
 def _mostrar_pausa_en_curso_grupo(pausa, grupo_id, cola_grupo, config_pvd, grupos_config):
@@ -1194,7 +1319,7 @@ def _mostrar_pausa_en_curso_grupo(pausa, grupo_id, cola_grupo, config_pvd, grupo
                 max_simultaneo = config_pvd.get('maximo_simultaneo', 3)
             
             tiempo_inicio = datetime.fromisoformat(pausa['timestamp_inicio'])
-            tiempo_transcurrido = int((obtener_hora_madrid() - tiempo_inicio).total_seconds() / 60)
+            tiempo_transcurrido = int((obtener_hora_madrid().timestamp() - epoch(pausa, 'timestamp_inicio')) / 60)
             tiempo_restante = max(0, duracion_minutos - tiempo_transcurrido)
             
             progreso = min(100, (tiempo_transcurrido / duracion_minutos) * 100)
@@ -1218,9 +1343,10 @@ def _mostrar_pausa_en_curso_grupo(pausa, grupo_id, cola_grupo, config_pvd, grupo
         
         with col_acciones:
             if st.button("✅ Finalizar", key=f"fin_{pausa['id']}_{grupo_id}", use_container_width=True):
-                pausa['estado'] = 'COMPLETADO'
-                pausa['timestamp_fin'] = obtener_hora_madrid().isoformat()
-                guardar_cola_pvd_grupo(grupo_id, cola_grupo)
+                actualizar_pausa_pvd(grupo_id, pausa['id'], {
+                    'estado': 'COMPLETADO',
+                    **sello('timestamp_fin', obtener_hora_madrid())
+                })
                 
                 # Notificar al siguiente en este grupo (si existe la función)
                 if hasattr(temporizador_pvd_mejorado, '_iniciar_siguiente_automatico_grupo'):
@@ -1236,8 +1362,7 @@ def _mostrar_pausa_en_curso_grupo(pausa, grupo_id, cola_grupo, config_pvd, grupo
                 st.rerun()
             
             if st.button("❌ Cancelar", key=f"cancel_{pausa['id']}_{grupo_id}", use_container_width=True):
-                pausa['estado'] = 'CANCELADO'
-                guardar_cola_pvd_grupo(grupo_id, cola_grupo)
+                actualizar_pausa_pvd(grupo_id, pausa['id'], {'estado': 'CANCELADO'})
                 st.warning(f"⚠️ Pausa #{pausa['id']} cancelada")
                 st.rerun()
         
@@ -1250,10 +1375,9 @@ def _mostrar_cola_espera_grupos(todas_colas, config_pvd, temporizador, grupos_co
     
     # Procesar cada grupo
     for grupo_id, cola_grupo in todas_colas.items():
-        pausas_espera = [p for p in cola_grupo if p['estado'] == 'ESPERANDO']
+        pausas_espera = list(ListaEspera(cola_grupo))
         
         if pausas_espera:
-            pausas_espera = sorted(pausas_espera, key=lambda x: datetime.fromisoformat(x['timestamp_solicitud']))
             
             with st.expander(f"**Grupo: {grupo_id}** ({len(pausas_espera)} en espera)", expanded=True):
                 for i, pausa in enumerate(pausas_espera):
@@ -1303,10 +1427,11 @@ def _mostrar_pausa_en_espera_grupo(pausa, indice, grupo_id, cola_grupo, config_p
                 if st.button("▶️ Iniciar", 
                              key=f"iniciar_{grupo_id}_{pausa['id']}_{indice}",  # Añadí indice para más unicidad
                              use_container_width=True):
-                    pausa['estado'] = 'EN_CURSO'
-                    pausa['timestamp_inicio'] = obtener_hora_madrid().isoformat()
-                    pausa['confirmado'] = True
-                    guardar_cola_pvd_grupo(grupo_id, cola_grupo)
+                    actualizar_pausa_pvd(grupo_id, pausa['id'], {
+                        'estado': 'EN_CURSO',
+                        **sello('timestamp_inicio', obtener_hora_madrid()),
+                        'confirmado': True
+                    })
                     
                     temporizador.cancelar_temporizador(pausa['usuario_id'])
                     
@@ -25,7 +25,10 @@ def calcular_sph_acumulado_agente(agente_id, mes_key=None):
         ventas_agentes = cargar_ventas_agentes()
         registro_llamadas = cargar_registro_llamadas()
         horarios_agentes = cargar_horarios_agentes()
-        ausencias_agentes = cargar_ausencias_agentes()
+        # El cálculo puede asomarse a los primeros días del mes siguiente
+        año, mes = map(int, mes_key.split("-"))
+        mes_siguiente = f"{año + mes // 12}-{mes % 12 + 1:02d}"
+        ausencias_agentes = cargar_ausencias_agentes(meses=[mes_key, mes_siguiente])
         festivos_data = cargar_festivos()
         
         # Usar la función de agent_calculations.py
@@ -111,10 +114,9 @@ def mostrar_performance_sidebar(usuario_id):
     """Muestra el rendimiento del agente en el sidebar"""
     try:
         # Cargar métricas para obtener objetivo SPH
-        metricas = cargar_metricas_agentes()
-        
         hoy = datetime.now()
         mes_key = f"{hoy.year}-{hoy.month:02d}"
+        metricas = cargar_metricas_agentes(meses=[mes_key])
         
         # Calcular SPH acumulado usando la nueva función
         datos_sph = calcular_sph_acumulado_agente(usuario_id, mes_key)
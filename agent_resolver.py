@@ -0,0 +1,140 @@
+import threading
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+# ==============================================
+# RESOLUCIÓN DE AGENTES DEL CSV AL SISTEMA
+# ==============================================
+#
+# Los CSV del marcador traen el agente escrito de muchas formas ('0733',
+# 'TZS0733', ' tzs0733 ', el nombre...). La importación al registro, el
+# análisis (alertas SMS) y la depuración de agentes usan el mismo
+# ResolvedorAgentes, construido una vez por versión de los agentes de
+# super_users.json (obtener_resolvedor), para que todas las pantallas
+# asignen cada agente del CSV al mismo agente del sistema.
+#
+# Orden de búsqueda (la primera que acierta):
+#   1. Exacta contra las variantes: id, últimos 4 caracteres, id sin 'TZS',
+#      solo los dígitos del id y nombre
+#   2. Quitando 'TZS' al agente del CSV
+#   3. Mismos dígitos que alguna variante
+#   4. Contenido: una variante dentro del agente del CSV o al revés
+#
+# 1-3 son búsquedas en diccionarios; la 4 recorre las variantes, pero cada
+# texto del CSV se resuelve una sola vez (memo), así que en un CSV grande
+# el coste por fila es O(1) amortizado.
+
+# Textos distintos recordados por resolvedor
+MEMO_MAXIMO = 20000
+
+
+def _digitos(texto: str) -> str:
+    return ''.join(filter(str.isdigit, texto))
+
+
+class ResolvedorAgentes:
+    """Asigna agentes del CSV a agentes del sistema"""
+
+    def __init__(self, agentes_sistema: Dict):
+        """
+        Args:
+            agentes_sistema: {agent_id: {'nombre': ...}} de super_users.json
+        """
+        self.agentes_sistema = agentes_sistema
+
+        # Variantes de búsqueda (las últimas pisan a las primeras)
+        self.variantes = {}
+        for agent_id in agentes_sistema.keys():
+            agent_id_str = str(agent_id).strip().upper()
+
+            self.variantes[agent_id_str] = agent_id
+
+            if len(agent_id_str) >= 4:
+                self.variantes[agent_id_str[-4:]] = agent_id
+
+            if agent_id_str.startswith('TZS'):
+                self.variantes[agent_id_str[3:]] = agent_id
+
+            solo_numeros = _digitos(agent_id_str)
+            if solo_numeros and solo_numeros != agent_id_str:
+                self.variantes[solo_numeros] = agent_id
+
+        for agent_id, info in agentes_sistema.items():
+            nombre = str(info.get('nombre', '')).strip().upper()
+            if nombre:
+                self.variantes[nombre] = agent_id
+
+        # Dígitos de cada variante → agente (gana la primera variante)
+        self.por_digitos = {}
+        for clave, agent_id in self.variantes.items():
+            numeros = _digitos(clave)
+            if numeros:
+                self.por_digitos.setdefault(numeros, agent_id)
+
+        self._variantes_ordenadas = list(self.variantes.items())
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def _buscar(self, agente_upper: str):
+        # 1. Búsqueda exacta
+        if agente_upper in self.variantes:
+            return self.variantes[agente_upper]
+
+        # 2. Quitar "TZS"
+        if agente_upper.startswith('TZS') and agente_upper[3:] in self.variantes:
+            return self.variantes[agente_upper[3:]]
+
+        # 3. Solo números
+        numeros = _digitos(agente_upper)
+        if numeros and numeros in self.por_digitos:
+            return self.por_digitos[numeros]
+
+        # 4. Búsqueda por contenido
+        for clave, agent_id in self._variantes_ordenadas:
+            if clave in agente_upper or agente_upper in clave:
+                return agent_id
+
+        return None
+
+    def resolver(self, agente_csv) -> Optional[str]:
+        """Agente del sistema para un agente del CSV (None si no hay coincidencia)"""
+        agente_upper = str(agente_csv).strip().upper()
+
+        agent_id = self._memo.get(agente_upper, False)
+        if agent_id is not False:
+            return agent_id
+
+        agent_id = self._buscar(agente_upper) or None
+        with self._lock:
+            if len(self._memo) >= MEMO_MAXIMO:
+                self._memo.clear()
+            self._memo[agente_upper] = agent_id
+        return agent_id
+
+    def resolver_con_nombre(self, agente_csv) -> Tuple[Optional[str], Optional[str]]:
+        """(agent_id, nombre) del sistema, o (None, None)"""
+        agent_id = self.resolver(agente_csv)
+        if agent_id is None:
+            return None, None
+        return agent_id, self.agentes_sistema.get(agent_id, {}).get('nombre', '')
+
+    def es_exacta(self, agente_csv, agent_id) -> bool:
+        """Si el agente del CSV es literalmente el id del sistema"""
+        return str(agente_csv).strip().upper() == str(agent_id).strip().upper()
+
+
+@lru_cache(maxsize=8)
+def _resolvedor_en_cache(version: Tuple) -> ResolvedorAgentes:
+    return ResolvedorAgentes({agent_id: {'nombre': nombre} for agent_id, nombre in version})
+
+
+def obtener_resolvedor(super_users_config: Dict) -> ResolvedorAgentes:
+    """
+    Resolvedor para los agentes de una configuración de super usuarios.
+    Se reutiliza mientras no cambien los ids o nombres de los agentes.
+    """
+    agentes_sistema = super_users_config.get("agentes", {})
+    version = tuple(
+        (agent_id, info.get('nombre', '')) for agent_id, info in agentes_sistema.items()
+    )
+    return _resolvedor_en_cache(version)
@@ -1,5 +1,6 @@
-import json
 import os
+import codec_json
+from almacen_mensual import AlmacenMensual
 from datetime import datetime, date, timedelta
 from typing import Dict, List, Optional, Tuple
 import streamlit as st
@@ -15,15 +16,14 @@ def cargar_horarios_agentes() -> Dict:
         archivo = 'data/agent_schedules.json'
         
         if os.path.exists(archivo):
-            with open(archivo, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                # Asegurar que todos los agentes tengan todos los días
-                dias_semana = ["Lunes", "Martes", "Miercoles", "Jueves", "Viernes"]
-                for agente_id, horario in data.items():
-                    for dia in dias_semana:
-                        if dia not in horario:
-                            horario[dia] = {"inicio": "15:00", "fin": "21:00"}
-                return data
+            data = codec_json.leer_archivo(archivo)
+            # Asegurar que todos los agentes tengan todos los días
+            dias_semana = ["Lunes", "Martes", "Miercoles", "Jueves", "Viernes"]
+            for agente_id, horario in data.items():
+                for dia in dias_semana:
+                    if dia not in horario:
+                        horario[dia] = {"inicio": "15:00", "fin": "21:00"}
+            return data
         else:
             # Estructura inicial vacía
             horarios_base = {}
@@ -40,8 +40,7 @@ def guardar_horarios_agentes(horarios_data: Dict) -> bool:
         os.makedirs('data', exist_ok=True)
         archivo = 'data/agent_schedules.json'
         
-        with open(archivo, 'w', encoding='utf-8') as f:
-            json.dump(horarios_data, f, indent=4, ensure_ascii=False)
+        codec_json.escribir_archivo(archivo, horarios_data)
         return True
     except Exception as e:
         st.error(f"Error guardando horarios: {e}")
@@ -74,32 +73,33 @@ def obtener_horas_diarias(horario_dia: Dict) -> float:
 # FUNCIONES DE AUSENCIAS
 # ==============================================
 
-def cargar_ausencias_agentes() -> Dict:
-    """Carga las ausencias de los agentes"""
+# {agente: {fecha 'YYYY-MM-DD': ausencia}}, un archivo por mes en data/agent_absences/
+_almacen_ausencias = AlmacenMensual(
+    'data/agent_absences', 'data/agent_absences.json', forma='anidada'
+)
+
+def cargar_ausencias_agentes(meses: Optional[List[str]] = None) -> Dict:
+    """
+    Carga las ausencias de los agentes
+    
+    Args:
+        meses: Meses 'YYYY-MM' a cargar; None = todo el histórico
+    """
     try:
-        os.makedirs('data', exist_ok=True)
-        archivo = 'data/agent_absences.json'
-        
-        if os.path.exists(archivo):
-            with open(archivo, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        else:
-            ausencias_base = {}
-            guardar_ausencias_agentes(ausencias_base)
-            return ausencias_base
-            
+        return _almacen_ausencias.cargar(meses)
     except Exception as e:
         st.error(f"Error cargando ausencias: {e}")
         return {}
 
-def guardar_ausencias_agentes(ausencias_data: Dict) -> bool:
-    """Guarda las ausencias de agentes"""
+def guardar_ausencias_agentes(ausencias_data: Dict, meses: Optional[List[str]] = None) -> bool:
+    """
+    Guarda las ausencias de agentes
+    
+    Args:
+        meses: Pasar los mismos meses con los que se cargó; None = histórico completo
+    """
     try:
-        os.makedirs('data', exist_ok=True)
-        archivo = 'data/agent_absences.json'
-        
-        with open(archivo, 'w', encoding='utf-8') as f:
-            json.dump(ausencias_data, f, indent=4, ensure_ascii=False)
+        _almacen_ausencias.guardar(ausencias_data, meses)
         return True
     except Exception as e:
         st.error(f"Error guardando ausencias: {e}")
@@ -109,32 +109,33 @@ def guardar_ausencias_agentes(ausencias_data: Dict) -> bool:
 # FUNCIONES DE MÉTRICAS (SPH Y OBJETIVOS)
 # ==============================================
 
-def cargar_metricas_agentes() -> Dict:
-    """Carga las métricas de los agentes"""
+# {agente: {mes 'YYYY-MM': métricas}}, un archivo por mes en data/agent_metrics/
+_almacen_metricas = AlmacenMensual(
+    'data/agent_metrics', 'data/agent_metrics.json', forma='anidada'
+)
+
+def cargar_metricas_agentes(meses: Optional[List[str]] = None) -> Dict:
+    """
+    Carga las métricas de los agentes
+    
+    Args:
+        meses: Meses 'YYYY-MM' a cargar; None = todo el histórico
+    """
     try:
-        os.makedirs('data', exist_ok=True)
-        archivo = 'data/agent_metrics.json'
-        
-        if os.path.exists(archivo):
-            with open(archivo, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        else:
-            metricas_base = {}
-            guardar_metricas_agentes(metricas_base)
-            return metricas_base
-            
+        return _almacen_metricas.cargar(meses)
     except Exception as e:
         st.error(f"Error cargando métricas: {e}")
         return {}
 
-def guardar_metricas_agentes(metricas_data: Dict) -> bool:
-    """Guarda las métricas de agentes"""
+def guardar_metricas_agentes(metricas_data: Dict, meses: Optional[List[str]] = None) -> bool:
+    """
+    Guarda las métricas de agentes
+    
+    Args:
+        meses: Pasar los mismos meses con los que se cargó; None = histórico completo
+    """
     try:
-        os.makedirs('data', exist_ok=True)
-        archivo = 'data/agent_metrics.json'
-        
-        with open(archivo, 'w', encoding='utf-8') as f:
-            json.dump(metricas_data, f, indent=4, ensure_ascii=False)
+        _almacen_metricas.guardar(metricas_data, meses)
         return True
     except Exception as e:
         st.error(f"Error guardando métricas: {e}")
@@ -328,8 +329,7 @@ def cargar_ventas_agentes() -> Dict:
         archivo = 'data/agent_sales.json'
         
         if os.path.exists(archivo):
-            with open(archivo, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return codec_json.leer_archivo(archivo)
         else:
             ventas_base = {}
             guardar_ventas_agentes(ventas_base)
@@ -345,8 +345,7 @@ def guardar_ventas_agentes(ventas_data: Dict) -> bool:
         os.makedirs('data', exist_ok=True)
         archivo = 'data/agent_sales.json'
         
-        with open(archivo, 'w', encoding='utf-8') as f:
-            json.dump(ventas_data, f, indent=4, ensure_ascii=False)
+        codec_json.escribir_archivo(archivo, ventas_data)
         return True
     except Exception as e:
         st.error(f"Error guardando ventas: {e}")
@@ -470,7 +469,7 @@ def sincronizar_ventas_con_github():
         # Guardar archivo temporalmente
         import tempfile
         with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json', encoding='utf-8') as tmp:
-            json.dump(ventas, tmp, indent=4, ensure_ascii=False)
+            tmp.write(codec_json.dumps(ventas))
             temp_path = tmp.name
         
         try:
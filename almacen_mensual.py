@@ -0,0 +1,257 @@
+import hashlib
+import os
+import re
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+import codec_json
+
+# ==============================================
+# ALMACÉN DE SERIES TEMPORALES POR MESES
+# ==============================================
+#
+# Los archivos que acumulan un mes tras otro (agent_metrics, agent_absences,
+# monitorizaciones) se guardan repartidos en data/<tipo>/<YYYY-MM>.json, con
+# la misma estructura que el archivo único pero solo con las entradas de ese
+# mes. Una consulta del mes actual lee un archivo pequeño en lugar de todo
+# el histórico.
+#
+# Compatibilidad: si existe el archivo único antiguo (data/<tipo>.json) se
+# reparte en meses la primera vez que se accede. En el directorio queda
+# MARCA_MIGRACION con su firma y el hash de su contenido, y solo se vuelve a
+# importar si el contenido cambia (p.ej. porque se restaura un backup suyo),
+# y entonces solo aporta las entradas que falten. Una vez repartido (la
+# siguiente vez que se revisa, con la marca ya en disco) se renombra a
+# <archivo>.migrado para que nada lo siga tomando por el archivo vivo.
+#
+# Formas soportadas:
+#   'anidada': {agente: {clave: valor}}, el mes sale de la clave interna
+#              ('YYYY-MM' o 'YYYY-MM-DD')
+#   'plana':   {id: registro}, el mes sale de un campo de fecha del registro
+
+MARCA_MIGRACION = '_migracion_legacy.json'
+SUFIJO_MIGRADO = '.migrado'
+SIN_FECHA = 'sin_fecha'
+
+_PATRON_MES = re.compile(r'^\d{4}-\d{2}')
+_PATRON_ARCHIVO = re.compile(r'^(\d{4}-\d{2}|' + SIN_FECHA + r')\.json$')
+
+
+def _mes_de_texto(texto) -> str:
+    """'2024-03' / '2024-03-15' / '2024-03-15T10:00' → '2024-03'"""
+    if isinstance(texto, str) and _PATRON_MES.match(texto):
+        return texto[:7]
+    return SIN_FECHA
+
+
+def _leer_directo(ruta):
+    return codec_json.leer_archivo(ruta)
+
+
+def _guardar_directo(ruta, data):
+    codec_json.escribir_archivo(ruta, data)
+
+
+class AlmacenMensual:
+    """Datos de un tipo repartidos en un archivo por mes"""
+
+    def __init__(self, directorio: str, archivo_legacy: str, forma: str,
+                 campo_fecha: Optional[str] = None,
+                 leer: Callable = _leer_directo, guardar: Callable = _guardar_directo):
+        """
+        Args:
+            directorio: Carpeta de los meses (p.ej. 'data/agent_metrics')
+            archivo_legacy: Archivo único antiguo (p.ej. 'data/agent_metrics.json')
+            forma: 'anidada' o 'plana'
+            campo_fecha: Campo del registro con la fecha (solo forma 'plana')
+            leer / guardar: Funciones de E/S; database.py pasa las suyas
+                            (caché, escritura por lotes y backups)
+        """
+        self.directorio = directorio
+        self.archivo_legacy = archivo_legacy
+        self.forma = forma
+        self.campo_fecha = campo_fecha
+        self._leer = leer
+        self._guardar = guardar
+        self._lock = threading.RLock()
+        self._legacy_revisado = False
+        # Meses guardados por este proceso (pueden estar aún en un lote sin escribir)
+        self._meses_guardados = set()
+
+    # ------------------------------------------
+    # Reparto y unión
+    # ------------------------------------------
+
+    def dividir(self, data: Dict) -> Dict[str, Dict]:
+        """Reparte los datos completos en {mes: datos_del_mes}"""
+        partes = {}
+        if self.forma == 'anidada':
+            for agente, entradas in data.items():
+                for clave, valor in entradas.items():
+                    partes.setdefault(_mes_de_texto(clave), {}).setdefault(agente, {})[clave] = valor
+                if not entradas:
+                    # Agente sin entradas: conservarlo para no perderlo al recargar
+                    partes.setdefault(SIN_FECHA, {})[agente] = {}
+        else:
+            for id_registro, registro in data.items():
+                fecha = registro.get(self.campo_fecha) if isinstance(registro, dict) else None
+                partes.setdefault(_mes_de_texto(fecha), {})[id_registro] = registro
+        return partes
+
+    def _unir_en(self, destino: Dict, parte: Dict, pisar: bool = True) -> None:
+        """Añade 'parte' a 'destino'; con pisar=False no cambia entradas existentes"""
+        if self.forma == 'anidada':
+            for agente, entradas in parte.items():
+                entradas_destino = destino.setdefault(agente, {})
+                for clave, valor in entradas.items():
+                    if pisar or clave not in entradas_destino:
+                        entradas_destino[clave] = valor
+        else:
+            for clave, valor in parte.items():
+                if pisar or clave not in destino:
+                    destino[clave] = valor
+
+    # ------------------------------------------
+    # Archivos
+    # ------------------------------------------
+
+    def ruta_mes(self, mes: str) -> str:
+        return os.path.join(self.directorio, f"{mes}.json")
+
+    def meses_disponibles(self) -> list:
+        """Meses con archivo (o guardados en este proceso), ordenados"""
+        self._revisar_legacy()
+        meses = set(self._meses_guardados)
+        try:
+            for nombre in os.listdir(self.directorio):
+                coincidencia = _PATRON_ARCHIVO.match(nombre)
+                if coincidencia:
+                    meses.add(coincidencia.group(1))
+        except FileNotFoundError:
+            pass
+        return sorted(meses)
+
+    def rutas(self) -> list:
+        """Archivos de todos los meses (para firmas de caché)"""
+        return [self.ruta_mes(mes) for mes in self.meses_disponibles()]
+
+    def _leer_mes(self, mes: str) -> Dict:
+        try:
+            data = self._leer(self.ruta_mes(mes))
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+
+    def _guardar_mes(self, mes: str, data: Dict) -> None:
+        os.makedirs(self.directorio, exist_ok=True)
+        self._guardar(self.ruta_mes(mes), data)
+        self._meses_guardados.add(mes)
+
+    def _revisar_legacy(self) -> None:
+        """Reparte en meses el archivo único antiguo si es nuevo o ha cambiado"""
+        if self._legacy_revisado:
+            return
+
+        with self._lock:
+            if self._legacy_revisado:
+                return
+
+            try:
+                stat = os.stat(self.archivo_legacy)
+            except FileNotFoundError:
+                self._legacy_revisado = True
+                return
+
+            firma = [stat.st_mtime_ns, stat.st_size]
+            ruta_marca = os.path.join(self.directorio, MARCA_MIGRACION)
+            try:
+                marca = self._leer(ruta_marca)
+            except (FileNotFoundError, ValueError):
+                marca = {}
+
+            repartido = False
+            if marca.get('firma') != firma:
+                # La firma cambia también si solo se reescribió el mismo
+                # contenido (p.ej. una migración de esquema); el hash lo distingue
+                legacy = self._leer(self.archivo_legacy)
+                hash_legacy = hashlib.sha256(codec_json.dumps(legacy).encode('utf-8')).hexdigest()
+
+                if marca.get('hash') != hash_legacy:
+                    repartido = True
+                    if isinstance(legacy, dict):
+                        for mes, parte in self.dividir(legacy).items():
+                            # Lo que ya está repartido manda: el archivo antiguo
+                            # solo aporta entradas que falten
+                            actual = self._leer_mes(mes)
+                            self._unir_en(actual, parte, pisar=False)
+                            self._guardar_mes(mes, actual)
+                    print(f"✅ {self.archivo_legacy} repartido por meses en {self.directorio}/")
+
+                # La marca se guarda después de los meses
+                os.makedirs(self.directorio, exist_ok=True)
+                self._guardar(ruta_marca, {
+                    'archivo': self.archivo_legacy, 'firma': firma, 'hash': hash_legacy
+                })
+
+            if not repartido:
+                # Ya repartido en una revisión anterior: los meses están
+                # escritos (no en un lote pendiente) y se puede retirar
+                try:
+                    os.replace(self.archivo_legacy, self.archivo_legacy + SUFIJO_MIGRADO)
+                except OSError as e:
+                    print(f"Error renombrando {self.archivo_legacy}: {e}")
+
+            self._legacy_revisado = True
+
+    # ------------------------------------------
+    # API
+    # ------------------------------------------
+
+    def cargar(self, meses: Optional[Iterable[str]] = None) -> Dict:
+        """
+        Carga los datos con la estructura del archivo único.
+
+        Args:
+            meses: Meses 'YYYY-MM' a leer; None = todo el histórico
+        """
+        self._revisar_legacy()
+        if meses is None:
+            meses = self.meses_disponibles()
+
+        data = {}
+        for mes in meses:
+            self._unir_en(data, self._leer_mes(mes))
+        return data
+
+    def guardar(self, data: Dict, meses: Optional[Iterable[str]] = None) -> None:
+        """
+        Guarda los datos repartidos por meses. Solo se reescriben los meses
+        cuyo contenido cambia.
+
+        Args:
+            data: Datos con la estructura del archivo único
+            meses: Si se indica, 'data' solo contiene esos meses y el resto no
+                   se toca. None = 'data' es el histórico completo (los meses
+                   que ya no aparecen se vacían).
+        """
+        with self._lock:
+            self._revisar_legacy()
+            partes = self.dividir(data)
+
+            if meses is None:
+                afectados = set(self.meses_disponibles()) | set(partes)
+            else:
+                afectados = set(meses)
+
+            for mes in sorted(afectados):
+                nuevo = partes.get(mes, {})
+                if nuevo != self._leer_mes(mes):
+                    self._guardar_mes(mes, nuevo)
+
+            # Entradas de meses no cargados: se añaden a lo que ya hay
+            for mes in sorted(set(partes) - afectados):
+                combinado = self._leer_mes(mes)
+                antes = codec_json.dumps(combinado)
+                self._unir_en(combinado, partes[mes])
+                if codec_json.dumps(combinado) != antes:
+                    self._guardar_mes(mes, combinado)
@@ -0,0 +1,228 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import codec_json
+
+# ==============================================
+# ALMACÉN DE BACKUPS DEDUPLICADO
+# ==============================================
+#
+# Cada versión de un archivo se guarda una sola vez como blob comprimido
+# identificado por su SHA-256 (data_backup/store/blobs/ab/abcd....gz). El
+# manifiesto (JSONL, una línea por versión) indica qué hash tenía cada
+# archivo en cada momento. Guardar un contenido idéntico al último no
+# escribe nada, y restaurar un archivo a cualquier momento es una llamada.
+
+STORE_DIR = 'data_backup/store'
+BLOBS_DIR = os.path.join(STORE_DIR, 'blobs')
+MANIFEST_PATH = os.path.join(STORE_DIR, 'manifest.jsonl')
+
+# Política de retención: (antigüedad máxima en segundos, una versión cada N segundos)
+# Todo lo de las últimas 24h se conserva; después se va espaciando.
+RETENCION = [
+    (24 * 3600, 0),
+    (7 * 24 * 3600, 3600),
+    (30 * 24 * 3600, 24 * 3600),
+]
+# Intervalo mínimo entre dos pasadas de retención automáticas
+INTERVALO_RETENCION = 3600
+
+_lock = threading.RLock()
+_ultimo_hash = None  # {archivo: hash}, se carga perezosamente del manifiesto
+_ultima_retencion = 0.0
+
+
+def _normalizar(ruta) -> str:
+    return os.path.normpath(os.fspath(ruta)).replace(os.sep, '/')
+
+
+def _ruta_blob(hash_hex: str) -> str:
+    return os.path.join(BLOBS_DIR, hash_hex[:2], f"{hash_hex}.gz")
+
+
+def _leer_manifiesto() -> List[Dict]:
+    """Entradas del manifiesto en orden de escritura"""
+    if not os.path.exists(MANIFEST_PATH):
+        return []
+    entradas = []
+    with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+        for linea in f:
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                entradas.append(codec_json.loads(linea))
+            except ValueError:
+                # Línea cortada por una caída del proceso
+                continue
+    return entradas
+
+
+def _indice_ultimos() -> Dict:
+    global _ultimo_hash
+    if _ultimo_hash is None:
+        _ultimo_hash = {}
+        for entrada in _leer_manifiesto():
+            _ultimo_hash[entrada['archivo']] = entrada['hash']
+    return _ultimo_hash
+
+
+def registrar_version(ruta, contenido: Optional[bytes] = None) -> bool:
+    """
+    Guarda en el almacén el contenido actual de un archivo.
+
+    Args:
+        ruta: Archivo a guardar
+        contenido: Su contenido, si no hay que leerlo tal cual del disco
+                   (p.ej. la copia consistente de una base SQLite)
+
+    Returns:
+        bool: True si se creó una versión nueva, False si el contenido era
+              idéntico al último guardado (o el archivo no existe)
+    """
+    archivo = _normalizar(ruta)
+    if contenido is None:
+        try:
+            with open(archivo, 'rb') as f:
+                contenido = f.read()
+        except FileNotFoundError:
+            return False
+
+    hash_hex = hashlib.sha256(contenido).hexdigest()
+
+    with _lock:
+        ultimos = _indice_ultimos()
+        if ultimos.get(archivo) == hash_hex:
+            return False
+
+        ruta_blob = _ruta_blob(hash_hex)
+        if not os.path.exists(ruta_blob):
+            os.makedirs(os.path.dirname(ruta_blob), exist_ok=True)
+            tmp_blob = f"{ruta_blob}.tmp"
+            with gzip.open(tmp_blob, 'wb') as f:
+                f.write(contenido)
+            os.replace(tmp_blob, ruta_blob)
+
+        ahora = time.time()
+        entrada = {
+            'archivo': archivo,
+            'hash': hash_hex,
+            'ts': ahora,
+            'timestamp': datetime.fromtimestamp(ahora).isoformat(),
+            'bytes': len(contenido),
+        }
+        os.makedirs(STORE_DIR, exist_ok=True)
+        with open(MANIFEST_PATH, 'a', encoding='utf-8') as f:
+            f.write(codec_json.dumps(entrada) + '\n')
+
+        ultimos[archivo] = hash_hex
+        return True
+
+
+def listar_versiones(ruta=None) -> List[Dict]:
+    """Versiones guardadas (de un archivo o de todos), de más antigua a más reciente"""
+    archivo = _normalizar(ruta) if ruta is not None else None
+    with _lock:
+        return [e for e in _leer_manifiesto() if archivo is None or e['archivo'] == archivo]
+
+
+def leer_version(ruta, momento: Optional[datetime] = None) -> Optional[bytes]:
+    """Contenido que tenía el archivo en 'momento' (None = última versión)"""
+    limite = momento.timestamp() if momento is not None else float('inf')
+    candidatas = [e for e in listar_versiones(ruta) if e['ts'] <= limite]
+    if not candidatas:
+        return None
+    with gzip.open(_ruta_blob(candidatas[-1]['hash']), 'rb') as f:
+        return f.read()
+
+
+def restaurar_archivo(ruta, momento: Optional[datetime] = None, destino=None) -> bool:
+    """
+    Restaura un archivo al contenido que tenía en un momento dado.
+
+    Args:
+        ruta: Archivo original (p.ej. 'data/usuarios.json')
+        momento: datetime (naive = hora local del servidor); None = última versión
+        destino: Dónde escribirlo; por defecto sobre el propio archivo
+
+    Returns:
+        bool: True si había una versión que restaurar
+    """
+    contenido = leer_version(ruta, momento)
+    if contenido is None:
+        return False
+    destino = _normalizar(destino if destino is not None else ruta)
+    os.makedirs(os.path.dirname(destino) or '.', exist_ok=True)
+    tmp = f"{destino}.restaurando"
+    with open(tmp, 'wb') as f:
+        f.write(contenido)
+    os.replace(tmp, destino)
+    return True
+
+
+def aplicar_retencion(ahora: Optional[float] = None) -> int:
+    """
+    Poda el manifiesto según RETENCION y borra los blobs que nadie usa.
+    La última versión de cada archivo se conserva siempre.
+
+    Returns:
+        int: Número de versiones eliminadas
+    """
+    global _ultima_retencion
+    ahora = ahora if ahora is not None else time.time()
+
+    with _lock:
+        entradas = _leer_manifiesto()
+        ultima_por_archivo = {}
+        for i, entrada in enumerate(entradas):
+            ultima_por_archivo[entrada['archivo']] = i
+
+        conservadas = []
+        # (archivo, tramo, bucket) que ya tienen una versión conservada
+        buckets_vistos = set()
+        # Recorrer de más reciente a más antigua para quedarnos con la última de cada bucket
+        for i in range(len(entradas) - 1, -1, -1):
+            entrada = entradas[i]
+            edad = ahora - entrada['ts']
+            if ultima_por_archivo[entrada['archivo']] == i:
+                conservadas.append(entrada)
+                continue
+
+            for tramo, (edad_max, paso) in enumerate(RETENCION):
+                if edad <= edad_max:
+                    if paso == 0:
+                        conservadas.append(entrada)
+                    else:
+                        bucket = (entrada['archivo'], tramo, int(entrada['ts'] // paso))
+                        if bucket not in buckets_vistos:
+                            buckets_vistos.add(bucket)
+                            conservadas.append(entrada)
+                    break
+
+        conservadas.reverse()
+        eliminadas = len(entradas) - len(conservadas)
+
+        if eliminadas:
+            contenido = ''.join(codec_json.dumps(e) + '\n' for e in conservadas)
+            codec_json.escribir_texto_atomico(MANIFEST_PATH, contenido)
+
+            en_uso = {e['hash'] for e in conservadas}
+            for hash_hex in {e['hash'] for e in entradas} - en_uso:
+                try:
+                    os.remove(_ruta_blob(hash_hex))
+                except FileNotFoundError:
+                    pass
+
+        _ultima_retencion = ahora
+        return eliminadas
+
+
+def retencion_pendiente(ahora: Optional[float] = None) -> bool:
+    """Indica si toca una pasada automática de retención"""
+    ahora = ahora if ahora is not None else time.time()
+    return ahora - _ultima_retencion >= INTERVALO_RETENCION
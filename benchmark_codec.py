@@ -0,0 +1,102 @@
+"""
+Benchmark de carga/guardado de los archivos reales de data/
+
+Compara el formato antiguo (json estándar con indent=4) con codec_json
+(orjson si está instalado, JSON compacto). No modifica data/: las
+escrituras se hacen en un directorio temporal.
+
+Uso:
+    python benchmark_codec.py [--repeticiones N] [--directorio data]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import codec_json
+
+
+def _medir(funcion, repeticiones):
+    """Mejor tiempo (ms) de N ejecuciones, para aislar ruido del sistema"""
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor * 1000
+
+
+def _cargar_legacy(ruta):
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _guardar_legacy(ruta, data):
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+
+
+def ejecutar_benchmark(directorio='data', repeticiones=20):
+    """Devuelve una fila de resultados por archivo JSON del directorio"""
+    resultados = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for ruta in sorted(Path(directorio).glob('*.json')):
+            try:
+                data = _cargar_legacy(ruta)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+
+            ruta_legacy = os.path.join(tmp, f"legacy_{ruta.name}")
+            ruta_codec = os.path.join(tmp, f"codec_{ruta.name}")
+            _guardar_legacy(ruta_legacy, data)
+            codec_json.escribir_archivo(ruta_codec, data)
+
+            # Ambos formatos deben devolver exactamente los mismos datos
+            assert codec_json.leer_archivo(ruta_legacy) == data
+            assert codec_json.leer_archivo(ruta_codec) == data
+
+            resultados.append({
+                'archivo': ruta.name,
+                'kb_legacy': os.path.getsize(ruta_legacy) / 1024,
+                'kb_codec': os.path.getsize(ruta_codec) / 1024,
+                'carga_legacy_ms': _medir(lambda: _cargar_legacy(ruta_legacy), repeticiones),
+                'carga_codec_ms': _medir(lambda: codec_json.leer_archivo(ruta_codec), repeticiones),
+                'guardado_legacy_ms': _medir(lambda: _guardar_legacy(ruta_legacy, data), repeticiones),
+                'guardado_codec_ms': _medir(lambda: codec_json.escribir_archivo(ruta_codec, data), repeticiones),
+            })
+
+    return resultados
+
+
+def _imprimir(resultados):
+    print(f"Backend codec: {codec_json.BACKEND}")
+    cabecera = (f"{'archivo':<36} {'KB old':>8} {'KB new':>8} "
+                f"{'load old':>9} {'load new':>9} {'save old':>9} {'save new':>9}")
+    print(cabecera)
+    print('-' * len(cabecera))
+
+    totales = {k: 0.0 for k in ('kb_legacy', 'kb_codec', 'carga_legacy_ms', 'carga_codec_ms',
+                                'guardado_legacy_ms', 'guardado_codec_ms')}
+    for fila in resultados:
+        for k in totales:
+            totales[k] += fila[k]
+        print(f"{fila['archivo'][:36]:<36} {fila['kb_legacy']:>8.1f} {fila['kb_codec']:>8.1f} "
+              f"{fila['carga_legacy_ms']:>9.3f} {fila['carga_codec_ms']:>9.3f} "
+              f"{fila['guardado_legacy_ms']:>9.3f} {fila['guardado_codec_ms']:>9.3f}")
+
+    print('-' * len(cabecera))
+    print(f"{'TOTAL (tiempos en ms)':<36} {totales['kb_legacy']:>8.1f} {totales['kb_codec']:>8.1f} "
+          f"{totales['carga_legacy_ms']:>9.3f} {totales['carga_codec_ms']:>9.3f} "
+          f"{totales['guardado_legacy_ms']:>9.3f} {totales['guardado_codec_ms']:>9.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--directorio', default='data')
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    _imprimir(ejecutar_benchmark(args.directorio, args.repeticiones))
@@ -0,0 +1,359 @@
+"""
+Simulador de carga del sistema PVD (sin Streamlit)
+
+Ejecuta el código real de las pausas (TemporizadorPVDMejorado,
+solicitar_pausa, estado_pvd) con agentes sintéticos y un reloj virtual:
+una jornada de horas se simula en segundos. Cada grupo recibe solicitudes
+de pausa según una tasa de llegadas (Poisson) y los agentes avisados
+confirman tras un retraso aleatorio (o no confirman nunca, con cierta
+probabilidad).
+
+Informa de:
+- Latencia real de cada vuelta del temporizador (_verificar_y_actualizar)
+- Lecturas y escrituras de archivos en disco
+- Tiempo de solicitud a aviso (percentiles, en minutos virtuales)
+- Equidad de la cola: avisos fuera del orden de solicitud y cancelaciones
+
+No modifica data/: todo se hace en un directorio temporal. Usa el estado
+global de database/pvd_system, así que se ejecuta una simulación por
+proceso.
+
+Uso:
+    python benchmark_pvd.py [--grupos basico,premium] [--maximo 2]
+        [--agentes 10] [--llegadas 12] [--confirmacion 10-90]
+        [--sin-confirmar 0.05] [--horas 8] [--semilla 1]
+"""
+import argparse
+import heapq
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+
+# El hilo del temporizador no debe correr con el reloj real: las vueltas
+# las lanza el simulador
+os.environ['PVD_TEMPORIZADOR'] = '0'
+
+# Límite de vueltas seguidas en el mismo instante (cada vuelta que cambia
+# una cola la vuelve a marcar como cambiada)
+MAX_VUELTAS_POR_INSTANTE = 10
+
+
+def _percentil(valores, p):
+    """Percentil p (0-100) por rango más cercano; None si no hay valores"""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados) + 0.5)) - 1))
+    return ordenados[indice]
+
+
+def _inversiones(pausas):
+    """Pares avisados en orden distinto al de solicitud"""
+    avisadas = sorted((p['solicitud'], p['aviso']) for p in pausas if p['aviso'] is not None)
+    return sum(
+        1
+        for i, (_, aviso_a) in enumerate(avisadas)
+        for _, aviso_b in avisadas[i + 1:]
+        if aviso_b < aviso_a
+    )
+
+
+def ejecutar_simulacion(grupos=('basico',), maximo_simultaneo=2, agentes_por_grupo=10,
+                        llegadas_por_hora=12.0, confirmacion_segundos=(10, 90),
+                        prob_sin_confirmar=0.05, prob_larga=0.3, horas=8.0,
+                        duracion_corta=5, duracion_larga=10, semilla=1):
+    """Simula una jornada y devuelve un dict con las métricas"""
+    azar = random.Random(semilla)
+    directorio_original = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        os.makedirs('data', exist_ok=True)
+        try:
+            # Importar ya dentro del directorio temporal (rutas relativas data/)
+            import codec_json
+            import database
+            import pvd_eta
+            import pvd_system
+            from pvd_planificador import PlanificadorPlazos
+
+            # ------------------------------------------
+            # Reloj virtual
+            # ------------------------------------------
+            inicio = pvd_system.obtener_hora_madrid().replace(hour=8, minute=0, second=0, microsecond=0)
+            reloj = {'t': 0.0}  # segundos virtuales desde el inicio
+
+            def ahora_virtual():
+                return inicio + timedelta(seconds=reloj['t'])
+
+            originales = (pvd_system.obtener_hora_madrid, pvd_eta.obtener_hora_madrid,
+                          codec_json.leer_archivo)
+            pvd_system.obtener_hora_madrid = ahora_virtual
+            pvd_eta.obtener_hora_madrid = ahora_virtual
+
+            # ------------------------------------------
+            # Contadores de E/S
+            # ------------------------------------------
+            io = {'lecturas': 0, 'escrituras': 0}
+
+            def leer_contando(ruta):
+                io['lecturas'] += 1
+                return originales[2](ruta)
+
+            def contar_escritura(ruta):
+                io['escrituras'] += 1
+
+            codec_json.leer_archivo = leer_contando
+            database.registrar_observador_escritura(contar_escritura)
+
+            try:
+                # ------------------------------------------
+                # Configuración y agentes
+                # ------------------------------------------
+                config_sistema = database.cargar_config_sistema()
+                config_sistema['grupos_pvd'] = {
+                    grupo: {
+                        'maximo_simultaneo': maximo_simultaneo,
+                        'agentes_por_grupo': agentes_por_grupo,
+                        'duracion_corta': duracion_corta,
+                        'duracion_larga': duracion_larga
+                    }
+                    for grupo in grupos
+                }
+                database.guardar_config_sistema(config_sistema)
+
+                agentes = {
+                    grupo: [f"sim_{grupo}_{n:03d}" for n in range(agentes_por_grupo)]
+                    for grupo in grupos
+                }
+                database.guardar_configuracion_usuarios({
+                    usuario_id: {'nombre': usuario_id, 'grupo': grupo}
+                    for grupo, usuarios in agentes.items() for usuario_id in usuarios
+                })
+
+                temporizador = pvd_system.temporizador_pvd_mejorado
+                temporizador.planificador = PlanificadorPlazos(reloj=lambda: reloj['t'])
+                database.estado_pvd.registrar_observador(temporizador.planificador.marcar_cambio)
+
+                # ------------------------------------------
+                # Eventos: (instante, secuencia, tipo, datos)
+                # ------------------------------------------
+                eventos = []
+                secuencia = [0]
+
+                def programar(instante, tipo, datos):
+                    secuencia[0] += 1
+                    heapq.heappush(eventos, (instante, secuencia[0], tipo, datos))
+
+                for grupo in grupos:
+                    programar(azar.expovariate(llegadas_por_hora / 3600), 'llegada', grupo)
+
+                seguimiento = {}   # {pausa_id: datos de la pausa en la simulación}
+                ocupados = set()   # agentes con una pausa en espera o en curso
+                agotados = set()   # agentes que ya llegaron al límite diario
+                contadores = {'solicitudes': 0, 'rechazadas': 0, 'sin_agente_libre': 0}
+                latencias = []
+                lecturas_vueltas = []
+
+                def vuelta(grupos_vuelta):
+                    lecturas_antes = io['lecturas']
+                    t0 = time.perf_counter()
+                    with database.lote_escritura():
+                        temporizador._verificar_y_actualizar(grupos_vuelta)
+                    latencias.append((time.perf_counter() - t0) * 1000)
+                    lecturas_vueltas.append(io['lecturas'] - lecturas_antes)
+
+                def observar(grupo):
+                    for pausa in database.estado_pvd.cola(grupo):
+                        datos = seguimiento.get(pausa['id'])
+                        if datos is None or datos['fin'] is not None:
+                            continue
+                        if pausa.get('notificado') and datos['aviso'] is None:
+                            datos['aviso'] = reloj['t']
+                            if azar.random() >= prob_sin_confirmar:
+                                programar(reloj['t'] + azar.uniform(*confirmacion_segundos),
+                                          'confirmar', (grupo, pausa['id']))
+                        if pausa['estado'] == 'EN_CURSO' and datos['inicio'] is None:
+                            datos['inicio'] = reloj['t']
+                        if pausa['estado'] in ('COMPLETADO', 'CANCELADO'):
+                            datos['fin'] = reloj['t']
+                            datos['estado'] = pausa['estado']
+                            datos['motivo'] = pausa.get('motivo_cancelacion')
+                            ocupados.discard(datos['usuario_id'])
+
+                def llegada(grupo):
+                    libres = [u for u in agentes[grupo] if u not in ocupados and u not in agotados]
+                    if not libres:
+                        contadores['sin_agente_libre'] += 1
+                        return
+                    usuario_id = azar.choice(libres)
+                    duracion = 'larga' if azar.random() < prob_larga else 'corta'
+                    contadores['solicitudes'] += 1
+                    if not temporizador.solicitar_pausa(duracion, grupo, usuario_id=usuario_id):
+                        contadores['rechazadas'] += 1
+                        agotados.add(usuario_id)
+                        return
+                    for pausa in database.estado_pvd.cola(grupo):
+                        if pausa['usuario_id'] == usuario_id and pausa['id'] not in seguimiento \
+                                and pausa['estado'] == 'ESPERANDO':
+                            seguimiento[pausa['id']] = {
+                                'grupo': grupo, 'usuario_id': usuario_id, 'solicitud': reloj['t'],
+                                'aviso': None, 'inicio': None, 'fin': None,
+                                'estado': None, 'motivo': None
+                            }
+                            ocupados.add(usuario_id)
+
+                def confirmar(grupo, pausa_id):
+                    for pausa in database.estado_pvd.cola(grupo):
+                        if pausa['id'] == pausa_id and pausa['estado'] == 'ESPERANDO':
+                            database.actualizar_pausa_pvd(grupo, pausa_id, {
+                                'estado': 'EN_CURSO',
+                                'timestamp_inicio': ahora_virtual().isoformat(),
+                                'confirmado': True
+                            })
+
+                # ------------------------------------------
+                # Bucle principal
+                # ------------------------------------------
+                fin = horas * 3600
+                ultima_revision = 0.0
+                temporizador.planificador.solicitar_revision_completa()
+
+                while reloj['t'] <= fin:
+                    while eventos and eventos[0][0] <= reloj['t']:
+                        _, _, tipo, datos = heapq.heappop(eventos)
+                        if tipo == 'llegada':
+                            llegada(datos)
+                            programar(reloj['t'] + azar.expovariate(llegadas_por_hora / 3600),
+                                      'llegada', datos)
+                        else:
+                            confirmar(*datos)
+
+                    # Revisión completa periódica, como el hilo real
+                    if reloj['t'] - ultima_revision >= pvd_system.INTERVALO_REVISION_COMPLETA:
+                        temporizador.planificador.solicitar_revision_completa()
+
+                    for _ in range(MAX_VUELTAS_POR_INSTANTE):
+                        grupos_vuelta = temporizador.planificador.recoger()
+                        if grupos_vuelta is None:
+                            ultima_revision = reloj['t']
+                        elif not grupos_vuelta:
+                            break
+                        vuelta(grupos_vuelta)
+
+                    for grupo in grupos:
+                        observar(grupo)
+
+                    # Saltar al siguiente evento o plazo del temporizador
+                    siguiente = min(fin + 1, ultima_revision + pvd_system.INTERVALO_REVISION_COMPLETA)
+                    if eventos:
+                        siguiente = min(siguiente, eventos[0][0])
+                    plazo = temporizador.planificador.segundos_hasta_proximo()
+                    if plazo is not None:
+                        siguiente = min(siguiente, reloj['t'] + plazo)
+                    reloj['t'] = max(siguiente, reloj['t'] + 0.001)
+
+                database.estado_pvd.esperar_persistencia(timeout=30)
+            finally:
+                (pvd_system.obtener_hora_madrid, pvd_eta.obtener_hora_madrid,
+                 codec_json.leer_archivo) = originales
+        finally:
+            os.chdir(directorio_original)
+
+    # ------------------------------------------
+    # Métricas
+    # ------------------------------------------
+    pausas = list(seguimiento.values())
+    esperas = [(p['aviso'] - p['solicitud']) / 60 for p in pausas if p['aviso'] is not None]
+    cancelaciones = {}
+    for pausa in pausas:
+        if pausa['estado'] == 'CANCELADO':
+            motivo = pausa['motivo'] or 'otro'
+            cancelaciones[motivo] = cancelaciones.get(motivo, 0) + 1
+
+    return {
+        'horas': horas,
+        'contadores': contadores,
+        'vueltas': len(latencias),
+        'latencia_ms': {p: _percentil(latencias, p) for p in (50, 95, 99, 100)},
+        'lecturas': io['lecturas'],
+        'lecturas_por_vuelta': sum(lecturas_vueltas) / len(lecturas_vueltas) if lecturas_vueltas else 0,
+        'escrituras': io['escrituras'],
+        'espera_aviso_min': {p: _percentil(esperas, p) for p in (50, 90, 99, 100)},
+        'avisadas': len(esperas),
+        'iniciadas': sum(1 for p in pausas if p['inicio'] is not None),
+        'completadas': sum(1 for p in pausas if p['estado'] == 'COMPLETADO'),
+        'cancelaciones': cancelaciones,
+        'inversiones': {
+            grupo: _inversiones([p for p in pausas if p['grupo'] == grupo])
+            for grupo in grupos
+        },
+    }
+
+
+def _formato(valor, decimales=2):
+    return '-' if valor is None else f"{valor:.{decimales}f}"
+
+
+def _imprimir(resultado):
+    contadores = resultado['contadores']
+    print(f"Jornada simulada: {resultado['horas']:g} h")
+    print(f"Solicitudes: {contadores['solicitudes']} "
+          f"(rechazadas {contadores['rechazadas']}, "
+          f"sin agente libre {contadores['sin_agente_libre']})")
+    print(f"Avisadas: {resultado['avisadas']}  Iniciadas: {resultado['iniciadas']}  "
+          f"Completadas: {resultado['completadas']}")
+    print()
+
+    cabecera = f"{'métrica':<32} {'p50':>9} {'p90/95':>9} {'p99':>9} {'máx':>9}"
+    print(cabecera)
+    print('-' * len(cabecera))
+    latencia = resultado['latencia_ms']
+    print(f"{'vuelta temporizador (ms reales)':<32} {_formato(latencia[50]):>9} "
+          f"{_formato(latencia[95]):>9} {_formato(latencia[99]):>9} {_formato(latencia[100]):>9}")
+    espera = resultado['espera_aviso_min']
+    print(f"{'solicitud → aviso (min)':<32} {_formato(espera[50]):>9} "
+          f"{_formato(espera[90]):>9} {_formato(espera[99]):>9} {_formato(espera[100]):>9}")
+    print('-' * len(cabecera))
+    print()
+
+    print(f"Vueltas del temporizador: {resultado['vueltas']}")
+    print(f"E/S disco: {resultado['lecturas']} lecturas "
+          f"({resultado['lecturas_por_vuelta']:.2f} por vuelta), "
+          f"{resultado['escrituras']} escrituras")
+    if resultado['cancelaciones']:
+        detalle = ', '.join(f"{motivo}: {n}" for motivo, n in sorted(resultado['cancelaciones'].items()))
+        print(f"Cancelaciones: {detalle}")
+    else:
+        print("Cancelaciones: 0")
+    for grupo, inversiones in resultado['inversiones'].items():
+        print(f"Avisos fuera de orden en {grupo}: {inversiones}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--grupos', default='basico', help="Grupos separados por comas")
+    parser.add_argument('--maximo', type=int, default=2, help="maximo_simultaneo por grupo")
+    parser.add_argument('--agentes', type=int, default=10, help="Agentes por grupo")
+    parser.add_argument('--llegadas', type=float, default=12.0, help="Solicitudes por hora y grupo")
+    parser.add_argument('--confirmacion', default='10-90', help="Retraso de confirmación (segundos, min-max)")
+    parser.add_argument('--sin-confirmar', type=float, default=0.05, help="Probabilidad de no confirmar nunca")
+    parser.add_argument('--larga', type=float, default=0.3, help="Probabilidad de pedir pausa larga")
+    parser.add_argument('--horas', type=float, default=8.0)
+    parser.add_argument('--semilla', type=int, default=1)
+    args = parser.parse_args()
+
+    minimo, _, maximo = args.confirmacion.partition('-')
+    _imprimir(ejecutar_simulacion(
+        grupos=tuple(g.strip() for g in args.grupos.split(',') if g.strip()),
+        maximo_simultaneo=args.maximo,
+        agentes_por_grupo=args.agentes,
+        llegadas_por_hora=args.llegadas,
+        confirmacion_segundos=(float(minimo), float(maximo or minimo)),
+        prob_sin_confirmar=args.sin_confirmar,
+        prob_larga=args.larga,
+        horas=args.horas,
+        semilla=args.semilla,
+    ))
@@ -0,0 +1,100 @@
+import re
+from typing import Optional, Tuple
+
+import pandas as pd
+
+# ==============================================
+# CLASIFICACIÓN DE RESULTADOS DE LLAMADAS (POR COLUMNAS)
+# ==============================================
+#
+# Versión por columnas de contar_ventas_resultado,
+# contar_ventas_resultado_mejorado y detectar_pendientes_sms_mejorado
+# (llamadas_analyzer): mismas reglas, pero sobre pd.Series enteras con
+# operaciones de texto de pandas y patrones compilados una sola vez, en
+# vez de str().upper() y búsquedas de subcadenas fila a fila con apply.
+# Con columnas categóricas, pandas evalúa cada texto distinto una vez.
+#
+# Reglas:
+#   - 'PENDIENTE SMS' en el resultado (o en el motivo) → no es venta aún
+#   - 'UTIL POSITIVO' → 1 venta, o 2 si es dúo (LUZ y GAS, DÚO o DUO)
+
+PENDIENTE_SMS = re.compile('PENDIENTE SMS')
+UTIL_POSITIVO = re.compile('UTIL POSITIVO')
+LUZ = re.compile('LUZ')
+GAS = re.compile('GAS')
+DUO = re.compile('DÚO|DUO')
+
+
+def _texto(columna: pd.Series, nulo_vacio: bool = True) -> pd.Series:
+    """str(valor).upper() de cada fila ('' para los nulos si nulo_vacio)"""
+    texto = columna.astype(str).str.upper()
+    if nulo_vacio:
+        texto = texto.mask(columna.isna().to_numpy(), '')
+    return texto
+
+
+def _contiene(texto: pd.Series, patron: re.Pattern) -> pd.Series:
+    return texto.str.contains(patron, na=False)
+
+
+def _es_duo(texto: pd.Series) -> pd.Series:
+    return (_contiene(texto, LUZ) & _contiene(texto, GAS)) | _contiene(texto, DUO)
+
+
+def _ventas(texto: pd.Series, pendiente: pd.Series) -> pd.Series:
+    """0 si pendiente o sin UTIL POSITIVO; si no 1, o 2 si es dúo"""
+    ventas = _contiene(texto, UTIL_POSITIVO).astype(int) * (1 + _es_duo(texto).astype(int))
+    return ventas.where(~pendiente, 0)
+
+
+def ventas_resultado(resultado: pd.Series) -> pd.Series:
+    """Ventas de cada resultado, como contar_ventas_resultado"""
+    texto = _texto(resultado)
+    return _ventas(texto, _contiene(texto, PENDIENTE_SMS))
+
+
+def ventas_resultado_mejorado(resultado: pd.Series, motivo: Optional[pd.Series] = None) -> pd.Series:
+    """
+    Ventas de cada resultado teniendo en cuenta PENDIENTE SMS en el
+    motivo, como contar_ventas_resultado_mejorado
+    """
+    texto = _texto(resultado)
+    pendiente = _contiene(texto, PENDIENTE_SMS)
+    if motivo is not None:
+        pendiente = pendiente | _contiene(_texto(motivo), PENDIENTE_SMS).to_numpy()
+    return _ventas(texto, pendiente)
+
+
+def pendientes_sms(resultado_elec: Optional[pd.Series], resultado_gas: Optional[pd.Series],
+                   motivo_elec: Optional[pd.Series] = None,
+                   motivo_gas: Optional[pd.Series] = None,
+                   index: Optional[pd.Index] = None) -> Tuple[pd.Series, pd.Series]:
+    """
+    Ventas pendientes de SMS de cada llamada, como
+    detectar_pendientes_sms_mejorado. Las columnas que falten cuentan
+    como vacías.
+
+    Returns:
+        (tiene_pendiente, ventas_pendientes): Series de bool y de int
+    """
+    columnas = (resultado_elec, resultado_gas, motivo_elec, motivo_gas)
+    if index is None:
+        index = next(c.index for c in columnas if c is not None)
+
+    def texto(columna):
+        if columna is None:
+            return pd.Series('', index=index)
+        return _texto(columna)
+
+    elec, gas = texto(resultado_elec), texto(resultado_gas)
+    pendiente_elec = _contiene(elec, PENDIENTE_SMS) | _contiene(texto(motivo_elec), PENDIENTE_SMS)
+    pendiente_gas = _contiene(gas, PENDIENTE_SMS) | _contiene(texto(motivo_gas), PENDIENTE_SMS)
+
+    ventas = pendiente_elec.astype(int) * (1 + _es_duo(elec).astype(int))
+    ventas = ventas + (pendiente_gas & (ventas < 2)).astype(int)
+    return ventas > 0, ventas
+
+
+def util_positivo(resultado: pd.Series) -> pd.Series:
+    """Si 'UTIL POSITIVO' aparece en str(resultado).upper() (nulos incluidos)"""
+    return _contiene(_texto(resultado, nulo_vacio=False), UTIL_POSITIVO)
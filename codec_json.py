@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+
+# ==============================================
+# CODEC DE SERIALIZACIÓN PARA data/
+# ==============================================
+#
+# Usa orjson si está instalado y la librería estándar si no. Siempre escribe
+# JSON compacto (sin indentación) en UTF-8 y lee sin problema los archivos
+# antiguos guardados con indent=4. Los errores de parseo son siempre
+# json.JSONDecodeError (orjson.JSONDecodeError hereda de ella), así que los
+# 'except json.JSONDecodeError' existentes siguen funcionando.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+def loads(contenido):
+    """Parsea JSON desde str o bytes"""
+    if orjson is not None:
+        try:
+            return orjson.loads(contenido)
+        except orjson.JSONDecodeError:
+            # Archivos antiguos con NaN/Infinity (los escribía json.dump):
+            # orjson los rechaza, la librería estándar no
+            pass
+    if isinstance(contenido, (bytes, bytearray)):
+        contenido = contenido.decode('utf-8')
+    return json.loads(contenido)
+
+
+def _por_defecto(valor):
+    """Escalares de numpy (vienen de código con pandas) → tipos de Python"""
+    if hasattr(valor, 'item'):
+        return valor.item()
+    raise TypeError(f"Object of type {type(valor).__name__} is not JSON serializable")
+
+
+def dumps(data) -> str:
+    """Serializa a JSON compacto (texto UTF-8, sin escapar acentos)"""
+    if orjson is not None:
+        return orjson.dumps(
+            data, default=_por_defecto,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        ).decode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=_por_defecto)
+
+
+def leer_archivo(ruta):
+    """Lee y parsea un archivo JSON (compacto o indentado)"""
+    with open(ruta, 'rb') as f:
+        return loads(f.read())
+
+
+def escribir_archivo(ruta, data) -> None:
+    """Escribe un archivo JSON compacto de forma atómica"""
+    escribir_texto_atomico(ruta, dumps(data))
+
+
+def escribir_texto_atomico(ruta, contenido: str) -> None:
+    """
+    Escribe el texto en un temporal del mismo directorio y lo sustituye con
+    os.replace, así un lector nunca ve un archivo a medio escribir.
+    """
+    ruta = os.fspath(ruta)
+    directorio = os.path.dirname(ruta) or '.'
+    os.makedirs(directorio, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(ruta)}.", suffix='.tmp', dir=directorio)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(contenido)
+        os.replace(tmp_path, ruta)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
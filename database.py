@@ -1,7 +1,12 @@
 import os
 import shutil
 import json
+import hashlib
+import marshal
+import threading
+import uuid
 import pandas as pd
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
 from config import (
@@ -10,9 +15,379 @@ from config import (
     SISTEMA_CONFIG_DEFAULT, GRUPOS_PVD_CONFIG,
     SUPER_USER_CONFIG_DEFAULT
 )
-from utils import inicializar_directorios
+from utils import inicializar_directorios, obtener_hora_madrid
+import registro_llamadas_db
+import pvd_cola_db
+import pvd_historico
+import pvd_tiempos
+import codec_json
+import backup_store
+import migraciones
+from registro_matriz import MatrizRegistro
+from almacen_mensual import AlmacenMensual
+from pvd_estado import EstadoPVD
 
+# Archivo único antiguo; las monitorizaciones viven en MONITORIZACIONES_DIR/<YYYY-MM>.json
 MONITORIZACIONES_FILE = 'data/monitorizaciones.json'
+MONITORIZACIONES_DIR = 'data/monitorizaciones'
+REGISTRO_LLAMADAS_FILE = 'data/registro_llamadas.json'
+# Log de incrementos pendientes de compactar en REGISTRO_LLAMADAS_FILE
+REGISTRO_LLAMADAS_LOG = 'data/registro_llamadas.log.jsonl'
+REGISTRO_LLAMADAS_LOG_MAX_BYTES = 256 * 1024
+
+# ==============================================
+# CACHÉ DE LECTURA COMPARTIDA
+# ==============================================
+
+# {ruta_normalizada: ((mtime_ns, tamaño), contenido_serializado)}
+_cache_lectura = {}
+_cache_lock = threading.Lock()
+
+def _clave_cache(ruta):
+    """Normaliza la ruta para que 'data/x.json' y Path('data/x.json') compartan entrada"""
+    return os.path.normpath(os.fspath(ruta))
+
+def _leer_json_cacheado(ruta):
+    """
+    Lee un archivo JSON pasando por la caché del proceso.
+
+    La entrada se valida con (mtime_ns, tamaño), así que un archivo sin cambios
+    no se vuelve a leer ni a parsear. Se guarda serializado con marshal y cada
+    llamada recibe una copia independiente: el llamador puede mutarla sin
+    afectar a otras sesiones.
+
+    Lanza FileNotFoundError / json.JSONDecodeError igual que json.load
+    (el parseo lo hace codec_json, que acepta el formato indentado antiguo).
+    """
+    clave = _clave_cache(ruta)
+    
+    # Dentro de un lote, lo guardado y aún no escrito tiene prioridad
+    pendientes = getattr(_lote_local, 'pendientes', None)
+    if pendientes and clave in pendientes:
+        return codec_json.loads(pendientes[clave][0])
+    
+    stat = os.stat(clave)
+    
+    def _leer():
+        return codec_json.leer_archivo(clave)
+    
+    return _leer_cacheado(clave, (stat.st_mtime_ns, stat.st_size), _leer)
+
+def _leer_cacheado(clave, firma, cargador):
+    """Devuelve una copia de la entrada si la firma coincide; si no, llama a cargador()"""
+    with _cache_lock:
+        entrada = _cache_lectura.get(clave)
+    
+    if entrada is not None and entrada[0] == firma:
+        return marshal.loads(entrada[1])
+    
+    data = cargador()
+    
+    with _cache_lock:
+        _cache_lectura[clave] = (firma, marshal.dumps(data))
+    
+    return data
+
+def _invalidar_cache(ruta):
+    """Descarta la entrada de caché de un archivo tras escribirlo"""
+    with _cache_lock:
+        _cache_lectura.pop(_clave_cache(ruta), None)
+
+def _firma_archivos(*rutas):
+    """
+    (mtime_ns, tamaño) de cada ruta, para validar cachés derivadas de ellas.
+    None si alguna tiene una escritura pendiente en el lote actual.
+    """
+    pendientes = getattr(_lote_local, 'pendientes', None)
+    if pendientes and any(_clave_cache(ruta) in pendientes for ruta in rutas):
+        return None
+    
+    firma = []
+    for ruta in rutas:
+        try:
+            stat = os.stat(ruta)
+            firma.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            firma.append(None)
+    return tuple(firma)
+
+def _copiar(data):
+    """Copia independiente de datos JSON (mismo truco que la caché de lectura)"""
+    return marshal.loads(marshal.dumps(data))
+
+def restaurar_backup(ruta, momento=None):
+    """
+    Restaura un archivo de data/ a su versión en un momento dado
+    
+    Args:
+        ruta: Archivo a restaurar (p.ej. 'data/usuarios.json')
+        momento: datetime objetivo; None = última versión guardada
+    
+    Returns:
+        bool: True si se restauró
+    """
+    try:
+        restaurado = backup_store.restaurar_archivo(ruta, momento)
+        _invalidar_cache(ruta)
+        if restaurado:
+            _reiniciar_schema(ruta)
+        return restaurado
+    except Exception as e:
+        print(f"Error restaurando backup de {ruta}: {e}")
+        return False
+
+def limpiar_cache_lectura():
+    """Vacía la caché de lectura completa (p.ej. tras restaurar backups)"""
+    with _cache_lock:
+        _cache_lectura.clear()
+
+# ==============================================
+# ESCRITURA ATÓMICA Y AGRUPADA
+# ==============================================
+
+# Lote de escritura del hilo actual: {ruta: (json_texto, hacer_backup)}
+_lote_local = threading.local()
+
+# Backups pendientes, los registra en backup_store un hilo en segundo plano
+_backups_pendientes = set()
+_backups_lock = threading.Lock()
+_backups_evento = threading.Event()
+_backup_thread = None
+
+# Funciones llamadas tras cada escritura real a disco: funcion(ruta)
+_observadores_escritura = []
+
+def registrar_observador_escritura(funcion):
+    """
+    Registra funcion(ruta) para que se llame después de cada escritura a
+    disco (dentro de un lote, al volcarlo). La llama el hilo que escribe.
+    """
+    if funcion not in _observadores_escritura:
+        _observadores_escritura.append(funcion)
+
+def _escribir_json_atomico(ruta, contenido):
+    """Escritura atómica (temporal + os.replace) que además invalida la caché"""
+    ruta = _clave_cache(ruta)
+    try:
+        codec_json.escribir_texto_atomico(ruta, contenido)
+    finally:
+        _invalidar_cache(ruta)
+    
+    if ruta in _schema_verificado:
+        # Escritura propia: el archivo sigue con el esquema comprobado
+        _schema_verificado[ruta] = _firma_schema(ruta)
+    
+    for funcion in list(_observadores_escritura):
+        try:
+            funcion(ruta)
+        except Exception as e:
+            print(f"Error notificando escritura de {ruta}: {e}")
+
+def _worker_backups():
+    """
+    Registra en el almacén de backups los archivos guardados, una vez por
+    archivo y ronda. Un contenido idéntico al último no ocupa nada nuevo.
+    """
+    while True:
+        _backups_evento.wait()
+        _backups_evento.clear()
+        
+        with _backups_lock:
+            rutas = list(_backups_pendientes)
+            _backups_pendientes.clear()
+        
+        for ruta in rutas:
+            try:
+                contenido = None
+                if ruta == _clave_cache(registro_llamadas_db.DB_PATH):
+                    # Copia consistente (con lo que haya en el WAL), no los
+                    # bytes de la base viva
+                    contenido = registro_llamadas_db.instantanea()
+                backup_store.registrar_version(ruta, contenido)
+            except Exception as e:
+                print(f"Error creando backup de {ruta}: {e}")
+        
+        try:
+            if backup_store.retencion_pendiente():
+                backup_store.aplicar_retencion()
+        except Exception as e:
+            print(f"Error aplicando retención de backups: {e}")
+
+def _programar_backup(ruta):
+    """Encola la copia de backup de un archivo sin bloquear al llamador"""
+    global _backup_thread
+    
+    with _backups_lock:
+        _backups_pendientes.add(_clave_cache(ruta))
+        if _backup_thread is None or not _backup_thread.is_alive():
+            _backup_thread = threading.Thread(target=_worker_backups, daemon=True)
+            _backup_thread.start()
+    
+    _backups_evento.set()
+
+def _guardar_json(ruta, data, backup=True):
+    """
+    Guarda datos JSON de forma atómica y, opcionalmente, programa su backup.
+
+    Si hay un lote abierto en este hilo (ver lote_escritura), solo se anota
+    el contenido y la escritura real se hace una vez al cerrar el lote.
+    """
+    # Serializar ya: el llamador puede seguir mutando 'data' después
+    _guardar_texto(ruta, codec_json.dumps(data), backup)
+
+def _guardar_texto(ruta, contenido, backup=True):
+    """Igual que _guardar_json pero con el contenido ya serializado"""
+    ruta = _clave_cache(ruta)
+    
+    pendientes = getattr(_lote_local, 'pendientes', None)
+    if pendientes is not None:
+        pendientes[ruta] = (contenido, backup)
+        return
+    
+    _escribir_json_atomico(ruta, contenido)
+    if backup:
+        _programar_backup(ruta)
+
+class ErrorEscrituraLote(Exception):
+    """Alguna escritura de un lote falló al volcarlo (ver lote_escritura)"""
+
+    def __init__(self, errores):
+        self.errores = errores  # [(ruta, excepción)]
+        super().__init__("; ".join(f"{ruta}: {e}" for ruta, e in errores))
+
+@contextmanager
+def lote_escritura():
+    """
+    Agrupa todos los guardar_* de un rerun o de un tick en segundo plano.
+
+    Cada archivo modificado se escribe una sola vez al salir del bloque,
+    aunque se haya guardado varias veces dentro. Los lotes anidados se
+    integran en el exterior.
+
+    Dentro del lote los guardar_* devuelven éxito antes de escribir nada:
+    si al volcarlo falla algún archivo, se intentan igualmente los demás y
+    se lanza ErrorEscrituraLote para que el llamador lo muestre.
+    """
+    if getattr(_lote_local, 'pendientes', None) is not None:
+        yield
+        return
+    
+    _lote_local.pendientes = {}
+    try:
+        yield
+    finally:
+        pendientes = _lote_local.pendientes
+        _lote_local.pendientes = None
+        
+        errores = []
+        for ruta, (contenido, backup) in pendientes.items():
+            try:
+                _escribir_json_atomico(ruta, contenido)
+                if backup:
+                    _programar_backup(ruta)
+            except Exception as e:
+                print(f"Error escribiendo {ruta}: {e}")
+                errores.append((ruta, e))
+        
+        if errores:
+            raise ErrorEscrituraLote(errores)
+
+# ==============================================
+# MIGRACIONES DE ESQUEMA
+# ==============================================
+
+_schema_lock = threading.Lock()
+# {archivo: (mtime_ns, tamaño)} ya comprobado en este proceso; las
+# escrituras propias lo actualizan (_escribir_json_atomico), así que otra
+# firma significa que el archivo se sustituyó desde fuera
+_schema_verificado = {}
+
+def _firma_schema(clave):
+    try:
+        stat = os.stat(clave)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _hash_schema(data):
+    return hashlib.sha256(codec_json.dumps(data).encode('utf-8')).hexdigest()
+
+def _leer_versiones_schema():
+    try:
+        return _leer_json_cacheado(migraciones.SCHEMA_VERSIONS_FILE)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _asegurar_schema(ruta):
+    """
+    Ejecuta las migraciones pendientes de un archivo de data/.
+
+    data/schema_versions.json guarda por archivo la versión aplicada y el
+    hash del contenido migrado. Si el archivo ya no tiene ese contenido
+    (sustituido por la sincronización con GitHub, un backup restaurado o a
+    mano) se le vuelven a pasar todas sus migraciones, que son idempotentes,
+    y solo se reescribe si cambia. Mientras el archivo no cambie desde
+    fuera del proceso es solo un os.stat. Lanza json.JSONDecodeError si el
+    archivo está corrupto (sin marcarlo como migrado) para que el cargador
+    aplique su recuperación habitual.
+    """
+    clave = _clave_cache(ruta)
+    archivo = clave.replace(os.sep, '/')
+    if not migraciones.version_actual(archivo):
+        return
+    
+    firma = _firma_schema(clave)
+    if firma is not None and _schema_verificado.get(clave) == firma:
+        return
+    
+    with _schema_lock:
+        firma = _firma_schema(clave)
+        if firma is None:
+            # Archivo nuevo: se creará ya con el esquema actual
+            return
+        if _schema_verificado.get(clave) == firma:
+            return
+        
+        data = _leer_json_cacheado(clave)
+        hash_actual = _hash_schema(data)
+        versiones = _leer_versiones_schema()
+        sello = versiones.get(archivo)
+        
+        if isinstance(sello, dict) and sello.get('hash') == hash_actual:
+            pendientes = migraciones.pendientes(archivo, sello.get('version', 0))
+        else:
+            # Contenido que no migró este sistema (o sello antiguo, solo versión)
+            pendientes = migraciones.pendientes(archivo, 0)
+        
+        # Antes de guardar: si se escribe ya, _escribir_json_atomico pone la firma nueva
+        _schema_verificado[clave] = firma
+        
+        if pendientes:
+            for version, migrar in pendientes:
+                data = migrar(data)
+            hash_migrado = _hash_schema(data)
+            if hash_migrado != hash_actual:
+                _guardar_json(clave, data)
+                print(f"✅ {archivo} migrado a esquema v{pendientes[-1][0]}")
+            
+            versiones[archivo] = {'version': migraciones.version_actual(archivo), 'hash': hash_migrado}
+            _guardar_json(migraciones.SCHEMA_VERSIONS_FILE, versiones)
+
+def _reiniciar_schema(ruta):
+    """
+    Olvida la versión de un archivo sustituido por otro (backup restaurado)
+    para que la siguiente carga vuelva a pasar sus migraciones.
+    """
+    clave = _clave_cache(ruta)
+    archivo = clave.replace(os.sep, '/')
+    if not migraciones.version_actual(archivo):
+        return
+    
+    with _schema_lock:
+        _schema_verificado.pop(clave, None)
+        versiones = _leer_versiones_schema()
+        if versiones.pop(archivo, None) is not None:
+            _guardar_json(migraciones.SCHEMA_VERSIONS_FILE, versiones)
 
 def inicializar_datos():
     """Inicializa los archivos de datos con backup automático"""
@@ -26,14 +401,14 @@ def inicializar_datos():
                 'comunidades_autonomas'
             ]),
             "config_excedentes.csv": pd.DataFrame([{'precio_excedente_kwh': 0.06}]),
-            "planes_gas.json": json.dumps(PLANES_GAS_ESTRUCTURA, indent=4),
-            "config_pmg.json": json.dumps({"coste": PMG_COSTE, "iva": PMG_IVA}, indent=4),
-            "usuarios.json": json.dumps(USUARIOS_DEFAULT, indent=4),
-            "config_pvd.json": json.dumps(PVD_CONFIG_DEFAULT, indent=4),
-            "cola_pvd.json": json.dumps([], indent=4),  # Mantener para compatibilidad
-            "super_users.json": json.dumps(SUPER_USER_CONFIG_DEFAULT, indent=4),
-            "registro_llamadas.json": json.dumps({}, indent=4),
-            "config_sistema.json": json.dumps(SISTEMA_CONFIG_DEFAULT, indent=4)
+            "planes_gas.json": codec_json.dumps(PLANES_GAS_ESTRUCTURA),
+            "config_pmg.json": codec_json.dumps({"coste": PMG_COSTE, "iva": PMG_IVA}),
+            "usuarios.json": codec_json.dumps(USUARIOS_DEFAULT),
+            "config_pvd.json": codec_json.dumps(PVD_CONFIG_DEFAULT),
+            "cola_pvd.json": codec_json.dumps([]),  # Mantener para compatibilidad
+            "super_users.json": codec_json.dumps(SUPER_USER_CONFIG_DEFAULT),
+            "registro_llamadas.json": codec_json.dumps({}),
+            "config_sistema.json": codec_json.dumps(SISTEMA_CONFIG_DEFAULT)
         }
         
         for archivo, df_default in archivos_criticos.items():
@@ -41,12 +416,20 @@ def inicializar_datos():
             ruta_backup = f"data_backup/{archivo}"
             
             if not os.path.exists(ruta_data):
-                if os.path.exists(ruta_backup):
+                # 1º almacén de versiones, 2º copia plana antigua de data_backup/
+                try:
+                    restaurado = backup_store.restaurar_archivo(ruta_data)
+                except Exception as e:
+                    print(f"Error restaurando {archivo} desde el almacén: {e}")
+                    restaurado = False
+                
+                if not restaurado and os.path.exists(ruta_backup):
                     try:
                         shutil.copy(ruta_backup, ruta_data)
+                        restaurado = True
                     except Exception as e:
                         print(f"Error restaurando {archivo}: {e}")
-                else:
+                elif not restaurado:
                     try:
                         if archivo.endswith('.json'):
                             with open(ruta_data, 'w', encoding='utf-8') as f:
@@ -55,12 +438,12 @@ def inicializar_datos():
                             df_default.to_csv(ruta_data, index=False, encoding='utf-8')
                     except Exception as e:
                         print(f"Error creando {archivo}: {e}")
+                
+                if restaurado:
+                    _reiniciar_schema(ruta_data)
             
-            try:
-                if os.path.exists(ruta_data):
-                    shutil.copy(ruta_data, ruta_backup)
-            except Exception as e:
-                print(f"Error creando backup de {archivo}: {e}")
+            if os.path.exists(ruta_data):
+                _programar_backup(ruta_data)
         
         # Backup de modelos de factura
         if os.path.exists("modelos_facturas") and os.listdir("modelos_facturas"):
@@ -74,6 +457,10 @@ def inicializar_datos():
     
     # Inicializar archivo de alertas SMS
     inicializar_archivo_alertas_sms()
+    
+    # Varias réplicas sobre el mismo data/: colas PVD en SQLite
+    if os.environ.get('PVD_COLAS_SQLITE', '0') == '1' and not pvd_cola_db.backend_activo():
+        migrar_colas_pvd_a_sqlite()
 
 def inicializar_archivo_alertas_sms():
     """Inicializa el archivo de alertas SMS si no existe"""
@@ -83,7 +470,7 @@ def inicializar_archivo_alertas_sms():
         if not os.path.exists(archivo):
             os.makedirs('data', exist_ok=True)
             with open(archivo, 'w', encoding='utf-8') as f:
-                json.dump({}, f, indent=4, ensure_ascii=False)
+                f.write(codec_json.dumps({}))
             print("✅ Archivo de alertas SMS creado")
         
         return True
@@ -98,23 +485,15 @@ def inicializar_archivo_alertas_sms():
 def cargar_configuracion_usuarios():
     """Carga la configuración de usuarios desde archivo"""
     try:
-        with open('data/usuarios.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return _leer_json_cacheado('data/usuarios.json')
     except (FileNotFoundError, json.JSONDecodeError):
-        os.makedirs('data', exist_ok=True)
-        with open('data/usuarios.json', 'w', encoding='utf-8') as f:
-            json.dump(USUARIOS_DEFAULT, f, indent=4, ensure_ascii=False)
+        _guardar_json('data/usuarios.json', USUARIOS_DEFAULT, backup=False)
         return USUARIOS_DEFAULT.copy()
 
 def guardar_configuracion_usuarios(usuarios_config):
     """Guarda la configuración de usuarios de forma segura"""
     try:
-        os.makedirs('data', exist_ok=True)
-        with open('data/usuarios.json', 'w', encoding='utf-8') as f:
-            json.dump(usuarios_config, f, indent=4, ensure_ascii=False)
-        
-        os.makedirs('data_backup', exist_ok=True)
-        shutil.copy('data/usuarios.json', 'data_backup/usuarios.json')
+        _guardar_json('data/usuarios.json', usuarios_config)
         return True
     except Exception as e:
         print(f"Error guardando usuarios: {e}")
@@ -123,8 +502,7 @@ def guardar_configuracion_usuarios(usuarios_config):
 def cargar_config_sistema():
     """Carga la configuración del sistema"""
     try:
-        with open('data/config_sistema.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
+        config = _leer_json_cacheado('data/config_sistema.json')
         
         # Asegurar que tiene todos los campos necesarios
         campos_requeridos = ["login_automatico_activado", "sesion_horas_duracion", 
@@ -151,20 +529,13 @@ def cargar_config_sistema():
         from config import SECCIONES_USUARIO
         config['secciones_activas'] = {seccion: True for seccion in SECCIONES_USUARIO.keys()}
         
-        os.makedirs('data', exist_ok=True)
-        with open('data/config_sistema.json', 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
+        _guardar_json('data/config_sistema.json', config, backup=False)
         return config
 
 def guardar_config_sistema(config):
     """Guarda la configuración del sistema"""
     try:
-        os.makedirs('data', exist_ok=True)
-        with open('data/config_sistema.json', 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
-        
-        os.makedirs('data_backup', exist_ok=True)
-        shutil.copy('data/config_sistema.json', 'data_backup/config_sistema.json')
+        _guardar_json('data/config_sistema.json', config)
         return True
     except Exception as e:
         print(f"Error guardando configuración: {e}")
@@ -173,8 +544,7 @@ def guardar_config_sistema(config):
 def cargar_config_pvd():
     """Carga la configuración del sistema PVD"""
     try:
-        with open('data/config_pvd.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
+        config = _leer_json_cacheado('data/config_pvd.json')
         
         # Migración de versiones antiguas
         if 'duracion_pvd' in config and 'duracion_corta' not in config:
@@ -233,12 +603,7 @@ def guardar_config_pvd(config):
         if 'auto_refresh_interval' not in config:
             config['auto_refresh_interval'] = 60
         
-        os.makedirs('data', exist_ok=True)
-        with open('data/config_pvd.json', 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
-        
-        os.makedirs('data_backup', exist_ok=True)
-        shutil.copy('data/config_pvd.json', 'data_backup/config_pvd.json')
+        _guardar_json('data/config_pvd.json', config)
         return True
     except Exception as e:
         print(f"Error guardando configuración PVD: {e}")
@@ -248,63 +613,87 @@ def guardar_config_pvd(config):
 # FUNCIONES DE COLAS PVD POR GRUPOS (NUEVO SISTEMA)
 # ==============================================
 
+# Las colas viven en memoria (pvd_estado.EstadoPVD); los archivos
+# data/pvd_cola_<grupo>.json se escriben en segundo plano. Con varias
+# réplicas, migrar a SQLite (migrar_colas_pvd_a_sqlite: botón en
+# Administración PVD o PVD_COLAS_SQLITE=1 al arrancar)
+estado_pvd = EstadoPVD(leer=_leer_json_cacheado, guardar=_guardar_json, db=pvd_cola_db,
+                       migrar=migraciones.migrar_cola_pvd)
+
 def cargar_cola_pvd_grupo(grupo_id):
-    """Carga la cola PVD específica de un grupo"""
+    """Carga la cola PVD específica de un grupo (copia, se puede modificar)"""
     try:
-        file_path = Path(f"data/pvd_cola_{grupo_id}.json")
-        if file_path.exists():
-            with open(file_path, 'r', encoding='utf-8') as f:
-                cola = json.load(f)
-            
-            # Limpiar pausas completadas de días anteriores
-            cola_limpia = _limpiar_cola_antigua(cola)
-            if len(cola_limpia) < len(cola):
-                guardar_cola_pvd_grupo(grupo_id, cola_limpia)
-                return cola_limpia
-            
-            return cola
-    except (FileNotFoundError, json.JSONDecodeError):
-        pass
+        cola = estado_pvd.cola(grupo_id)
+        
+        # Limpiar pausas completadas de días anteriores (pasan al histórico)
+        cola_limpia = _limpiar_cola_antigua(cola)
+        if len(cola_limpia) < len(cola):
+            try:
+                with estado_pvd.modificar(grupo_id) as cola_viva:
+                    _archivar_y_limpiar(grupo_id, cola_viva)
+            except Exception as e:
+                # Sin archivar no se quita nada: se muestra la cola entera
+                print(f"Error archivando cola PVD grupo {grupo_id}: {e}")
+                return cola
+            return cola_limpia
+        
+        return cola
+    except Exception as e:
+        print(f"Error cargando cola PVD grupo {grupo_id}: {e}")
     
     # Si no existe, crear estructura vacía
     return []
 
 def guardar_cola_pvd_grupo(grupo_id, cola_data):
-    """Guarda la cola PVD específica de un grupo"""
+    """Guarda la cola PVD específica de un grupo (sustituye la cola completa)"""
     try:
-        os.makedirs('data', exist_ok=True)
-        file_path = Path(f"data/pvd_cola_{grupo_id}.json")
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(cola_data, f, indent=4, ensure_ascii=False)
-        
-        # Backup
-        backup_path = Path(f"data_backup/pvd_cola_{grupo_id}.json")
-        os.makedirs('data_backup', exist_ok=True)
-        shutil.copy(file_path, backup_path)
+        estado_pvd.reemplazar(grupo_id, cola_data)
         return True
     except Exception as e:
         print(f"Error guardando cola PVD grupo {grupo_id}: {e}")
         return False
 
+def modificar_cola_pvd_grupo(grupo_id):
+    """
+    Context manager con la cola viva del grupo y su lock tomado.
+    
+    Para cambios que dependen del estado de varias pausas (finalizar y
+    avisar al siguiente, limpiezas...): nadie más toca el grupo mientras
+    dura el bloque. Se guarda al salir si hubo cambios.
+    """
+    return estado_pvd.modificar(grupo_id)
+
+def agregar_pausa_pvd(grupo_id, pausa):
+    """Añade una pausa a la cola del grupo"""
+    try:
+        estado_pvd.agregar_pausa(grupo_id, pausa)
+        return True
+    except Exception as e:
+        print(f"Error añadiendo pausa PVD al grupo {grupo_id}: {e}")
+        return False
+
+def actualizar_pausa_pvd(grupo_id, pausa_id, cambios):
+    """
+    Actualiza campos de una pausa (confirmar, cancelar, finalizar...)
+    
+    Returns:
+        dict: Pausa actualizada, o None si no existe
+    """
+    try:
+        return estado_pvd.actualizar_pausa(grupo_id, pausa_id, cambios)
+    except Exception as e:
+        print(f"Error actualizando pausa PVD {pausa_id} del grupo {grupo_id}: {e}")
+        return None
+
 def obtener_todas_colas_pvd():
     """Obtiene todas las colas PVD de todos los grupos"""
     colas = {}
-    data_dir = Path("data")
-    
-    if data_dir.exists():
-        for file_path in data_dir.glob("pvd_cola_*.json"):
-            grupo_id = file_path.stem.replace("pvd_cola_", "")
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    colas[grupo_id] = json.load(f)
-            except:
-                colas[grupo_id] = []
     
-    # Si no hay colas por grupo, usar la cola consolidada (compatibilidad)
-    if not colas:
-        cola_consolidada = cargar_cola_pvd()
-        if cola_consolidada:
-            colas['basico'] = cola_consolidada
+    for grupo_id in estado_pvd.grupos():
+        try:
+            colas[grupo_id] = estado_pvd.cola(grupo_id)
+        except Exception:
+            colas[grupo_id] = []
     
     return colas
 
@@ -322,10 +711,8 @@ def consolidar_colas_pvd():
     return cola_consolidada
 
 def _limpiar_cola_antigua(cola_data):
-    """Limpia pausas completadas de días anteriores"""
-    from datetime import datetime, timedelta
-    
-    hoy = datetime.now().date()
+    """Limpia pausas completadas de días anteriores (día de Madrid)"""
+    hoy = pvd_tiempos.limites_dia(obtener_hora_madrid())
     cola_limpia = []
     
     for pausa in cola_data:
@@ -338,34 +725,88 @@ def _limpiar_cola_antigua(cola_data):
         
         # Para pausas completadas o canceladas, verificar fecha
         if estado in ['COMPLETADO', 'CANCELADO']:
-            try:
-                fecha_key = 'timestamp_fin' if estado == 'COMPLETADO' else 'timestamp_solicitud'
-                if fecha_key in pausa:
-                    fecha_pausa = datetime.fromisoformat(pausa[fecha_key]).date()
-                    # Mantener solo si es de hoy
-                    if fecha_pausa == hoy:
-                        cola_limpia.append(pausa)
-            except:
-                # Si hay error al parsear fecha, mantener por seguridad
-                cola_limpia.append(pausa)
+            campo = 'timestamp_fin' if estado == 'COMPLETADO' else 'timestamp_solicitud'
+            if pvd_tiempos.epoch(pausa, campo) is None:
+                # Fecha ilegible: mantener por seguridad (sin fecha: se descarta)
+                if campo in pausa:
+                    cola_limpia.append(pausa)
                 continue
+            # Mantener solo si es de hoy
+            if pvd_tiempos.es_del_dia(pausa, campo, hoy):
+                cola_limpia.append(pausa)
     
     return cola_limpia
 
+def _archivar_y_limpiar(grupo_id, cola_grupo):
+    """
+    Pasa las pausas terminadas al histórico (pvd_historico) y quita de la
+    cola viva las de días anteriores. Si el archivado falla no se quita
+    nada. Devuelve cuántas pausas se quitaron.
+    """
+    pvd_historico.archivar_pausas(grupo_id, cola_grupo)
+    cola_limpia = _limpiar_cola_antigua(cola_grupo)
+    eliminadas = len(cola_grupo) - len(cola_limpia)
+    if eliminadas:
+        cola_grupo[:] = cola_limpia
+    return eliminadas
+
 def limpiar_todas_colas_antiguas():
-    """Limpia todas las colas PVD de datos antiguos"""
+    """Archiva las pausas terminadas y limpia las colas PVD de datos antiguos"""
     try:
-        todas_colas = obtener_todas_colas_pvd()
-        for grupo_id, cola_grupo in todas_colas.items():
-            cola_limpia = _limpiar_cola_antigua(cola_grupo)
-            if len(cola_limpia) < len(cola_grupo):
-                guardar_cola_pvd_grupo(grupo_id, cola_limpia)
-                print(f"✅ Cola {grupo_id}: {len(cola_grupo) - len(cola_limpia)} pausas antiguas limpiadas")
+        for grupo_id in estado_pvd.grupos():
+            with estado_pvd.modificar(grupo_id) as cola_grupo:
+                eliminadas = _archivar_y_limpiar(grupo_id, cola_grupo)
+                if eliminadas:
+                    print(f"✅ Cola {grupo_id}: {eliminadas} pausas antiguas limpiadas")
         return True
     except Exception as e:
         print(f"Error limpiando colas antiguas: {e}")
         return False
 
+def migrar_colas_pvd_a_sqlite(forzar=False):
+    """
+    Migración única de las colas data/pvd_cola_<grupo>.json al backend
+    SQLite, necesario si varios procesos comparten data/. Se lanza desde
+    Administración PVD o al arrancar con PVD_COLAS_SQLITE=1.
+    
+    La primera vez la base se construye en un archivo temporal y se activa
+    al final (_publicar_db_sqlite). Con forzar=True sobre una base ya
+    activa, las colas se importan en una sola transacción sobre esa misma
+    base. Los JSON originales se conservan sin tocar.
+    
+    Returns:
+        int: Grupos migrados (0 si ya estaba migrado), -1 si hubo error
+    """
+    if pvd_cola_db.backend_activo() and not forzar:
+        return 0
+    
+    db_path = pvd_cola_db.DB_PATH
+    tmp_path = f"{db_path}.migracion.{os.getpid()}"
+    try:
+        # Lo pendiente de escribir también cuenta
+        estado_pvd.esperar_persistencia(timeout=10)
+        colas = obtener_todas_colas_pvd()
+        
+        if pvd_cola_db.backend_activo():
+            pvd_cola_db.importar_colas(colas)
+        else:
+            for sufijo in ('', '-wal', '-shm'):
+                if os.path.exists(tmp_path + sufijo):
+                    os.remove(tmp_path + sufijo)
+            
+            pvd_cola_db.importar_colas(colas, db_path=tmp_path)
+            pvd_cola_db.cerrar_conexion(tmp_path)
+            
+            if not _publicar_db_sqlite(tmp_path, db_path):
+                print("Colas PVD ya migradas a SQLite por otro proceso")
+                return 0
+        
+        print(f"✅ Colas PVD migradas a SQLite: {len(colas)} grupos")
+        return len(colas)
+    except Exception as e:
+        print(f"Error migrando colas PVD a SQLite: {e}")
+        return -1
+
 # Función de compatibilidad (mantener para código existente)
 def cargar_cola_pvd():
     """Carga la cola actual de PVD (compatibilidad)"""
@@ -410,26 +851,18 @@ def guardar_cola_pvd(cola):
 def cargar_super_users():
     """Carga la configuración de super usuarios"""
     try:
-        with open('data/super_users.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return _leer_json_cacheado('data/super_users.json')
     except (FileNotFoundError, json.JSONDecodeError):
         from config import SUPER_USER_CONFIG_DEFAULT
         config = SUPER_USER_CONFIG_DEFAULT.copy()
         
-        os.makedirs('data', exist_ok=True)
-        with open('data/super_users.json', 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
+        _guardar_json('data/super_users.json', config, backup=False)
         return config
 
 def guardar_super_users(config):
     """Guarda la configuración de super usuarios"""
     try:
-        os.makedirs('data', exist_ok=True)
-        with open('data/super_users.json', 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
-        
-        os.makedirs('data_backup', exist_ok=True)
-        shutil.copy('data/super_users.json', 'data_backup/super_users.json')
+        _guardar_json('data/super_users.json', config)
         return True
     except Exception as e:
         print(f"Error guardando super users: {e}")
@@ -441,107 +874,515 @@ def guardar_super_users(config):
 
 def cargar_registro_llamadas():
     """Carga el registro histórico de llamadas"""
+    if registro_llamadas_db.backend_activo():
+        try:
+            return _leer_cacheado(
+                _clave_cache(registro_llamadas_db.DB_PATH),
+                registro_llamadas_db.firma_archivos(),
+                registro_llamadas_db.cargar_registro
+            )
+        except Exception as e:
+            print(f"Error cargando registro llamadas (SQLite): {e}")
+            return {}
+    
     try:
-        with open('data/registro_llamadas.json', 'r', encoding='utf-8') as f:
-            registro = json.load(f)
-        
-        # MIGRACIÓN: Asegurar que los registros antiguos tengan ambos campos
-        for fecha_str, datos_dia in registro.items():
-            for agent_id, datos_agente in datos_dia.items():
-                if 'llamadas' in datos_agente and 'llamadas_totales' not in datos_agente:
-                    # Los datos antiguos solo tienen "llamadas" (que son las >15min)
-                    datos_agente['llamadas_totales'] = 0  # Inicializar totales
-                    datos_agente['llamadas_15min'] = datos_agente.pop('llamadas')  # Renombrar
-                elif 'llamadas_15min' not in datos_agente:
-                    datos_agente['llamadas_15min'] = datos_agente.get('llamadas', 0)
-                    datos_agente['llamadas_totales'] = datos_agente.get('llamadas_totales', 0)
-        
-        return registro
+        return _cargar_registro_json()
     except (FileNotFoundError, json.JSONDecodeError):
         # Estructura: {fecha: {agent_id: {llamadas_totales: X, llamadas_15min: Y, ventas: Z}}}
         registro = {}
-        os.makedirs('data', exist_ok=True)
-        with open('data/registro_llamadas.json', 'w', encoding='utf-8') as f:
-            json.dump(registro, f, indent=4, ensure_ascii=False)
+        with _registro_log_lock:
+            _escribir_registro_directo(REGISTRO_LLAMADAS_FILE, codec_json.dumps(registro), backup=False)
+        _aplicar_log_registro(registro)
         return registro
 
+def _cargar_registro_json():
+    """Carga el JSON base del registro y le aplica los incrementos del log"""
+    # Los registros antiguos con 'llamadas' se migran una sola vez (migraciones.py)
+    _asegurar_schema(REGISTRO_LLAMADAS_FILE)
+    registro = _leer_json_cacheado(REGISTRO_LLAMADAS_FILE)
+    _aplicar_log_registro(registro, registro.pop(CLAVE_LOG_REGISTRO, None))
+    return registro
+
 def guardar_registro_llamadas(registro):
     """Guarda el registro de llamadas"""
     try:
-        os.makedirs('data', exist_ok=True)
-        with open('data/registro_llamadas.json', 'w', encoding='utf-8') as f:
-            json.dump(registro, f, indent=4, ensure_ascii=False)
-        
-        os.makedirs('data_backup', exist_ok=True)
-        shutil.copy('data/registro_llamadas.json', 'data_backup/registro_llamadas.json')
+        if registro_llamadas_db.backend_activo():
+            registro_llamadas_db.guardar_registro(registro)
+            _invalidar_cache(registro_llamadas_db.DB_PATH)
+            _programar_backup(registro_llamadas_db.DB_PATH)
+            return True
+        
+        with _registro_log_lock:
+            # El registro completo ya incluye los incrementos del log
+            _reescribir_registro_json(registro)
         return True
     except Exception as e:
         print(f"Error guardando registro llamadas: {e}")
         return False
 
+# ==============================================
+# INCREMENTOS DEL REGISTRO (LOG + COMPACTACIÓN)
+# ==============================================
+#
+# La primera línea del log es {"generacion": "..."}, nueva cada vez que se
+# vacía. registro_llamadas.json guarda en CLAVE_LOG_REGISTRO la generación
+# y los bytes del log que ya tiene sumados: si el proceso cae entre
+# reescribir la base y vaciar el log, al cargar se saltan esas entradas en
+# vez de sumarlas dos veces. Los logs antiguos sin cabecera son la
+# generación None.
+#
+# El log no pasa por backup_store: cambia con cada incremento y cada
+# versión sería un blob nuevo. Lo que se guarda es registro_llamadas.json
+# al compactar (con el log ya sumado).
+#
+# La base y el log del registro se escriben siempre directamente a disco,
+# nunca a través de un lote abierto: otra sesión puede anexar al log entre
+# el final de la compactación y el volcado del lote, y un log vacío volcado
+# después borraría esos incrementos.
+
+CLAVE_LOG_REGISTRO = '_log'
+
+_registro_log_lock = threading.RLock()
+
+def _parsear_log_registro(datos):
+    """
+    Convierte el log JSONL (bytes) en {'generacion', 'entradas', 'bytes'}.
+    
+    'entradas' son (byte donde termina la línea, entrada); solo cuentan las
+    líneas completas, y las corruptas se ignoran. 'bytes' es lo leído hasta
+    la última línea completa.
+    """
+    generacion = None
+    entradas = []
+    posicion = 0
+    while True:
+        fin = datos.find(b'\n', posicion)
+        if fin < 0:
+            # Sin más líneas completas (o una a medio escribir al final)
+            break
+        linea = datos[posicion:fin].strip()
+        posicion = fin + 1
+        if not linea:
+            continue
+        try:
+            entrada = codec_json.loads(linea)
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(entrada, dict):
+            continue
+        if 'fecha' not in entrada:
+            if not entradas:
+                generacion = entrada.get('generacion')
+            continue
+        entradas.append((posicion, entrada))
+    return {'generacion': generacion, 'entradas': entradas, 'bytes': posicion}
+
+def _leer_log_registro():
+    """Log de incrementos parseado (cacheado por firma), ver _parsear_log_registro"""
+    clave = _clave_cache(REGISTRO_LLAMADAS_LOG)
+    
+    try:
+        stat = os.stat(clave)
+    except FileNotFoundError:
+        return _parsear_log_registro(b'')
+    
+    def _leer():
+        with open(clave, 'rb') as f:
+            return _parsear_log_registro(f.read())
+    
+    return _leer_cacheado(clave, (stat.st_mtime_ns, stat.st_size), _leer)
+
+def _entradas_log_pendientes(log, sumado=None):
+    """Entradas del log que aún no están en la base ('sumado' = su CLAVE_LOG_REGISTRO)"""
+    desde = 0
+    if sumado and sumado.get('generacion') == log['generacion']:
+        desde = sumado.get('bytes', 0)
+    return [entrada for fin, entrada in log['entradas'] if fin > desde]
+
+def _aplicar_incrementos_dia(registro, fecha_str, contadores_agentes, timestamp):
+    """Suma los contadores de un día sobre el registro en memoria"""
+    datos_dia = registro.setdefault(fecha_str, {})
+    for agent_id, contadores in contadores_agentes.items():
+        datos_agente = datos_dia.get(agent_id)
+        if datos_agente is None:
+            datos_agente = datos_dia[agent_id] = {
+                'llamadas_totales': 0,
+                'llamadas_15min': 0,
+                'ventas': 0,
+                'fecha': fecha_str,
+                'timestamp': timestamp
+            }
+        for campo in registro_llamadas_db.CAMPOS_CONTADORES:
+            datos_agente[campo] = datos_agente.get(campo, 0) + contadores.get(campo, 0)
+
+def _aplicar_log_registro(registro, sumado=None):
+    """Aplica en orden las entradas del log que la base aún no tiene sumadas"""
+    for entrada in _entradas_log_pendientes(_leer_log_registro(), sumado):
+        _aplicar_incrementos_dia(
+            registro, entrada['fecha'], entrada.get('agentes', {}), entrada.get('timestamp')
+        )
+
+def _escribir_registro_directo(ruta, contenido, backup=True):
+    """Escribe la base o el log del registro sin pasar por el lote abierto"""
+    pendientes = getattr(_lote_local, 'pendientes', None)
+    if pendientes:
+        # Un guardado anterior del mismo archivo en el lote ya no vale
+        pendientes.pop(_clave_cache(ruta), None)
+    os.makedirs(os.path.dirname(_clave_cache(ruta)) or '.', exist_ok=True)
+    _escribir_json_atomico(ruta, contenido)
+    if backup:
+        _programar_backup(ruta)
+
+def _reescribir_registro_json(registro):
+    """
+    Guarda el registro completo (con el log ya sumado) y vacía el log.
+    Llamar con _registro_log_lock.
+    """
+    log = _leer_log_registro()
+    base = dict(registro)
+    base[CLAVE_LOG_REGISTRO] = {'generacion': log['generacion'], 'bytes': log['bytes']}
+    _escribir_registro_directo(REGISTRO_LLAMADAS_FILE, codec_json.dumps(base))
+    
+    # Si el proceso cae aquí, la base ya marca esas entradas como sumadas
+    if log['entradas'] or log['generacion'] is None:
+        _reiniciar_log_registro()
+
+def _reiniciar_log_registro():
+    """Deja el log vacío, con una generación nueva"""
+    cabecera = codec_json.dumps({'generacion': uuid.uuid4().hex}) + '\n'
+    _escribir_registro_directo(REGISTRO_LLAMADAS_LOG, cabecera, backup=False)
+
+def _anexar_log_registro(linea):
+    """Añade una línea al log (llamar con _registro_log_lock)"""
+    clave = _clave_cache(REGISTRO_LLAMADAS_LOG)
+    if not os.path.exists(clave):
+        _reiniciar_log_registro()
+    
+    with open(clave, 'a', encoding='utf-8') as f:
+        f.write(linea)
+    _invalidar_cache(clave)
+
+def _tamaño_log_registro():
+    """Tamaño actual del log"""
+    try:
+        return os.path.getsize(_clave_cache(REGISTRO_LLAMADAS_LOG))
+    except OSError:
+        return 0
+
+def upsert_registro_dia(fecha, contadores_agentes):
+    """
+    Suma contadores de un día al registro sin reescribir todo el histórico
+    
+    Con el backend JSON se añade una línea al log de incrementos, que se
+    compacta en registro_llamadas.json al superar
+    REGISTRO_LLAMADAS_LOG_MAX_BYTES. Con SQLite se hace un UPSERT directo.
+    
+    Args:
+        fecha: Fecha del día (date o 'YYYY-MM-DD')
+        contadores_agentes: {agent_id: {llamadas_totales, llamadas_15min, ventas}}
+                            con los incrementos a sumar (los que falten cuentan 0)
+    
+    Returns:
+        bool: True si se registró correctamente
+    """
+    fecha_str = _fecha_a_str(fecha)
+    timestamp = datetime.now().isoformat()
+    contadores = {
+        str(agent_id): {
+            campo: valores.get(campo, 0)
+            for campo in registro_llamadas_db.CAMPOS_CONTADORES
+        }
+        for agent_id, valores in contadores_agentes.items()
+    }
+    if not contadores:
+        return True
+    
+    try:
+        if registro_llamadas_db.backend_activo():
+            registro_llamadas_db.upsert_dia(fecha_str, contadores, timestamp)
+            _invalidar_cache(registro_llamadas_db.DB_PATH)
+            return True
+        
+        linea = codec_json.dumps({
+            'fecha': fecha_str,
+            'timestamp': timestamp,
+            'agentes': contadores
+        }) + '\n'
+        
+        with _registro_log_lock:
+            _anexar_log_registro(linea)
+            
+            if _tamaño_log_registro() > REGISTRO_LLAMADAS_LOG_MAX_BYTES:
+                compactar_registro_llamadas()
+        
+        return True
+    except Exception as e:
+        print(f"Error registrando incrementos del {fecha_str}: {e}")
+        return False
+
+def compactar_registro_llamadas():
+    """Vuelca el log de incrementos en registro_llamadas.json y lo vacía"""
+    if registro_llamadas_db.backend_activo():
+        return True
+    
+    with _registro_log_lock:
+        if not _leer_log_registro()['entradas']:
+            return True
+        try:
+            try:
+                registro = _cargar_registro_json()
+            except (FileNotFoundError, json.JSONDecodeError):
+                registro = {}
+                _aplicar_log_registro(registro)
+            _reescribir_registro_json(registro)
+            return True
+        except Exception as e:
+            print(f"Error compactando registro llamadas: {e}")
+            return False
+
+def _fecha_a_str(fecha):
+    """Acepta date/datetime o 'YYYY-MM-DD' y devuelve siempre el string"""
+    if fecha is None or isinstance(fecha, str):
+        return fecha
+    return fecha.strftime('%Y-%m-%d')
+
+def obtener_registro_agente_rango(agent_id, fecha_inicio=None, fecha_fin=None):
+    """
+    Obtiene las filas del registro de un agente entre dos fechas (incluidas)
+    
+    Args:
+        agent_id: ID del agente en el sistema
+        fecha_inicio: Fecha de inicio (date o 'YYYY-MM-DD'), None = sin límite
+        fecha_fin: Fecha de fin (date o 'YYYY-MM-DD'), None = sin límite
+    
+    Returns:
+        list: Diccionarios con los datos del día más 'fecha' y 'agent_id',
+              ordenados por fecha
+    """
+    inicio = _fecha_a_str(fecha_inicio)
+    fin = _fecha_a_str(fecha_fin)
+    
+    try:
+        if registro_llamadas_db.backend_activo():
+            return registro_llamadas_db.obtener_filas(inicio, fin, agent_id)
+        
+        agent_id = str(agent_id)
+        filas = []
+        for fecha_str, datos_dia in sorted(cargar_registro_llamadas().items()):
+            if (inicio and fecha_str < inicio) or (fin and fecha_str > fin):
+                continue
+            if agent_id in datos_dia:
+                fila = dict(datos_dia[agent_id])
+                fila['fecha'] = fecha_str
+                fila['agent_id'] = agent_id
+                filas.append(fila)
+        return filas
+    except Exception as e:
+        print(f"Error obteniendo registro del agente {agent_id}: {e}")
+        return []
+
+def obtener_totales_agentes_rango(fecha_inicio, fecha_fin):
+    """
+    Suma los contadores de cada agente en un rango de fechas (incluidas)
+    
+    Returns:
+        dict: {agent_id: {llamadas_totales, llamadas_15min, ventas, dias}}
+    """
+    inicio = _fecha_a_str(fecha_inicio)
+    fin = _fecha_a_str(fecha_fin)
+    
+    try:
+        if registro_llamadas_db.backend_activo():
+            return registro_llamadas_db.totales_por_agente(inicio, fin)
+        
+        matriz = obtener_matriz_registro()
+        filas = matriz.rango(inicio, fin)
+        dias = matriz.presente[filas].sum(axis=0).tolist()
+        sumas = {
+            campo: getattr(matriz, campo)[filas].sum(axis=0).tolist()
+            for campo in ('llamadas_totales', 'llamadas_15min', 'ventas')
+        }
+        
+        return {
+            agent_id: {
+                'llamadas_totales': sumas['llamadas_totales'][j],
+                'llamadas_15min': sumas['llamadas_15min'][j],
+                'ventas': sumas['ventas'][j],
+                'dias': dias[j],
+            }
+            for j, agent_id in enumerate(matriz.agentes)
+            if dias[j] > 0
+        }
+    except Exception as e:
+        print(f"Error obteniendo totales por agente: {e}")
+        return {}
+
+# Vista columnar del registro: (firma, MatrizRegistro)
+_matriz_registro = None
+_matriz_lock = threading.Lock()
+
+def _firma_registro():
+    """
+    Firma de los archivos de los que sale cargar_registro_llamadas().
+    None si hay cambios del registro pendientes en el lote actual.
+    """
+    firma = _firma_archivos(REGISTRO_LLAMADAS_FILE, REGISTRO_LLAMADAS_LOG)
+    if firma is None:
+        return None
+    
+    if registro_llamadas_db.backend_activo():
+        return ('sqlite', registro_llamadas_db.firma_archivos())
+    return ('json',) + firma
+
+def obtener_matriz_registro():
+    """
+    Registro de llamadas como matrices NumPy [días × agentes] (ver
+    registro_matriz). Solo se reconstruye cuando cambia el registro; la
+    instancia es compartida y de solo lectura.
+    """
+    global _matriz_registro
+    
+    firma = _firma_registro()
+    if firma is not None:
+        with _matriz_lock:
+            if _matriz_registro is not None and _matriz_registro[0] == firma:
+                return _matriz_registro[1]
+    
+    matriz = MatrizRegistro(cargar_registro_llamadas())
+    
+    if firma is not None:
+        with _matriz_lock:
+            _matriz_registro = (firma, matriz)
+    return matriz
+
+def migrar_registro_llamadas_a_sqlite(forzar=False):
+    """
+    Migración única de data/registro_llamadas.json al backend SQLite.
+    
+    La primera vez la base se construye en un archivo temporal y se activa
+    al final (_publicar_db_sqlite), así ningún lector ve una tabla a medio
+    llenar. Con forzar=True sobre una base ya activa, el contenido se
+    sustituye en una sola transacción sobre esa misma base: otros hilos y
+    procesos pueden tenerla abierta. El JSON original se conserva sin tocar.
+    
+    Returns:
+        int: Filas migradas (0 si ya estaba migrado), -1 si hubo error
+    """
+    if registro_llamadas_db.backend_activo() and not forzar:
+        return 0
+    
+    db_path = registro_llamadas_db.DB_PATH
+    tmp_path = f"{db_path}.migracion.{os.getpid()}"
+    try:
+        # Base JSON con migración de campos antiguos y log ya aplicados
+        try:
+            registro = _cargar_registro_json()
+        except FileNotFoundError:
+            registro = {}
+            _aplicar_log_registro(registro)
+        
+        if registro_llamadas_db.backend_activo():
+            registro_llamadas_db.guardar_registro(registro)
+        else:
+            for sufijo in ('', '-wal', '-shm'):
+                if os.path.exists(tmp_path + sufijo):
+                    os.remove(tmp_path + sufijo)
+            
+            registro_llamadas_db.guardar_registro(registro, db_path=tmp_path)
+            registro_llamadas_db.cerrar_conexion(tmp_path)
+            
+            if not _publicar_db_sqlite(tmp_path, db_path):
+                print("Registro de llamadas ya migrado a SQLite por otro proceso")
+                return 0
+        _invalidar_cache(db_path)
+        
+        filas = sum(len(datos_dia) for datos_dia in registro.values())
+        print(f"✅ Registro de llamadas migrado a SQLite: {filas} filas")
+        return filas
+    except Exception as e:
+        print(f"Error migrando registro de llamadas a SQLite: {e}")
+        return -1
+
+def _publicar_db_sqlite(tmp_path, db_path):
+    """
+    Activa como db_path la base SQLite construida en tmp_path (ya cerrada).
+    
+    Solo si db_path aún no existe: os.link no sustituye un archivo, así que
+    una base viva, con conexiones abiertas y su -wal/-shm, nunca se cambia
+    por debajo. El temporal se borra siempre.
+    
+    Returns:
+        bool: False si otro proceso la activó antes
+    """
+    try:
+        for sufijo in ('-wal', '-shm'):
+            if os.path.exists(tmp_path + sufijo):
+                raise RuntimeError(f"{tmp_path}{sufijo} sigue abierto")
+        os.link(tmp_path, db_path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
 # ==============================================
 # FUNCIONES DE MONITORIZACIONES
 # ==============================================
 
+# Un archivo por mes de fecha_monitorizacion (ver almacen_mensual)
+_almacen_monitorizaciones = AlmacenMensual(
+    MONITORIZACIONES_DIR, MONITORIZACIONES_FILE, forma='plana',
+    campo_fecha='fecha_monitorizacion',
+    leer=_leer_json_cacheado, guardar=_guardar_json
+)
+
 def crear_tabla_monitorizaciones():
     """Crea la tabla de monitorizaciones si no existe"""
     try:
-        if not os.path.exists(MONITORIZACIONES_FILE):
-            os.makedirs(os.path.dirname(MONITORIZACIONES_FILE), exist_ok=True)
-            with open(MONITORIZACIONES_FILE, 'w', encoding='utf-8') as f:
-                json.dump({}, f, indent=4, ensure_ascii=False)
+        os.makedirs(MONITORIZACIONES_DIR, exist_ok=True)
         return True
     except Exception as e:
         print(f"Error creando tabla monitorizaciones: {e}")
         return False
 
-def cargar_monitorizaciones():
-    """Carga todas las monitorizaciones desde el archivo JSON"""
+def _preparar_monitorizaciones():
+    """Crea el directorio y migra de esquema el archivo único antiguo si existe"""
+    crear_tabla_monitorizaciones()
+    # El archivo antiguo (quizá en forma de lista) se migra antes de repartirlo
+    if os.path.exists(MONITORIZACIONES_FILE):
+        _asegurar_schema(MONITORIZACIONES_FILE)
+
+def cargar_monitorizaciones(meses=None):
+    """
+    Carga las monitorizaciones
+    
+    Args:
+        meses: Meses 'YYYY-MM' a cargar; None = todo el histórico
+    
+    Returns:
+        dict: {id_monitorizacion: monitorizacion_data}
+    """
     try:
-        crear_tabla_monitorizaciones()
-        
-        with open(MONITORIZACIONES_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Convertir de dict a lista si es necesario
-        if isinstance(data, dict):
-            # Estructura: {id: monitorizacion_data}
-            return data
-        elif isinstance(data, list):
-            # Convertir lista a dict
-            monitorizaciones_dict = {}
-            for item in data:
-                mon_id = item.get('id_monitorizacion')
-                if mon_id:
-                    monitorizaciones_dict[mon_id] = item
-                else:
-                    # Generar ID si no existe
-                    from datetime import datetime
-                    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-                    mon_id = f"MON_{timestamp}_{item.get('id_empleado', 'UNK')}"
-                    item['id_monitorizacion'] = mon_id
-                    monitorizaciones_dict[mon_id] = item
-            return monitorizaciones_dict
-        else:
-            return {}
+        _preparar_monitorizaciones()
+        return _almacen_monitorizaciones.cargar(meses)
             
     except (FileNotFoundError, json.JSONDecodeError) as e:
         print(f"Error cargando monitorizaciones: {e}")
         return {}
 
-def guardar_monitorizaciones(monitorizaciones):
-    """Guarda las monitorizaciones en el archivo JSON"""
+def guardar_monitorizaciones(monitorizaciones, meses=None):
+    """
+    Guarda las monitorizaciones (solo se reescriben los meses que cambian)
+    
+    Args:
+        meses: Pasar los mismos meses con los que se cargó; None = histórico completo
+    """
     try:
-        os.makedirs(os.path.dirname(MONITORIZACIONES_FILE), exist_ok=True)
-        with open(MONITORIZACIONES_FILE, 'w', encoding='utf-8') as f:
-            json.dump(monitorizaciones, f, indent=4, ensure_ascii=False)
-        
-        # Backup
-        backup_file = f"data_backup/{os.path.basename(MONITORIZACIONES_FILE)}"
-        os.makedirs(os.path.dirname(backup_file), exist_ok=True)
-        with open(backup_file, 'w', encoding='utf-8') as f:
-            json.dump(monitorizaciones, f, indent=4, ensure_ascii=False)
-            
+        _preparar_monitorizaciones()
+        _almacen_monitorizaciones.guardar(monitorizaciones, meses)
         return True
     except Exception as e:
         print(f"Error guardando monitorizaciones: {e}")
@@ -550,8 +1391,6 @@ def guardar_monitorizaciones(monitorizaciones):
 def agregar_monitorizacion(monitorizacion_data):
     """Agrega una nueva monitorización al archivo"""
     try:
-        monitorizaciones = cargar_monitorizaciones()
-        
         # Generar ID único
         from datetime import datetime
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
@@ -562,38 +1401,83 @@ def agregar_monitorizacion(monitorizacion_data):
         monitorizacion_data['id_monitorizacion'] = monitorizacion_id
         monitorizacion_data['created_at'] = datetime.now().isoformat()
         
-        # Guardar
-        monitorizaciones[monitorizacion_id] = monitorizacion_data
-        guardar_monitorizaciones(monitorizaciones)
+        # Guardar: solo se toca el archivo del mes de la monitorización
+        guardar_monitorizaciones({monitorizacion_id: monitorizacion_data}, meses=[])
         
         return monitorizacion_id
     except Exception as e:
         print(f"Error agregando monitorización: {e}")
         return None
 
+# Índice por empleado: (firma, monitorizaciones, {id_empleado: [mon_id, ...]})
+_indice_monitorizaciones = None
+_indice_monitorizaciones_lock = threading.Lock()
+
+def _obtener_indice_monitorizaciones():
+    """
+    Devuelve (monitorizaciones, índice) con el índice
+    {str(id_empleado): [mon_id de la más reciente a la más antigua]}.
+    
+    Se construye una vez por versión del archivo y se comparte entre
+    llamadas: no mutar lo devuelto (las funciones públicas devuelven copias).
+    """
+    global _indice_monitorizaciones
+    
+    firma = _firma_archivos(*_almacen_monitorizaciones.rutas())
+    if firma is not None:
+        with _indice_monitorizaciones_lock:
+            if _indice_monitorizaciones is not None and _indice_monitorizaciones[0] == firma:
+                return _indice_monitorizaciones[1], _indice_monitorizaciones[2]
+    
+    monitorizaciones = cargar_monitorizaciones()
+    indice = {}
+    for mon_id, mon_data in monitorizaciones.items():
+        indice.setdefault(str(mon_data.get('id_empleado')), []).append(mon_id)
+    
+    # Ordenar por fecha descendente (estable: a igual fecha, orden del archivo)
+    for ids in indice.values():
+        ids.sort(key=lambda m: monitorizaciones[m].get('fecha_monitorizacion') or '', reverse=True)
+    
+    if firma is not None:
+        with _indice_monitorizaciones_lock:
+            _indice_monitorizaciones = (firma, monitorizaciones, indice)
+    return monitorizaciones, indice
+
 def obtener_monitorizaciones_por_empleado(id_empleado):
-    """Obtiene todas las monitorizaciones de un empleado"""
+    """Obtiene todas las monitorizaciones de un empleado (más reciente primero)"""
     try:
-        monitorizaciones = cargar_monitorizaciones()
-        resultado = []
-        
-        for mon_id, mon_data in monitorizaciones.items():
-            if str(mon_data.get('id_empleado')) == str(id_empleado):
-                resultado.append(mon_data)
-        
-        # Ordenar por fecha descendente
-        resultado.sort(key=lambda x: x.get('fecha_monitorizacion', ''), reverse=True)
-        return resultado
+        monitorizaciones, indice = _obtener_indice_monitorizaciones()
+        return [_copiar(monitorizaciones[mon_id]) for mon_id in indice.get(str(id_empleado), [])]
     except Exception as e:
         print(f"Error obteniendo monitorizaciones: {e}")
         return []
 
 def obtener_ultima_monitorizacion_empleado(id_empleado):
     """Obtiene la última monitorización de un empleado"""
-    monitorizaciones = obtener_monitorizaciones_por_empleado(id_empleado)
-    if monitorizaciones:
-        return monitorizaciones[0]
-    return None
+    try:
+        monitorizaciones, indice = _obtener_indice_monitorizaciones()
+        ids = indice.get(str(id_empleado))
+        return _copiar(monitorizaciones[ids[0]]) if ids else None
+    except Exception as e:
+        print(f"Error obteniendo última monitorización: {e}")
+        return None
+
+def obtener_ultimas_monitorizaciones():
+    """
+    Última monitorización de cada empleado, en una sola pasada
+    
+    Returns:
+        dict: {str(id_empleado): monitorizacion_data}
+    """
+    try:
+        monitorizaciones, indice = _obtener_indice_monitorizaciones()
+        return {
+            id_empleado: _copiar(monitorizaciones[ids[0]])
+            for id_empleado, ids in indice.items()
+        }
+    except Exception as e:
+        print(f"Error obteniendo últimas monitorizaciones: {e}")
+        return {}
 
 def obtener_agentes_pendientes_monitorizar():
     """Obtiene agentes que necesitan monitorización (más de 10 días sin monitorizar)"""
@@ -605,13 +1489,14 @@ def obtener_agentes_pendientes_monitorizar():
         
         agentes_pendientes = []
         hoy = datetime.now().date()
+        ultimas_monitorizaciones = obtener_ultimas_monitorizaciones()
         
         for agent_id, agente_info in agentes.items():
             if not agente_info.get('activo', True):
                 continue
             
             # Obtener última monitorización
-            ultima_mon = obtener_ultima_monitorizacion_empleado(agent_id)
+            ultima_mon = ultimas_monitorizaciones.get(str(agent_id))
             
             if not ultima_mon:
                 # Nunca monitorizado
@@ -780,8 +1665,16 @@ def obtener_estadisticas_llamadas_diarias(fecha_inicio=None, fecha_fin=None):
         elif fecha_fin is None:
             fecha_fin = date.today()
         
-        # Cargar registro de llamadas
-        registro_llamadas = cargar_registro_llamadas()
+        matriz = obtener_matriz_registro()
+        filas = matriz.rango(fecha_inicio, fecha_fin)
+        
+        # Totales por día del periodo en una sola pasada sobre las matrices
+        llamadas_por_dia = matriz.llamadas_totales[filas].sum(axis=1).tolist()
+        ventas_por_dia = matriz.ventas[filas].sum(axis=1).tolist()
+        agentes_por_dia = matriz.presente[filas].sum(axis=1).tolist()
+        fila_de_fecha = {
+            fecha_str: i for i, fecha_str in enumerate(matriz.fechas[filas])
+        }
         
         # Preparar estructura para estadísticas
         estadisticas = {
@@ -797,14 +1690,12 @@ def obtener_estadisticas_llamadas_diarias(fecha_inicio=None, fecha_fin=None):
         current_date = fecha_inicio
         while current_date <= fecha_fin:
             fecha_str = current_date.strftime('%Y-%m-%d')
+            i = fila_de_fecha.get(fecha_str)
             
-            if fecha_str in registro_llamadas:
-                datos_dia = registro_llamadas[fecha_str]
-                
-                # Calcular totales del día
-                llamadas_dia = sum(datos.get('llamadas', 0) for datos in datos_dia.values())
-                ventas_dia = sum(datos.get('ventas', 0) for datos in datos_dia.values())
-                agentes_dia = len(datos_dia)
+            if i is not None:
+                llamadas_dia = llamadas_por_dia[i]
+                ventas_dia = ventas_por_dia[i]
+                agentes_dia = agentes_por_dia[i]
                 
                 # Calcular medias
                 media_llamadas = llamadas_dia / agentes_dia if agentes_dia > 0 else 0
@@ -1063,15 +1954,14 @@ def cargar_alertas_sms():
         if not os.path.exists(archivo):
             os.makedirs('data', exist_ok=True)
             with open(archivo, 'w', encoding='utf-8') as f:
-                json.dump({}, f, indent=4, ensure_ascii=False)
+                f.write(codec_json.dumps({}))
             return {}
         
-        with open(archivo, 'r', encoding='utf-8') as f:
-            contenido = f.read().strip()
-            if contenido:
-                return json.loads(contenido)
-            else:
-                return {}
+        try:
+            return _leer_json_cacheado(archivo)
+        except json.JSONDecodeError:
+            # Archivo vacío o a medio escribir: tratar como sin alertas
+            return {}
                 
     except Exception as e:
         print(f"Error cargando alertas SMS: {e}")
@@ -1080,18 +1970,7 @@ def cargar_alertas_sms():
 def guardar_alertas_sms(alertas):
     """Guarda las alertas SMS"""
     try:
-        archivo = 'data/alertas_sms.json'
-        os.makedirs('data', exist_ok=True)
-        
-        with open(archivo, 'w', encoding='utf-8') as f:
-            json.dump(alertas, f, indent=4, ensure_ascii=False)
-        
-        # Backup
-        backup_file = 'data_backup/alertas_sms.json'
-        os.makedirs('data_backup', exist_ok=True)
-        with open(backup_file, 'w', encoding='utf-8') as f:
-            json.dump(alertas, f, indent=4, ensure_ascii=False)
-        
+        _guardar_json('data/alertas_sms.json', alertas)
         return True
     except Exception as e:
         print(f"Error guardando alertas SMS: {e}")
@@ -1205,9 +2084,6 @@ def procesar_alerta_sms_completada(alerta_id, ventas_finales, llamadas_totales=1
             print(f"⚠️ Alerta {alerta_id} ya fue procesada anteriormente")
             return False
         
-        # Cargar registro de llamadas
-        registro_llamadas = cargar_registro_llamadas()
-        
         # Obtener datos de la alerta
         agente = alerta.get('agente')
         fecha_str = alerta.get('fecha')
@@ -1216,24 +2092,6 @@ def procesar_alerta_sms_completada(alerta_id, ventas_finales, llamadas_totales=1
             print(f"❌ Datos incompletos en alerta {alerta_id}")
             return False
         
-        # Inicializar estructuras si no existen
-        if fecha_str not in registro_llamadas:
-            registro_llamadas[fecha_str] = {}
-        
-        if agente not in registro_llamadas[fecha_str]:
-            registro_llamadas[fecha_str][agente] = {
-                'llamadas_totales': 0,
-                'llamadas_15min': 0,
-                'ventas': 0,
-                'fecha': fecha_str,
-                'timestamp': datetime.now().isoformat()
-            }
-        
-        # Agregar datos al registro
-        registro_llamadas[fecha_str][agente]['llamadas_totales'] += llamadas_totales
-        registro_llamadas[fecha_str][agente]['llamadas_15min'] += llamadas_largas
-        registro_llamadas[fecha_str][agente]['ventas'] += ventas_finales
-        
         # Marcar alerta como procesada
         alerta['procesada_registro'] = True
         alerta['ventas_registradas'] = ventas_finales
@@ -1245,9 +2103,15 @@ def procesar_alerta_sms_completada(alerta_id, ventas_finales, llamadas_totales=1
         if alerta.get('estado') != 'completado':
             alerta['estado'] = 'completado'
         
-        # Guardar cambios
+        # Guardar cambios (incremento del día, sin reescribir el registro)
         guardar_alertas_sms(alertas)
-        guardar_registro_llamadas(registro_llamadas)
+        upsert_registro_dia(fecha_str, {
+            agente: {
+                'llamadas_totales': llamadas_totales,
+                'llamadas_15min': llamadas_largas,
+                'ventas': ventas_finales
+            }
+        })
         
         print(f"✅ Alerta {alerta_id} procesada: {ventas_finales} ventas registradas")
         return True
@@ -1,5 +1,5 @@
-import json
 import os
+import codec_json
 from datetime import datetime, date
 from typing import List, Dict
 import streamlit as st
@@ -11,8 +11,7 @@ def cargar_festivos():
         archivo_festivos = 'data/festivos.json'
         
         if os.path.exists(archivo_festivos):
-            with open(archivo_festivos, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return codec_json.leer_archivo(archivo_festivos)
         else:
             # Crear estructura inicial con algunos festivos nacionales de España
             festivos_base = {
@@ -65,8 +64,7 @@ def guardar_festivos(festivos_data):
         # Actualizar metadata
         festivos_data["metadata"]["ultima_actualizacion"] = datetime.now().isoformat()
         
-        with open(archivo_festivos, 'w', encoding='utf-8') as f:
-            json.dump(festivos_data, f, indent=4, ensure_ascii=False)
+        codec_json.escribir_archivo(archivo_festivos, festivos_data)
         return True
     except Exception as e:
         st.error(f"Error guardando festivos: {e}")
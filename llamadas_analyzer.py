@@ -4,8 +4,12 @@ import os
 from datetime import datetime
 import tempfile
 import io
-from database import cargar_registro_llamadas, guardar_registro_llamadas, cargar_super_users
+from database import cargar_registro_llamadas, cargar_super_users, upsert_registro_dia
+from agent_resolver import obtener_resolvedor
+import llamadas_procesadas
+from clasificador_resultados import ventas_resultado, ventas_resultado_mejorado, pendientes_sms
 import json
+import csv
 import hashlib
 
 
@@ -15,6 +19,61 @@ def calcular_hash_registro(registro):
     return hashlib.md5(datos_str.encode()).hexdigest()
 
 
+def calcular_hashes(df):
+    """
+    Hash de cada fila del DataFrame, igual que calcular_hash_registro pero
+    en una sola pasada por columnas (sin df.apply fila a fila)
+    """
+    ventas = df['ventas_totales'].tolist() if 'ventas_totales' in df.columns else [0] * len(df)
+    claves = zip(df['agente'].tolist(), df['fecha'].tolist(),
+                 df['tiempo_conversacion'].tolist(), ventas)
+    return pd.Series(
+        [hashlib.md5(f"{a}_{f}_{t}_{v}".encode()).hexdigest() for a, f, t, v in claves],
+        index=df.index, dtype=object
+    )
+
+
+def _agente_inferido(agentes):
+    """
+    'agente' leído como texto, convertido a número como lo haría
+    pd.read_csv sin dtype (733, o 733.0 si la columna tiene vacíos) si
+    todos sus valores son numéricos. Es el valor con el que se calculaba
+    el hash que identifica las alertas SMS ('sms_<hash>').
+    """
+    numeros = pd.to_numeric(agentes, errors='coerce')
+    if numeros.notna().sum() == agentes.notna().sum():
+        return numeros
+    return agentes
+
+
+def _duracion_clave(tiempo):
+    """
+    Duración tal como entra en la clave del libro: la misma tanto si la
+    columna se leyó como entero, como float (por tener vacíos) o como texto
+    """
+    try:
+        tiempo = float(tiempo)
+    except (TypeError, ValueError):
+        return 'nan'
+    return int(tiempo) if tiempo.is_integer() else tiempo
+
+
+def calcular_claves_libro(df):
+    """
+    Clave de cada fila en el libro de llamadas importadas: como
+    calcular_hashes, pero con 'agente' como texto y la duración
+    normalizada, para que analizar_csv_llamadas e importar_csv_por_bloques
+    den la misma clave a la misma llamada
+    """
+    ventas = df['ventas_totales'].tolist() if 'ventas_totales' in df.columns else [0] * len(df)
+    claves = zip(df['agente'].tolist(), df['fecha'].tolist(),
+                 map(_duracion_clave, df['tiempo_conversacion'].tolist()), ventas)
+    return pd.Series(
+        [hashlib.md5(f"{a}_{f}_{t}_{v}".encode()).hexdigest() for a, f, t, v in claves],
+        index=df.index, dtype=object
+    )
+
+
 def analizar_csv_llamadas(uploaded_file):
     """
     Analiza un CSV de llamadas con la estructura específica de Zelenza
@@ -48,8 +107,11 @@ def analizar_csv_llamadas(uploaded_file):
         if separator == '\t':
             st.info("📄 Archivo detectado como separado por TABULACIONES")
         
-        # Leer el archivo
-        df = pd.read_csv(tmp_path, sep=separator, encoding='utf-8')
+        # Leer el archivo ('agente' como texto, igual que importar_csv_por_bloques:
+        # '0733' no debe convertirse en 733)
+        cabecera = next(csv.reader([first_line.rstrip('\r\n')], delimiter=separator))
+        tipos = {col: str for col in cabecera if col.strip().lower() == 'agente'}
+        df = pd.read_csv(tmp_path, sep=separator, encoding='utf-8', dtype=tipos)
         
         # Normalizar nombres de columnas
         df.columns = df.columns.str.strip().str.lower()
@@ -75,8 +137,11 @@ def analizar_csv_llamadas(uploaded_file):
         df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce').dt.strftime('%Y-%m-%d')
         df = df.dropna(subset=['fecha'])
         
-        # Añadir hash único
-        df['hash'] = df.apply(calcular_hash_registro, axis=1)
+        # Añadir hash único (id de las alertas SMS, con 'agente' como se
+        # leía antes para no cambiar las alertas ya procesadas) y la clave
+        # del libro de llamadas importadas
+        df['hash'] = calcular_hashes(df.assign(agente=_agente_inferido(df['agente'])))
+        df['clave_libro'] = calcular_claves_libro(df)
         
         # Mostrar campañas encontradas
         campanyas_unicas = df['campanya'].unique()
@@ -172,76 +237,46 @@ def contar_ventas_resultado_mejorado(resultado_str, motivo_str=None):
     
     return 0
 
-def verificar_si_procesada(hash_registro):
-    """Verifica si una alerta ya fue procesada"""
+def calcular_ventas(df):
+    """
+    Ventas de luz y de gas de cada llamada (contar_ventas_resultado_mejorado)
+    
+    Returns:
+        (ventas_elec, ventas_gas) como pd.Series
+    """
+    ventas_elec = ventas_resultado_mejorado(df['resultado_elec'], df.get('motivo_elec'))
+    ventas_gas = ventas_resultado_mejorado(df['resultado_gas'], df.get('motivo_gas'))
+    return ventas_elec, ventas_gas
+
+def alertas_procesadas():
+    """Ids de las alertas SMS ya procesadas (para comprobar muchas de golpe)"""
     try:
         from database import cargar_alertas_sms
-        alertas = cargar_alertas_sms()
-        
-        alerta_id = f"sms_{hash_registro}"
-        return alerta_id in alertas
-        
+        return set(cargar_alertas_sms())
     except:
-        return False
+        return set()
+
+def verificar_si_procesada(hash_registro, procesadas=None):
+    """
+    Verifica si una alerta ya fue procesada
+    
+    Args:
+        hash_registro: Hash de la llamada
+        procesadas: Resultado de alertas_procesadas(), para no recargar
+                    las alertas en cada comprobación
+    """
+    if procesadas is None:
+        procesadas = alertas_procesadas()
+    return f"sms_{hash_registro}" in procesadas
 
 def mapear_agente_a_sistema(agente_csv, super_users_config):
     """
     Mapea un agente del CSV al sistema usando la misma lógica que la importación
+    
+    Returns:
+        (agent_id, nombre) o (None, None) si no hay coincidencia
     """
-    agentes_sistema = super_users_config.get("agentes", {})
-
-    # Preparar búsqueda flexible (igual que en importar_datos_a_registro)
-    busqueda_agentes = {}
-
-    for agent_id in agentes_sistema.keys():
-        agent_id_str = str(agent_id).strip().upper()
-        
-        # Variantes de búsqueda
-        busqueda_agentes[agent_id_str] = agent_id
-        
-        if len(agent_id_str) >= 4:
-            busqueda_agentes[agent_id_str[-4:]] = agent_id
-        
-        if agent_id_str.startswith('TZS'):
-            busqueda_agentes[agent_id_str[3:]] = agent_id
-        
-        solo_numeros = ''.join(filter(str.isdigit, agent_id_str))
-        if solo_numeros and solo_numeros != agent_id_str:
-            busqueda_agentes[solo_numeros] = agent_id
-
-    # También buscar por nombre
-    for agent_id, info in agentes_sistema.items():
-        nombre = str(info.get('nombre', '')).strip().upper()
-        if nombre:
-            busqueda_agentes[nombre] = agent_id
-
-    # Buscar coincidencia FLEXIBLE (igual que en importar_datos_a_registro)
-    agente_csv_upper = str(agente_csv).strip().upper()
-
-    # 1. Búsqueda exacta
-    if agente_csv_upper in busqueda_agentes:
-        return busqueda_agentes[agente_csv_upper], agentes_sistema.get(busqueda_agentes[agente_csv_upper], {}).get('nombre', '')
-
-    # 2. Quitar "TZS" si está presente
-    if agente_csv_upper.startswith('TZS'):
-        agente_sin_tzs = agente_csv_upper[3:]
-        if agente_sin_tzs in busqueda_agentes:
-            return busqueda_agentes[agente_sin_tzs], agentes_sistema.get(busqueda_agentes[agente_sin_tzs], {}).get('nombre', '')
-
-    # 3. Solo números
-    numeros_csv = ''.join(filter(str.isdigit, agente_csv_upper))
-    if numeros_csv:
-        for key, agent_id in busqueda_agentes.items():
-            numeros_key = ''.join(filter(str.isdigit, key))
-            if numeros_key and numeros_csv == numeros_key:
-                return agent_id, agentes_sistema.get(agent_id, {}).get('nombre', '')
-
-    # 4. Búsqueda por contenido
-    for key, agent_id in busqueda_agentes.items():
-        if key in agente_csv_upper or agente_csv_upper in key:
-            return agent_id, agentes_sistema.get(agent_id, {}).get('nombre', '')
-
-    return None, None
+    return obtener_resolvedor(super_users_config).resolver_con_nombre(agente_csv)
 
 def verificar_venta_en_registro(agente_sistema, fecha_str):
     """Verifica si una venta está en el registro diario"""
@@ -270,78 +305,19 @@ def realizar_analisis(df_filtrado, nombre_analisis):
     random_suffix = random.randint(1000, 9999)
     analisis_id = f"{nombre_analisis.replace(' ', '_')}_{timestamp_ms}_{random_suffix}"
     
-    # ==============================================
-    # FUNCIÓN LOCAL PARA MAPEAR AGENTES
-    # ==============================================
-    def mapear_agente_a_sistema_local(agente_csv, super_users_config):
-        """Mapea un agente del CSV al sistema (versión local)"""
-        agentes_sistema = super_users_config.get("agentes", {})
-        
-        # Preparar búsqueda flexible
-        busqueda_agentes = {}
-        
-        for agent_id in agentes_sistema.keys():
-            agent_id_str = str(agent_id).strip().upper()
-            
-            busqueda_agentes[agent_id_str] = agent_id
-            
-            if len(agent_id_str) >= 4:
-                busqueda_agentes[agent_id_str[-4:]] = agent_id
-            
-            if agent_id_str.startswith('TZS'):
-                busqueda_agentes[agent_id_str[3:]] = agent_id
-            
-            solo_numeros = ''.join(filter(str.isdigit, agent_id_str))
-            if solo_numeros and solo_numeros != agent_id_str:
-                busqueda_agentes[solo_numeros] = agent_id
-        
-        # También buscar por nombre
-        for agent_id, info in agentes_sistema.items():
-            nombre = str(info.get('nombre', '')).strip().upper()
-            if nombre:
-                busqueda_agentes[nombre] = agent_id
-        
-        # Buscar coincidencia
-        agente_csv_upper = str(agente_csv).strip().upper()
-        
-        # 1. Búsqueda exacta
-        if agente_csv_upper in busqueda_agentes:
-            return busqueda_agentes[agente_csv_upper], agentes_sistema.get(busqueda_agentes[agente_csv_upper], {}).get('nombre', '')
-        
-        # 2. Quitar "TZS"
-        if agente_csv_upper.startswith('TZS'):
-            agente_sin_tzs = agente_csv_upper[3:]
-            if agente_sin_tzs in busqueda_agentes:
-                return busqueda_agentes[agente_sin_tzs], agentes_sistema.get(busqueda_agentes[agente_sin_tzs], {}).get('nombre', '')
-        
-        # 3. Solo números
-        numeros_csv = ''.join(filter(str.isdigit, agente_csv_upper))
-        if numeros_csv:
-            for key, agent_id in busqueda_agentes.items():
-                numeros_key = ''.join(filter(str.isdigit, key))
-                if numeros_key and numeros_csv == numeros_key:
-                    return agent_id, agentes_sistema.get(agent_id, {}).get('nombre', '')
-        
-        # 4. Búsqueda por contenido
-        for key, agent_id in busqueda_agentes.items():
-            if key in agente_csv_upper or agente_csv_upper in key:
-                return agent_id, agentes_sistema.get(agent_id, {}).get('nombre', '')
-        
-        return None, None
-    
     # ==============================================
     # FUNCIÓN PARA PROCESAR ALERTA INDIVIDUAL
     # ==============================================
     def procesar_alerta_individual(datos, estado="confirmado"):
         """Procesa una alerta individual con mapeo correcto de agente Y actualiza registro diario"""
         try:
-            from database import agregar_varias_alertas_sms, cargar_super_users, cargar_registro_llamadas, guardar_registro_llamadas
+            from database import agregar_varias_alertas_sms, cargar_super_users, upsert_registro_dia
             
             # Cargar configuración para mapear agente
             super_users_config = cargar_super_users()
             
             # Mapear agente del CSV al sistema
-            agente_sistema, nombre_agente = mapear_agente_a_sistema_local(datos['agente'], super_users_config)
+            agente_sistema, nombre_agente = mapear_agente_a_sistema(datos['agente'], super_users_config)
             
             if agente_sistema is None:
                 agente_sistema = datos['agente']
@@ -355,31 +331,15 @@ def realizar_analisis(df_filtrado, nombre_analisis):
             # ==============================================
             if estado == "confirmado" and ventas_finales > 0 and agente_sistema:
                 try:
-                    registro_llamadas = cargar_registro_llamadas()
                     fecha_str = datos['fecha']
                     
-                    # Inicializar estructuras si no existen
-                    if fecha_str not in registro_llamadas:
-                        registro_llamadas[fecha_str] = {}
-                    
-                    if agente_sistema not in registro_llamadas[fecha_str]:
-                        registro_llamadas[fecha_str][agente_sistema] = {
-                            'llamadas_totales': 0,
-                            'llamadas_15min': 0,
-                            'ventas': 0,
-                            'fecha': fecha_str,
-                            'timestamp': datetime.now().isoformat()
+                    # SUMAR VENTAS al registro (y llamada larga si la duración > 15 min)
+                    upsert_registro_dia(fecha_str, {
+                        agente_sistema: {
+                            'ventas': ventas_finales,
+                            'llamadas_15min': 1 if datos.get('duracion_minutos', 0) > 15 else 0
                         }
-                    
-                    # SUMAR VENTAS al registro
-                    registro_llamadas[fecha_str][agente_sistema]['ventas'] += ventas_finales
-                    
-                    # Contar como llamada larga si la duración > 15 min
-                    if datos.get('duracion_minutos', 0) > 15:
-                        registro_llamadas[fecha_str][agente_sistema]['llamadas_15min'] += 1
-                    
-                    # Guardar registro actualizado
-                    guardar_registro_llamadas(registro_llamadas)
+                    })
                     
                     st.info(f"📈 {ventas_finales} venta(s) agregada(s) al registro diario de {agente_sistema} ({fecha_str})")
                     
@@ -434,7 +394,7 @@ def realizar_analisis(df_filtrado, nombre_analisis):
     def procesar_todas_alertas(pendientes_sms_data, estado="confirmado"):
         """Procesa todas las alertas de una vez con mapeo correcto Y actualiza registro diario"""
         try:
-            from database import agregar_varias_alertas_sms, cargar_super_users, cargar_registro_llamadas, guardar_registro_llamadas
+            from database import agregar_varias_alertas_sms, cargar_super_users, upsert_registro_dia
             
             super_users_config = cargar_super_users()
             
@@ -443,12 +403,11 @@ def realizar_analisis(df_filtrado, nombre_analisis):
             ventas_totales_confirmadas = 0
             actualizaciones_registro = []
             
-            # Cargar registro una sola vez para optimizar
-            if estado == "confirmado":
-                registro_llamadas = cargar_registro_llamadas()
+            # Incrementos por día y agente, se escriben al final
+            incrementos = {}
             
             for datos in pendientes_sms_data:
-                agente_sistema, nombre_agente = mapear_agente_a_sistema_local(datos['agente'], super_users_config)
+                agente_sistema, nombre_agente = mapear_agente_a_sistema(datos['agente'], super_users_config)
                 
                 if agente_sistema is None:
                     agente_sistema = datos['agente']
@@ -463,26 +422,17 @@ def realizar_analisis(df_filtrado, nombre_analisis):
                     try:
                         fecha_str = datos['fecha']
                         
-                        # Inicializar estructuras si no existen
-                        if fecha_str not in registro_llamadas:
-                            registro_llamadas[fecha_str] = {}
-                        
-                        if agente_sistema not in registro_llamadas[fecha_str]:
-                            registro_llamadas[fecha_str][agente_sistema] = {
-                                'llamadas_totales': 0,
-                                'llamadas_15min': 0,
-                                'ventas': 0,
-                                'fecha': fecha_str,
-                                'timestamp': datetime.now().isoformat()
-                            }
+                        contadores = incrementos.setdefault(fecha_str, {}).setdefault(
+                            agente_sistema, {'ventas': 0, 'llamadas_15min': 0}
+                        )
                         
                         # SUMAR VENTAS al registro
-                        registro_llamadas[fecha_str][agente_sistema]['ventas'] += ventas_finales
+                        contadores['ventas'] += ventas_finales
                         ventas_totales_confirmadas += ventas_finales
                         
                         # Contar como llamada larga si la duración > 15 min
                         if datos.get('duracion_minutos', 0) > 15:
-                            registro_llamadas[fecha_str][agente_sistema]['llamadas_15min'] += 1
+                            contadores['llamadas_15min'] += 1
                         
                         actualizaciones_registro.append(f"{agente_sistema} ({fecha_str}): +{ventas_finales} venta(s)")
                         
@@ -524,7 +474,8 @@ def realizar_analisis(df_filtrado, nombre_analisis):
             
             # Guardar registro actualizado si hubo cambios
             if estado == "confirmado" and actualizaciones_registro:
-                guardar_registro_llamadas(registro_llamadas)
+                for fecha_str, contadores_agentes in incrementos.items():
+                    upsert_registro_dia(fecha_str, contadores_agentes)
                 st.success(f"📈 Registro diario actualizado: {ventas_totales_confirmadas} venta(s) totales")
                 
                 # Mostrar resumen de actualizaciones
@@ -573,7 +524,7 @@ def realizar_analisis(df_filtrado, nombre_analisis):
             from database import cargar_super_users
             super_users_config = cargar_super_users()
             
-            agente_sistema, nombre_agente = mapear_agente_a_sistema_local(datos['agente'], super_users_config)
+            agente_sistema, nombre_agente = mapear_agente_a_sistema(datos['agente'], super_users_config)
             
             col_info1, col_info2 = st.columns(2)
             with col_info1:
@@ -646,14 +597,7 @@ def realizar_analisis(df_filtrado, nombre_analisis):
     df_filtrado['motivo_gas'] = df_filtrado.get('motivo_gas', '')
     
     # Calcular ventas
-    df_filtrado['ventas_elec'] = df_filtrado.apply(
-        lambda row: contar_ventas_resultado_mejorado(row['resultado_elec'], row.get('motivo_elec')), 
-        axis=1
-    )
-    df_filtrado['ventas_gas'] = df_filtrado.apply(
-        lambda row: contar_ventas_resultado_mejorado(row['resultado_gas'], row.get('motivo_gas')), 
-        axis=1
-    )
+    df_filtrado['ventas_elec'], df_filtrado['ventas_gas'] = calcular_ventas(df_filtrado)
     df_filtrado['ventas_totales'] = df_filtrado['ventas_elec'] + df_filtrado['ventas_gas']
     df_filtrado['tiene_venta'] = df_filtrado['ventas_totales'] > 0
     df_filtrado['duracion_minutos'] = df_filtrado['tiempo_conversacion'] / 60
@@ -661,26 +605,30 @@ def realizar_analisis(df_filtrado, nombre_analisis):
     # Llamadas largas (>15 min = 900 segundos)
     df_llamadas_largas = df_filtrado[df_filtrado['tiempo_conversacion'] > 900].copy()
     
-    # Detectar pendientes SMS
+    # Detectar pendientes SMS (solo se recorren las filas que los tienen)
+    tiene_pendiente, ventas_pendientes_filas = pendientes_sms(
+        df_filtrado.get('resultado_elec'), df_filtrado.get('resultado_gas'),
+        df_filtrado.get('motivo_elec'), df_filtrado.get('motivo_gas'),
+        index=df_filtrado.index
+    )
     pendientes_sms_data = []
-    for idx, row in df_filtrado.iterrows():
-        tiene_pendiente, ventas_pendientes = detectar_pendientes_sms_mejorado(row)
-        
-        if tiene_pendiente:
-            pendientes_sms_data.append({
-                'agente': row['agente'],
-                'fecha': row['fecha'],
-                'hora': row['hora'],
-                'resultado_elec': row['resultado_elec'],
-                'resultado_gas': row['resultado_gas'],
-                'motivo_elec': row.get('motivo_elec', ''),
-                'motivo_gas': row.get('motivo_gas', ''),
-                'ventas_pendientes': ventas_pendientes,
-                'tiempo_conversacion': row['tiempo_conversacion'],
-                'duracion_minutos': round(row['duracion_minutos'], 1),
-                'campanya': row['campanya'],
-                'hash': row['hash']
-            })
+    con_pendiente = tiene_pendiente.to_numpy()
+    for (idx, row), ventas_pendientes in zip(df_filtrado[con_pendiente].iterrows(),
+                                             ventas_pendientes_filas[con_pendiente].tolist()):
+        pendientes_sms_data.append({
+            'agente': row['agente'],
+            'fecha': row['fecha'],
+            'hora': row['hora'],
+            'resultado_elec': row['resultado_elec'],
+            'resultado_gas': row['resultado_gas'],
+            'motivo_elec': row.get('motivo_elec', ''),
+            'motivo_gas': row.get('motivo_gas', ''),
+            'ventas_pendientes': ventas_pendientes,
+            'tiempo_conversacion': row['tiempo_conversacion'],
+            'duracion_minutos': round(row['duracion_minutos'], 1),
+            'campanya': row['campanya'],
+            'hash': row['hash']
+        })
     
     # Calcular estadísticas
     total_llamadas = len(df_filtrado)
@@ -733,7 +681,7 @@ def realizar_analisis(df_filtrado, nombre_analisis):
             # Añadir columna de mapeo
             mapeos = []
             for _, row in df_pendientes.iterrows():
-                agente_sistema, nombre_agente = mapear_agente_a_sistema_local(row['agente'], super_users_config)
+                agente_sistema, nombre_agente = mapear_agente_a_sistema(row['agente'], super_users_config)
                 if agente_sistema and agente_sistema != row['agente']:
                     mapeos.append(f"→ {agente_sistema}")
                 else:
@@ -742,6 +690,7 @@ def realizar_analisis(df_filtrado, nombre_analisis):
             df_pendientes['Mapeo'] = mapeos
             
             # Añadir columna de estado actual
+            procesadas = alertas_procesadas()
             estados = []
             for _, row in df_pendientes.iterrows():
                 alerta_id = f"sms_{row['hash']}"
@@ -750,7 +699,7 @@ def realizar_analisis(df_filtrado, nombre_analisis):
                 if alerta_id in st.session_state.alertas_procesadas:
                     estados.append("✅ Confirmada")
                 # Verificar si ya está en el sistema
-                elif verificar_si_procesada(row['hash']):
+                elif verificar_si_procesada(row['hash'], procesadas):
                     estados.append("✓ Procesada")
                 else:
                     estados.append("⏳ Pendiente")
@@ -840,7 +789,7 @@ def realizar_analisis(df_filtrado, nombre_analisis):
                     
                     # Verificar si ya está procesada
                     alerta_id = f"sms_{datos['hash']}"
-                    procesada_en_sistema = verificar_si_procesada(datos['hash'])
+                    procesada_en_sistema = verificar_si_procesada(datos['hash'], procesadas)
                     procesada_en_sesion = alerta_id in st.session_state.alertas_procesadas
                     ya_procesada = procesada_en_sistema or procesada_en_sesion
                     
@@ -929,129 +878,128 @@ def realizar_analisis(df_filtrado, nombre_analisis):
     
     return df_filtrado
 
-def importar_datos_a_registro(df_analizado, super_users_config):
+def _nueva_importacion():
+    """Acumulado de una importación al registro (uno o varios bloques)"""
+    return {
+        'incrementos': {},  # {fecha: {agent_id: {contadores}}}
+        'total_lineas': 0,
+        'ya_importadas': 0,
+        'procesadas': 0,
+        'no_procesadas': 0,
+        'llamadas': 0,
+        'llamadas_largas': 0,
+        'ventas': 0,
+        'agentes_encontrados': [],
+        'coincidencias_unicas': set(),
+        'agentes_no_encontrados': set(),
+        'hashes': [],  # (fechas, hashes, agentes) importados, pendientes de anotar en el libro
+    }
+
+
+def _importar_bloque(df_analizado, resolvedor, importacion, vistas=None):
     """
-    Importa los datos analizados al registro diario
+    Suma un bloque de llamadas analizadas (con 'ventas_totales') al
+    acumulado de la importación, sin escribir nada todavía
     """
-    if df_analizado.empty:
-        return False, "No hay datos para importar"
-    
-    # Cargar registro actual
-    registro_llamadas = cargar_registro_llamadas()
-    
-    # Obtener agentes del sistema
-    agentes_sistema = super_users_config.get("agentes", {})
-    
-    # Contadores
-    total_lineas_csv = len(df_analizado)
-    lineas_procesadas = 0
-    lineas_no_procesadas = 0
-    llamadas_totales_importadas = 0
-    llamadas_largas_importadas = 0
-    ventas_importadas = 0
-    
-    agentes_encontrados_lista = []
-    agentes_no_encontrados_set = set()
-    coincidencias_unicas = set()
-    
-    # Preparar búsqueda flexible
-    busqueda_agentes = {}
-    
-    for agent_id in agentes_sistema.keys():
-        agent_id_str = str(agent_id).strip().upper()
-        
-        # Variantes de búsqueda
-        busqueda_agentes[agent_id_str] = agent_id
-        
-        if len(agent_id_str) >= 4:
-            busqueda_agentes[agent_id_str[-4:]] = agent_id
-        
-        if agent_id_str.startswith('TZS'):
-            busqueda_agentes[agent_id_str[3:]] = agent_id
-        
-        solo_numeros = ''.join(filter(str.isdigit, agent_id_str))
-        if solo_numeros and solo_numeros != agent_id_str:
-            busqueda_agentes[solo_numeros] = agent_id
-    
-    # También buscar por nombre
-    for agent_id, info in agentes_sistema.items():
-        nombre = str(info.get('nombre', '')).strip().upper()
-        if nombre:
-            busqueda_agentes[nombre] = agent_id
-    
-    # Procesar CADA línea del CSV
-    for idx, row in df_analizado.iterrows():
-        agente_csv = str(row['agente']).strip()
-        agente_csv_upper = agente_csv.upper()
-        fecha_str = row['fecha']
-        
-        # Buscar coincidencia FLEXIBLE
-        agente_encontrado = None
-        
-        # 1. Búsqueda exacta
-        if agente_csv_upper in busqueda_agentes:
-            agente_encontrado = busqueda_agentes[agente_csv_upper]
-        
-        # 2. Búsqueda por contenido
-        if not agente_encontrado:
-            for key, agent_id in busqueda_agentes.items():
-                if key in agente_csv_upper or agente_csv_upper in key:
-                    agente_encontrado = agent_id
-                    break
-        
-        # 3. Búsqueda por números
-        if not agente_encontrado:
-            numeros_csv = ''.join(filter(str.isdigit, agente_csv))
-            if numeros_csv:
-                for key, agent_id in busqueda_agentes.items():
-                    numeros_key = ''.join(filter(str.isdigit, key))
-                    if numeros_key and numeros_csv == numeros_key:
-                        agente_encontrado = agent_id
-                        break
+    importacion['total_lineas'] += len(df_analizado)
+    
+    # Descartar de golpe las llamadas ya importadas en subidas anteriores
+    hashes = df_analizado['clave_libro'] if 'clave_libro' in df_analizado.columns \
+        else calcular_claves_libro(df_analizado)
+    nuevas = llamadas_procesadas.filtrar_nuevas(hashes, df_analizado['fecha'], vistas).to_numpy()
+    importacion['ya_importadas'] += len(df_analizado) - int(nuevas.sum())
+    df_analizado = df_analizado[nuevas]
+    hashes = hashes[nuevas]
+    
+    # Resolver cada valor distinto de 'agente' una sola vez: las
+    # exportaciones del marcador repiten el mismo agente miles de veces
+    resolucion = {}
+    for valor in df_analizado['agente'].unique():
+        agente_csv = str(valor).strip()
+        agente_encontrado = resolvedor.resolver(agente_csv)
+        resolucion[valor] = agente_encontrado
         
         if agente_encontrado:
-            lineas_procesadas += 1
-            
-            # Inicializar estructuras
-            if fecha_str not in registro_llamadas:
-                registro_llamadas[fecha_str] = {}
-            
-            if agente_encontrado not in registro_llamadas[fecha_str]:
-                registro_llamadas[fecha_str][agente_encontrado] = {
-                    'llamadas_totales': 0,
-                    'llamadas_15min': 0,
-                    'ventas': 0,
-                    'fecha': fecha_str,
-                    'timestamp': datetime.now().isoformat()
-                }
-            
-            # CONTAR LLAMADA TOTAL
-            registro_llamadas[fecha_str][agente_encontrado]['llamadas_totales'] += 1
-            llamadas_totales_importadas += 1
-            
-            # Contar si es llamada larga
-            if row['tiempo_conversacion'] > 900:
-                registro_llamadas[fecha_str][agente_encontrado]['llamadas_15min'] += 1
-                llamadas_largas_importadas += 1
-            
-            # Sumar ventas
-            ventas_fila = int(row['ventas_totales'])
-            if ventas_fila > 0:
-                registro_llamadas[fecha_str][agente_encontrado]['ventas'] += ventas_fila
-                ventas_importadas += ventas_fila
-            
             # Guardar coincidencia única
             coincidencia = f"{agente_csv} → {agente_encontrado}"
-            if coincidencia not in coincidencias_unicas:
-                coincidencias_unicas.add(coincidencia)
-                agentes_encontrados_lista.append(coincidencia)
-        
+            if coincidencia not in importacion['coincidencias_unicas']:
+                importacion['coincidencias_unicas'].add(coincidencia)
+                importacion['agentes_encontrados'].append(coincidencia)
         else:
-            lineas_no_procesadas += 1
-            agentes_no_encontrados_set.add(agente_csv)
+            importacion['agentes_no_encontrados'].add(agente_csv)
+    
+    agentes = df_analizado['agente'].map(resolucion)
+    encontrada = agentes.notna().to_numpy()
+    lineas_procesadas = int(encontrada.sum())
+    importacion['procesadas'] += lineas_procesadas
+    importacion['no_procesadas'] += len(df_analizado) - lineas_procesadas
+    
+    # Contadores por (fecha, agente) con un único groupby
+    filas = df_analizado.loc[encontrada, ['fecha', 'tiempo_conversacion', 'ventas_totales']]
+    ventas = filas['ventas_totales'].astype(int)
+    filas = pd.DataFrame({
+        'fecha': filas['fecha'].to_numpy(),
+        'agente': agentes[encontrada].to_numpy(),
+        'llamadas_totales': 1,
+        'llamadas_15min': (filas['tiempo_conversacion'] > 900).astype(int).to_numpy(),
+        'ventas': ventas.where(ventas > 0, 0).to_numpy(),
+    })
+    totales = filas.groupby(['fecha', 'agente'], sort=False, dropna=False).sum()
+    
+    for (fecha_str, agente_encontrado), fila in totales.iterrows():
+        contadores = importacion['incrementos'].setdefault(fecha_str, {}).setdefault(agente_encontrado, {
+            'llamadas_totales': 0,
+            'llamadas_15min': 0,
+            'ventas': 0
+        })
+        for campo in ('llamadas_totales', 'llamadas_15min', 'ventas'):
+            contadores[campo] += int(fila[campo])
+    
+    importacion['llamadas'] += int(totales['llamadas_totales'].sum())
+    importacion['llamadas_largas'] += int(totales['llamadas_15min'].sum())
+    importacion['ventas'] += int(totales['ventas'].sum())
+    # Como bytes de ancho fijo: en un CSV grande ocupan mucho menos que str.
+    # Con su fecha, para anotar solo los días que se lleguen a guardar, y su
+    # agente, para quitarlas del libro si se borra el histórico del agente
+    importacion['hashes'].append((
+        filas['fecha'].to_numpy().astype(str),
+        hashes[encontrada].to_numpy().astype('S32'),
+        filas['agente'].to_numpy().astype(str),
+    ))
+
+
+def _cerrar_importacion(importacion, agentes_sistema):
+    """Escribe los incrementos y el libro de hashes; devuelve el diagnóstico"""
+    # Guardar cambios (un upsert por día importado)
+    dias_fallidos = []
+    for fecha_str, contadores_agentes in importacion['incrementos'].items():
+        if not upsert_registro_dia(fecha_str, contadores_agentes):
+            dias_fallidos.append(fecha_str)
+    
+    # Solo se anotan en el libro las llamadas de los días guardados: las de
+    # un día que falló deben volver a importarse al subir de nuevo el CSV
+    llamadas_procesadas.registrar(
+        (fecha, h.decode('ascii'), agent_id)
+        for fechas, bloque, agentes in importacion['hashes']
+        for fecha, h, agent_id in zip(fechas, bloque, agentes)
+        if fecha not in dias_fallidos
+    )
     
-    # Guardar cambios
-    guardar_registro_llamadas(registro_llamadas)
+    if dias_fallidos:
+        dias_guardados = len(importacion['incrementos']) - len(dias_fallidos)
+        mensaje = f"❌ **Error guardando el registro de {len(dias_fallidos)} día(s):** "
+        mensaje += ", ".join(sorted(dias_fallidos)) + "\n"
+        mensaje += f"✅ Días guardados: {dias_guardados}\n"
+        mensaje += "💡 Vuelve a subir el CSV: solo se importarán las llamadas de los días que fallaron\n"
+        return False, mensaje
+    
+    total_lineas_csv = importacion['total_lineas']
+    lineas_procesadas = importacion['procesadas']
+    lineas_no_procesadas = importacion['no_procesadas']
+    lineas_ya_importadas = importacion['ya_importadas']
+    llamadas_totales_importadas = importacion['llamadas']
+    agentes_encontrados_lista = importacion['agentes_encontrados']
+    agentes_no_encontrados_set = importacion['agentes_no_encontrados']
     
     # Preparar mensaje
     mensaje = f"✅ **IMPORTACIÓN - DIAGNÓSTICO DETALLADO**\n"
@@ -1059,9 +1007,11 @@ def importar_datos_a_registro(df_analizado, super_users_config):
     mensaje += f"📊 **TOTAL CSV:** {total_lineas_csv} líneas\n"
     mensaje += f"✅ **Procesadas:** {lineas_procesadas} líneas\n"
     mensaje += f"❌ **NO procesadas:** {lineas_no_procesadas} líneas\n"
+    if lineas_ya_importadas:
+        mensaje += f"🔁 **Ya importadas antes (omitidas):** {lineas_ya_importadas} líneas\n"
     mensaje += f"📞 **Llamadas importadas:** {llamadas_totales_importadas}\n"
-    mensaje += f"⏱️ **Llamadas >15min:** {llamadas_largas_importadas}\n"
-    mensaje += f"💰 **Ventas:** {ventas_importadas}\n"
+    mensaje += f"⏱️ **Llamadas >15min:** {importacion['llamadas_largas']}\n"
+    mensaje += f"💰 **Ventas:** {importacion['ventas']}\n"
     
     # VERIFICACIÓN CRÍTICA
     mensaje += "\n🔍 **VERIFICACIÓN:**\n"
@@ -1070,10 +1020,11 @@ def importar_datos_a_registro(df_analizado, super_users_config):
     else:
         mensaje += f"❌ ERROR: Llamadas ({llamadas_totales_importadas}) ≠ Líneas ({lineas_procesadas})\n"
     
-    if lineas_procesadas + lineas_no_procesadas == total_lineas_csv:
+    suma_lineas = lineas_procesadas + lineas_no_procesadas + lineas_ya_importadas
+    if suma_lineas == total_lineas_csv:
         mensaje += f"✅ Suma líneas = Total CSV ({total_lineas_csv})\n"
     else:
-        mensaje += f"❌ ERROR: Suma ({lineas_procesadas + lineas_no_procesadas}) ≠ Total ({total_lineas_csv})\n"
+        mensaje += f"❌ ERROR: Suma ({suma_lineas}) ≠ Total ({total_lineas_csv})\n"
     
     # Agentes encontrados
     mensaje += f"\n👥 **Agentes con coincidencia:** {len(agentes_encontrados_lista)}\n"
@@ -1104,6 +1055,130 @@ def importar_datos_a_registro(df_analizado, super_users_config):
     return True, mensaje
 
 
+def importar_datos_a_registro(df_analizado, super_users_config):
+    """
+    Importa los datos analizados al registro diario
+    """
+    if df_analizado.empty:
+        return False, "No hay datos para importar"
+    
+    importacion = _nueva_importacion()
+    _importar_bloque(df_analizado, obtener_resolvedor(super_users_config), importacion)
+    return _cerrar_importacion(importacion, super_users_config.get("agentes", {}))
+
+
+# ==============================================
+# IMPORTACIÓN POR BLOQUES (ARCHIVOS GRANDES)
+# ==============================================
+
+FILAS_POR_BLOQUE = 50000
+
+# Columnas que necesita la importación (el resto del CSV no se lee)
+COLUMNAS_IMPORTACION = ['agente', 'fecha', 'tiempo_conversacion', 'resultado_elec',
+                        'resultado_gas', 'motivo_elec', 'motivo_gas', 'campanya']
+COLUMNAS_IMPORTACION_REQUERIDAS = ['agente', 'fecha', 'tiempo_conversacion',
+                                   'resultado_elec', 'resultado_gas']
+
+# Texto repetido en todo el CSV: categórico en vez de un str por fila
+COLUMNAS_CATEGORICAS = ['agente', 'campanya', 'resultado_elec', 'resultado_gas',
+                        'motivo_elec', 'motivo_gas']
+
+
+def _preparar_bloque(bloque, campanya=None):
+    """Limpia un bloque leído del CSV y le añade clave_libro y ventas_totales"""
+    if campanya is not None:
+        bloque = bloque[bloque['campanya'].astype(str).str.strip() == campanya]
+    
+    bloque = bloque.assign(
+        fecha=pd.to_datetime(bloque['fecha'], errors='coerce').dt.strftime('%Y-%m-%d')
+    )
+    bloque = bloque.dropna(subset=['fecha'])
+    
+    # La clave se calcula antes de las ventas y con la duración tal como se
+    # leyó, como en analizar_csv_llamadas
+    bloque['clave_libro'] = calcular_claves_libro(bloque)
+    bloque['tiempo_conversacion'] = pd.to_numeric(bloque['tiempo_conversacion'], errors='coerce') \
+                                      .fillna(0).astype('int32')
+    
+    for col in ('resultado_elec', 'resultado_gas'):
+        bloque[col] = bloque[col].astype(str).str.strip()
+    for col in ('motivo_elec', 'motivo_gas'):
+        if col not in bloque.columns:
+            bloque[col] = ''
+    ventas_elec, ventas_gas = calcular_ventas(bloque)
+    bloque['ventas_totales'] = ventas_elec + ventas_gas
+    return bloque
+
+
+def importar_csv_por_bloques(archivo, super_users_config, campanya=None,
+                             filas_por_bloque=FILAS_POR_BLOQUE):
+    """
+    Importa un CSV de llamadas al registro diario leyéndolo por bloques.
+    
+    Para exportaciones muy grandes (un trimestre): solo se leen las
+    columnas necesarias, con tipos compactos, y cada bloque se agrega y se
+    descarta; el CSV completo nunca está en memoria. El resultado es el
+    mismo que analizar_csv_llamadas + realizar_analisis +
+    importar_datos_a_registro, y comparte con ellos el libro de llamadas
+    ya importadas.
+    
+    Args:
+        archivo: Ruta o archivo subido (st.file_uploader)
+        super_users_config: Configuración de super usuarios
+        campanya: Importar solo esta campaña (None = todas)
+        filas_por_bloque: Filas leídas de cada vez
+    
+    Returns:
+        (exito, mensaje) como importar_datos_a_registro
+    """
+    try:
+        # Detectar separador con la primera línea, sin copiar el archivo
+        if isinstance(archivo, (str, os.PathLike)):
+            with open(archivo, 'r', encoding='utf-8') as f:
+                first_line = f.readline()
+        else:
+            archivo.seek(0)
+            first_line = archivo.readline()
+            archivo.seek(0)
+            if isinstance(first_line, bytes):
+                first_line = first_line.decode('utf-8', errors='replace')
+        separator = '\t' if '\t' in first_line else ','
+        
+        # Columnas del archivo (normalizadas igual que analizar_csv_llamadas)
+        columnas_archivo = {}
+        for col in next(csv.reader([first_line.rstrip('\r\n')], delimiter=separator)):
+            columnas_archivo.setdefault(col.strip().lower(), col)
+        
+        requeridas = COLUMNAS_IMPORTACION_REQUERIDAS + (['campanya'] if campanya is not None else [])
+        columnas_faltantes = [col for col in requeridas if col not in columnas_archivo]
+        if columnas_faltantes:
+            return False, f"Faltan columnas: {', '.join(columnas_faltantes)}"
+        
+        originales = {columnas_archivo[col]: col for col in COLUMNAS_IMPORTACION if col in columnas_archivo}
+        tipos = {original: 'category' for original, col in originales.items() if col in COLUMNAS_CATEGORICAS}
+        tipos.update({original: str for original, col in originales.items() if col == 'fecha'})
+        
+        resolvedor = obtener_resolvedor(super_users_config)
+        importacion = _nueva_importacion()
+        vistas = {}
+        
+        lector = pd.read_csv(archivo, sep=separator, encoding='utf-8', usecols=list(originales),
+                             dtype=tipos, chunksize=filas_por_bloque)
+        for bloque in lector:
+            bloque = _preparar_bloque(bloque.rename(columns=originales), campanya)
+            if not bloque.empty:
+                _importar_bloque(bloque, resolvedor, importacion, vistas)
+        
+        if importacion['total_lineas'] == 0:
+            return False, "No hay datos para importar"
+        
+        return _cerrar_importacion(importacion, super_users_config.get("agentes", {}))
+    
+    except Exception as e:
+        print(f"Error importando CSV por bloques: {e}")
+        return False, f"Error al leer archivo: {str(e)}"
+
+
 def mostrar_depuracion_agentes(df_analizado, super_users_config):
     """Muestra información de depuración para coincidencia de agentes"""
     st.subheader("🔍 Depuración: Coincidencia de Agentes")
@@ -1135,30 +1210,16 @@ def mostrar_depuracion_agentes(df_analizado, super_users_config):
     coincidencias_parciales = []
     sin_coincidencia = []
     
+    resolvedor = obtener_resolvedor(super_users_config)
     for agente_csv in agentes_csv:
-        agente_csv_clean = str(agente_csv).upper()
-        encontrado = False
-        
-        # Búsqueda exacta
-        for agent_id in agentes_sistema.keys():
-            if str(agent_id).upper() == agente_csv_clean:
-                coincidencias_directas.append(f"`{agente_csv}` → `{agent_id}`")
-                encontrado = True
-                break
-        
-        # Búsqueda parcial
-        if not encontrado:
-            for agent_id in agentes_sistema.keys():
-                agent_id_clean = str(agent_id).upper()
-                if (agente_csv_clean in agent_id_clean or 
-                    agent_id_clean in agente_csv_clean or
-                    agente_csv_clean[-4:] == agent_id_clean[-4:]):
-                    coincidencias_parciales.append(f"`{agente_csv}` → `{agent_id}`")
-                    encontrado = True
-                    break
-        
-        if not encontrado:
+        agent_id = resolvedor.resolver(agente_csv)
+        
+        if agent_id is None:
             sin_coincidencia.append(agente_csv)
+        elif resolvedor.es_exacta(agente_csv, agent_id):
+            coincidencias_directas.append(f"`{agente_csv}` → `{agent_id}`")
+        else:
+            coincidencias_parciales.append(f"`{agente_csv}` → `{agent_id}`")
     
     # Mostrar resultados
     if coincidencias_directas:
@@ -1351,6 +1412,13 @@ def interfaz_analisis_llamadas():
     if 'df_analizado_actual' not in st.session_state:
         st.session_state.df_analizado_actual = None
     
+    # Archivos muy grandes: importar todas las campañas sin cargar el CSV
+    # entero (mismas ventas que analizar TODAS las campañas e importar)
+    por_bloques = st.checkbox(
+        "⚡ Importar por bloques (archivos muy grandes)",
+        help="Lee el archivo por partes y lo importa directamente al registro (todas las campañas), sin cargarlo entero en memoria ni mostrar el análisis"
+    )
+    
     # Paso 1: Subir archivo
     uploaded_file = st.file_uploader(
         "1. 📤 Sube tu archivo CSV/TXT de llamadas",
@@ -1358,6 +1426,20 @@ def interfaz_analisis_llamadas():
         help="Archivo separado por tabulaciones con columna 'campanya'"
     )
     
+    if uploaded_file is not None and por_bloques:
+        if st.button("📥 Importar todas las campañas al registro", type="primary"):
+            with st.spinner("Importando por bloques..."):
+                exito, mensaje = importar_csv_por_bloques(uploaded_file, cargar_super_users())
+                
+                if exito:
+                    st.success("✅ Datos importados exitosamente")
+                    for linea in mensaje.split('\n'):
+                        if linea.strip():
+                            st.write(linea)
+                else:
+                    st.error(f"❌ Error: {mensaje}")
+        return
+    
     # Procesar archivo
     if uploaded_file is not None and not st.session_state.analisis_realizado:
         with st.spinner("📂 Cargando y procesando archivo..."):
@@ -1435,11 +1517,8 @@ def interfaz_analisis_llamadas():
                             st.write(f"**{camp1[:30]}...**" if len(camp1) > 30 else f"**{camp1}**")
                             if not df_camp1.empty:
                                 llamadas1 = len(df_camp1)
-                                ventas1 = df_camp1.apply(
-                                    lambda row: contar_ventas_resultado(row['resultado_elec']) + 
-                                              contar_ventas_resultado(row['resultado_gas']), 
-                                    axis=1
-                                ).sum()
+                                ventas1 = (ventas_resultado(df_camp1['resultado_elec']) +
+                                           ventas_resultado(df_camp1['resultado_gas'])).sum()
                                 st.metric("Llamadas", llamadas1)
                                 st.metric("Ventas", int(ventas1))
                                 st.metric("Tasa", f"{(ventas1/llamadas1*100):.1f}%" if llamadas1 > 0 else "0%")
@@ -1448,11 +1527,8 @@ def interfaz_analisis_llamadas():
                             st.write(f"**{camp2[:30]}...**" if len(camp2) > 30 else f"**{camp2}**")
                             if not df_camp2.empty:
                                 llamadas2 = len(df_camp2)
-                                ventas2 = df_camp2.apply(
-                                    lambda row: contar_ventas_resultado(row['resultado_elec']) + 
-                                              contar_ventas_resultado(row['resultado_gas']), 
-                                    axis=1
-                                ).sum()
+                                ventas2 = (ventas_resultado(df_camp2['resultado_elec']) +
+                                           ventas_resultado(df_camp2['resultado_gas'])).sum()
                                 st.metric("Llamadas", llamadas2)
                                 st.metric("Ventas", int(ventas2))
                                 st.metric("Tasa", f"{(ventas2/llamadas2*100):.1f}%" if llamadas2 > 0 else "0%")
@@ -0,0 +1,213 @@
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+
+import codec_json
+
+# ==============================================
+# LIBRO DE LLAMADAS YA IMPORTADAS AL REGISTRO
+# ==============================================
+#
+# Cada llamada importada al registro diario deja su hash (el de
+# calcular_claves_libro: agente, fecha, duración y ventas) y el agente del
+# sistema al que se asignó en un archivo de texto por día, una línea por
+# llamada, solo de escritura al final:
+#
+#   data/llamadas_procesadas/<YYYY-MM-DD>.txt   →   "<hash>\t<agent_id>"
+#
+# Dos llamadas distintas pueden tener el mismo hash (mismo agente, día y
+# duración), así que el libro cuenta cuántas veces se ha importado cada
+# uno: en un CSV, la n-ésima aparición de un hash es nueva solo si el
+# libro tiene menos de n. Al volver a subir una exportación que se solapa
+# con otra ya importada, los días repetidos se descartan de golpe en vez
+# de sumarse dos veces.
+#
+# Solo se leen los días que trae el CSV. Se recuerdan en memoria los
+# últimos DIAS_EN_CACHE días leídos, y de cada uno solo se lee lo añadido
+# desde la última vez (otro proceso puede haber importado entretanto).
+#
+# El libro sigue al registro: se vacía al reiniciar el registro
+# (vaciar) y pierde las llamadas de un agente al borrar su histórico
+# (eliminar_agente), para que esas llamadas se puedan volver a importar.
+#
+# Un CSV importado por bloques (importar_csv_por_bloques) lleva la cuenta
+# de apariciones entre bloques en 'vistas', solo para los hashes que ya
+# estaban en el libro: los demás son nuevos en todas sus apariciones.
+
+DIRECTORIO = 'data/llamadas_procesadas'
+# Libro antiguo en un solo archivo (sin fecha ni agente); se borra al vaciar
+RUTA_ANTIGUA = 'data/llamadas_procesadas.txt'
+
+DIAS_EN_CACHE = 62
+
+_lock = threading.Lock()
+# {ruta del día: {'leido': bytes leídos, 'conteos': {hash: veces importado}}}
+_cache = OrderedDict()
+
+
+def _ruta_dia(fecha: str) -> str:
+    return os.path.join(DIRECTORIO, f"{fecha}.txt")
+
+
+def _fecha_valida(fecha) -> bool:
+    """'YYYY-MM-DD' (lo que sale de analizar el CSV); otra cosa no tiene archivo"""
+    return isinstance(fecha, str) and len(fecha) == 10 and fecha[4] == '-' and fecha[7] == '-'
+
+
+def _conteos_dia(fecha: str) -> Dict[str, int]:
+    """Conteos de un día, al día con lo que haya en disco (llamar con _lock)"""
+    ruta = _ruta_dia(fecha)
+    entrada = _cache.get(ruta)
+    if entrada is None:
+        entrada = {'leido': 0, 'conteos': {}}
+        _cache[ruta] = entrada
+    _cache.move_to_end(ruta)
+    while len(_cache) > DIAS_EN_CACHE:
+        _cache.popitem(last=False)
+
+    try:
+        tamano = os.path.getsize(ruta)
+    except OSError:
+        tamano = 0
+
+    if tamano < entrada['leido']:
+        # Archivo vaciado o reescrito: empezar de nuevo
+        entrada.update(leido=0, conteos={})
+
+    if tamano > entrada['leido']:
+        conteos = entrada['conteos']
+        with open(ruta, 'rb') as f:
+            f.seek(entrada['leido'])
+            nuevo = f.read()
+        # Una última línea a medio escribir se leerá entera la próxima vez
+        completo = nuevo[:nuevo.rfind(b'\n') + 1]
+        for linea in completo.decode('utf-8').splitlines():
+            h = linea.split('\t', 1)[0]
+            if h:
+                conteos[h] = conteos.get(h, 0) + 1
+        entrada['leido'] += len(completo)
+
+    return entrada['conteos']
+
+
+def filtrar_nuevas(hashes: pd.Series, fechas: pd.Series,
+                   vistas: Optional[Dict[str, int]] = None) -> pd.Series:
+    """
+    Máscara de las filas que aún no se han importado.
+
+    Args:
+        hashes: Hash de cada fila del CSV (columna 'clave_libro')
+        fechas: Fecha 'YYYY-MM-DD' de cada fila (solo se leen esos días)
+        vistas: Si el CSV llega por bloques, {hash: apariciones en bloques
+                anteriores}; se actualiza con las de este bloque. El libro no
+                debe cambiar hasta terminar el CSV.
+
+    Returns:
+        pd.Series de bool con el mismo índice
+    """
+    with _lock:
+        conteos = {}
+        for fecha in pd.unique(fechas):
+            if _fecha_valida(fecha):
+                conteos.update(_conteos_dia(fecha))
+    if not conteos:
+        return pd.Series(True, index=hashes.index)
+    ya_importadas = hashes.map(pd.Series(conteos, dtype='int64')).fillna(0)
+
+    aparicion = hashes.groupby(hashes, sort=False).cumcount().to_numpy()
+    ya_importadas = ya_importadas.to_numpy()
+
+    if vistas is not None:
+        en_libro = ya_importadas > 0
+        conocidas = hashes[en_libro]
+        if len(conocidas):
+            if vistas:
+                aparicion[en_libro] += conocidas.map(vistas).fillna(0).to_numpy(dtype='int64')
+            for h, veces in conocidas.value_counts(sort=False).items():
+                vistas[h] = vistas.get(h, 0) + veces
+
+    return pd.Series(aparicion >= ya_importadas, index=hashes.index)
+
+
+def registrar(llamadas: Iterable[Tuple[str, str, str]]) -> int:
+    """
+    Anota en el libro las llamadas recién importadas.
+
+    Args:
+        llamadas: (fecha, hash, agent_id) de cada llamada
+
+    Returns:
+        int: Llamadas anotadas
+    """
+    por_dia = {}
+    for fecha, h, agent_id in llamadas:
+        if _fecha_valida(fecha):
+            por_dia.setdefault(fecha, []).append(f"{h}\t{agent_id}\n")
+    if not por_dia:
+        return 0
+
+    with _lock:
+        os.makedirs(DIRECTORIO, exist_ok=True)
+        for fecha, lineas in por_dia.items():
+            with open(_ruta_dia(fecha), 'a', encoding='utf-8') as f:
+                f.write(''.join(lineas))
+                f.flush()
+                os.fsync(f.fileno())
+    return sum(len(lineas) for lineas in por_dia.values())
+
+
+def eliminar_agente(agent_id) -> int:
+    """
+    Quita del libro las llamadas asignadas a un agente (al borrar su
+    histórico del registro).
+
+    Returns:
+        int: Llamadas quitadas
+    """
+    agente = [str(agent_id)]
+    quitadas = 0
+    with _lock:
+        if not os.path.isdir(DIRECTORIO):
+            return 0
+        for nombre in sorted(os.listdir(DIRECTORIO)):
+            if not nombre.endswith('.txt'):
+                continue
+            ruta = os.path.join(DIRECTORIO, nombre)
+            with open(ruta, 'r', encoding='utf-8') as f:
+                lineas = f.read().splitlines(keepends=True)
+            quedan = [linea for linea in lineas if linea.rstrip('\n').split('\t', 1)[1:] != agente]
+            if len(quedan) == len(lineas):
+                continue
+            quitadas += len(lineas) - len(quedan)
+            if quedan:
+                codec_json.escribir_texto_atomico(ruta, ''.join(quedan))
+            else:
+                os.remove(ruta)
+        _cache.clear()
+    return quitadas
+
+
+def vaciar() -> None:
+    """Vacía el libro completo (al reiniciar el registro de llamadas)"""
+    with _lock:
+        shutil.rmtree(DIRECTORIO, ignore_errors=True)
+        try:
+            os.remove(RUTA_ANTIGUA)
+        except FileNotFoundError:
+            pass
+        _cache.clear()
+
+
+def total_registradas() -> int:
+    """Llamadas anotadas en el libro"""
+    with _lock:
+        if not os.path.isdir(DIRECTORIO):
+            return 0
+        return sum(
+            sum(_conteos_dia(nombre[:-4]).values())
+            for nombre in os.listdir(DIRECTORIO) if nombre.endswith('.txt')
+        )
@@ -7,6 +7,7 @@ from datetime import datetime
 from config import *
 from auth import *
 from database import *
+from database import lote_escritura, ErrorEscrituraLote
 from ui_components import mostrar_login, mostrar_panel_usuario
 from admin_functions import mostrar_panel_administrador
 from pvd_system import temporizador_pvd_mejorado
@@ -603,4 +604,10 @@ def main():
     mostrar_contenido_principal()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Cada archivo guardado durante el rerun se escribe una sola vez al final
+    try:
+        with lote_escritura():
+            main()
+    except ErrorEscrituraLote as e:
+        # Los guardar_* del rerun ya dieron el OK: avisar de lo que no se guardó
+        st.error(f"❌ No se pudieron guardar algunos cambios: {e}")
\ No newline at end of file
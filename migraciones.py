@@ -0,0 +1,97 @@
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+import pvd_tiempos
+
+# ==============================================
+# MIGRACIONES DE ESQUEMA DE data/
+# ==============================================
+#
+# Cada archivo de datos tiene una lista ordenada de migraciones
+# (version, funcion). La versión aplicada a cada archivo se guarda en
+# SCHEMA_VERSIONS_FILE ({archivo: {'version', 'hash'}}) y no dentro del
+# propio archivo, porque los datos son dicts indexados por fecha o id y una
+# clave extra se colaría en todos los bucles que los recorren. El hash es
+# el del contenido migrado: un archivo sustituido desde fuera (sincronización,
+# backup restaurado) ya no coincide y vuelve a pasar todas las migraciones.
+# database.py lo comprueba bajo un lock cada vez que el archivo cambia fuera
+# del proceso; el resto de las cargas son solo un os.stat.
+#
+# Las migraciones reciben los datos ya parseados y devuelven los migrados.
+# Deben ser idempotentes: se vuelven a ejecutar sobre datos ya migrados si
+# el proceso cae entre guardar los datos y guardar la versión, o si el
+# contenido no tiene sello.
+
+SCHEMA_VERSIONS_FILE = 'data/schema_versions.json'
+
+
+def _registro_llamadas_v1(registro: Dict) -> Dict:
+    """Registros antiguos con 'llamadas' → llamadas_15min / llamadas_totales"""
+    for fecha, datos_dia in registro.items():
+        if fecha.startswith('_'):
+            # Metadatos del log de incrementos (database.CLAVE_LOG_REGISTRO)
+            continue
+        for datos_agente in datos_dia.values():
+            if 'llamadas' in datos_agente and 'llamadas_totales' not in datos_agente:
+                # Los datos antiguos solo tienen "llamadas" (que son las >15min)
+                datos_agente['llamadas_totales'] = 0  # Inicializar totales
+                datos_agente['llamadas_15min'] = datos_agente.pop('llamadas')  # Renombrar
+            elif 'llamadas_15min' not in datos_agente:
+                datos_agente['llamadas_15min'] = datos_agente.get('llamadas', 0)
+                datos_agente['llamadas_totales'] = datos_agente.get('llamadas_totales', 0)
+    return registro
+
+
+def _monitorizaciones_v1(data) -> Dict:
+    """Archivos antiguos guardados como lista → {id_monitorizacion: datos}"""
+    if isinstance(data, dict):
+        return data
+    if not isinstance(data, list):
+        return {}
+
+    monitorizaciones_dict = {}
+    for item in data:
+        mon_id = item.get('id_monitorizacion')
+        if not mon_id:
+            # Generar ID si no existe
+            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+            mon_id = f"MON_{timestamp}_{item.get('id_empleado', 'UNK')}"
+            item['id_monitorizacion'] = mon_id
+        monitorizaciones_dict[mon_id] = item
+    return monitorizaciones_dict
+
+
+def migrar_cola_pvd(cola: List[Dict]) -> bool:
+    """
+    Colas PVD → esquema v2: cada timestamp_* con su timestamp_*_epoch.
+
+    Las colas son data/pvd_cola_<grupo>.json (o filas de SQLite), con
+    nombre distinto por grupo, así que no van en MIGRACIONES: EstadoPVD
+    la aplica al cargar cada grupo. Devuelve si cambió algo (para guardar).
+    """
+    cambiada = False
+    for pausa in cola:
+        if isinstance(pausa, dict) and pvd_tiempos.sellar(pausa):
+            cambiada = True
+    return cambiada
+
+
+MIGRACIONES: Dict[str, List[Tuple[int, Callable]]] = {
+    'data/registro_llamadas.json': [
+        (1, _registro_llamadas_v1),
+    ],
+    'data/monitorizaciones.json': [
+        (1, _monitorizaciones_v1),
+    ],
+}
+
+
+def version_actual(archivo: str) -> int:
+    """Última versión de esquema definida para un archivo (0 si no tiene)"""
+    migraciones = MIGRACIONES.get(archivo)
+    return migraciones[-1][0] if migraciones else 0
+
+
+def pendientes(archivo: str, version_aplicada: int) -> List[Tuple[int, Callable]]:
+    """Migraciones posteriores a version_aplicada, en orden"""
+    return [(v, f) for v, f in MIGRACIONES.get(archivo, []) if v > version_aplicada]
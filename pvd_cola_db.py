@@ -0,0 +1,225 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+# ==============================================
+# BACKEND SQLITE PARA LAS COLAS PVD
+# ==============================================
+#
+# Alternativa a los archivos data/pvd_cola_<grupo>.json para cuando hay
+# varios procesos de Streamlit (réplicas) usando el mismo data/. Cada grupo
+# es una fila con su cola en JSON y un número de versión:
+#
+# - Las escrituras son compare-and-swap: solo se aplican si la versión
+#   de la base sigue siendo la que se leyó (ConflictoVersion si no).
+# - transaccion() abre BEGIN IMMEDIATE, que bloquea escrituras de otros
+#   procesos hasta el COMMIT: leer, modificar y guardar un grupo dentro de
+#   ella no puede perder cambios de otra réplica.
+# - La tabla 'lideres' guarda arrendamientos (propietario + caducidad) para
+#   que solo un proceso ejecute el temporizador (ver pvd_lider).
+#
+# El backend se activa en cuanto existe DB_PATH (ver
+# database.migrar_colas_pvd_a_sqlite: botón en Administración PVD o
+# PVD_COLAS_SQLITE=1 al arrancar).
+
+DB_PATH = 'data/pvd_colas.db'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS colas (
+    grupo TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    datos TEXT NOT NULL DEFAULT '[]'
+);
+CREATE TABLE IF NOT EXISTS lideres (
+    nombre TEXT PRIMARY KEY,
+    propietario TEXT NOT NULL,
+    expira REAL NOT NULL
+);
+"""
+
+_local = threading.local()
+
+
+class ConflictoVersion(Exception):
+    """La cola cambió en la base desde que se leyó"""
+
+
+def backend_activo(db_path: str = DB_PATH) -> bool:
+    """Indica si las colas PVD viven en SQLite"""
+    return os.path.exists(db_path)
+
+
+def obtener_conexion(db_path: str = DB_PATH) -> sqlite3.Connection:
+    """Devuelve la conexión del hilo actual (una por hilo y base de datos)"""
+    conexiones = getattr(_local, 'conexiones', None)
+    if conexiones is None:
+        conexiones = _local.conexiones = {}
+
+    conn = conexiones.get(db_path)
+    if conn is None:
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        # Transacciones explícitas (ver transaccion)
+        conn = sqlite3.connect(db_path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        conexiones[db_path] = conn
+    return conn
+
+
+def cerrar_conexion(db_path: str = DB_PATH) -> None:
+    """Cierra la conexión del hilo actual"""
+    conexiones = getattr(_local, 'conexiones', None) or {}
+    conn = conexiones.pop(db_path, None)
+    if conn is not None:
+        conn.close()
+
+
+@contextmanager
+def transaccion(db_path: str = DB_PATH):
+    """
+    Transacción de escritura exclusiva entre procesos (BEGIN IMMEDIATE).
+    Anidable en el mismo hilo: las internas son SAVEPOINTs.
+    """
+    conn = obtener_conexion(db_path)
+    profundidades = getattr(_local, 'profundidad', None)
+    if profundidades is None:
+        profundidades = _local.profundidad = {}
+    profundidad = profundidades.get(db_path, 0)
+
+    if profundidad == 0:
+        conn.execute("BEGIN IMMEDIATE")
+    else:
+        conn.execute(f"SAVEPOINT nivel_{profundidad}")
+    profundidades[db_path] = profundidad + 1
+
+    try:
+        yield conn
+    except BaseException:
+        profundidades[db_path] = profundidad
+        if profundidad == 0:
+            conn.execute("ROLLBACK")
+        else:
+            conn.execute(f"ROLLBACK TO nivel_{profundidad}")
+            conn.execute(f"RELEASE nivel_{profundidad}")
+        raise
+
+    profundidades[db_path] = profundidad
+    if profundidad == 0:
+        conn.execute("COMMIT")
+    else:
+        conn.execute(f"RELEASE nivel_{profundidad}")
+
+
+# ------------------------------------------
+# Colas
+# ------------------------------------------
+
+def version_cola(grupo: str, db_path: str = DB_PATH) -> int:
+    """Versión actual de la cola de un grupo (0 si no existe)"""
+    fila = obtener_conexion(db_path).execute(
+        "SELECT version FROM colas WHERE grupo = ?", (grupo,)
+    ).fetchone()
+    return fila['version'] if fila else 0
+
+
+def versiones(db_path: str = DB_PATH) -> Dict[str, int]:
+    """{grupo: versión} de todas las colas"""
+    return {
+        fila['grupo']: fila['version']
+        for fila in obtener_conexion(db_path).execute("SELECT grupo, version FROM colas")
+    }
+
+
+def leer_cola(grupo: str, db_path: str = DB_PATH) -> Tuple[int, List]:
+    """(versión, cola) de un grupo; (0, []) si no existe"""
+    fila = obtener_conexion(db_path).execute(
+        "SELECT version, datos FROM colas WHERE grupo = ?", (grupo,)
+    ).fetchone()
+    if fila is None:
+        return 0, []
+    return fila['version'], json.loads(fila['datos'])
+
+
+def guardar_cola(grupo: str, cola: List, version_esperada: int, db_path: str = DB_PATH) -> int:
+    """
+    Guarda la cola si la versión en la base sigue siendo version_esperada.
+
+    Returns:
+        int: Versión nueva
+
+    Raises:
+        ConflictoVersion: Otro proceso la cambió antes
+    """
+    conn = obtener_conexion(db_path)
+    datos = json.dumps(cola, ensure_ascii=False)
+
+    if version_esperada == 0:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO colas (grupo, version, datos) VALUES (?, 1, ?)",
+            (grupo, datos)
+        )
+    else:
+        cursor = conn.execute(
+            "UPDATE colas SET version = version + 1, datos = ? WHERE grupo = ? AND version = ?",
+            (datos, grupo, version_esperada)
+        )
+
+    if cursor.rowcount == 0:
+        raise ConflictoVersion(
+            f"Cola PVD {grupo}: versión {version_cola(grupo, db_path)} en la base, "
+            f"se esperaba {version_esperada}"
+        )
+    return version_esperada + 1
+
+
+def importar_colas(colas: Dict[str, List], db_path: str = DB_PATH) -> None:
+    """
+    Carga de colas desde los archivos JSON (migración). Un grupo que ya
+    estaba en la base sube de versión, para que las réplicas lo relean.
+    """
+    with transaccion(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO colas (grupo, version, datos) VALUES (?, 1, ?) "
+            "ON CONFLICT (grupo) DO UPDATE SET "
+            "version = colas.version + 1, datos = excluded.datos",
+            [(grupo, json.dumps(cola, ensure_ascii=False)) for grupo, cola in colas.items()]
+        )
+
+
+# ------------------------------------------
+# Elección de líder
+# ------------------------------------------
+
+def adquirir_lider(nombre: str, propietario: str, duracion: float, db_path: str = DB_PATH) -> bool:
+    """
+    Toma o renueva el arrendamiento 'nombre' durante 'duracion' segundos.
+    Solo se consigue si está libre, caducado o ya era de este propietario.
+    """
+    ahora = time.time()
+    with transaccion(db_path) as conn:
+        conn.execute(
+            "INSERT INTO lideres (nombre, propietario, expira) VALUES (?, ?, ?) "
+            "ON CONFLICT (nombre) DO UPDATE SET "
+            "propietario = excluded.propietario, expira = excluded.expira "
+            "WHERE lideres.propietario = excluded.propietario OR lideres.expira < ?",
+            (nombre, propietario, ahora + duracion, ahora)
+        )
+        fila = conn.execute(
+            "SELECT propietario FROM lideres WHERE nombre = ?", (nombre,)
+        ).fetchone()
+    return fila is not None and fila['propietario'] == propietario
+
+
+def soltar_lider(nombre: str, propietario: str, db_path: str = DB_PATH) -> None:
+    """Libera el arrendamiento si es de este propietario"""
+    with transaccion(db_path) as conn:
+        conn.execute(
+            "DELETE FROM lideres WHERE nombre = ? AND propietario = ?",
+            (nombre, propietario)
+        )
@@ -0,0 +1,363 @@
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import codec_json
+import pvd_tiempos
+
+# ==============================================
+# ESTADO EN MEMORIA DE LAS COLAS PVD
+# ==============================================
+#
+# La cola de cada grupo vive en memoria y es la referencia del proceso: el
+# hilo del temporizador y las sesiones de Streamlit leen y modifican esta
+# copia, no el archivo. Cada grupo tiene su propio lock, así que dos
+# operaciones sobre el mismo grupo no se pisan y dos grupos distintos no se
+# esperan entre sí. Cada cambio incrementa la versión del grupo y deja el
+# grupo pendiente de guardar; un hilo escritor vuelca a data/pvd_cola_<grupo>.json
+# en segundo plano (varios cambios seguidos se escriben una sola vez).
+#
+# Si el archivo cambia por fuera (backup restaurado, otro proceso), se detecta
+# por su firma (mtime_ns, tamaño) al acceder y el grupo se recarga, siempre
+# que no haya cambios propios sin escribir.
+#
+# Con varias réplicas se usa el backend SQLite (pvd_cola_db) en lugar de los
+# archivos. Entonces cada modificación se hace dentro de una transacción
+# exclusiva entre procesos: se relee el grupo si su versión en la base ha
+# cambiado, se aplica el cambio y se guarda al momento con compare-and-swap.
+# La versión del grupo pasa a ser la de la base, común a todas las réplicas,
+# y un hilo vigila las versiones para avisar de cambios hechos por otras.
+#
+# Las pausas llevan sus marcas de tiempo también en epoch (pvd_tiempos): al
+# cargar un grupo se completan las que falten (migración a v2) y cada
+# escritura rellena los epoch de las marcas nuevas o cambiadas.
+
+VIGILANCIA_SEGUNDOS = 1
+
+
+class EstadoPVD:
+    """Colas PVD por grupo en memoria, con persistencia asíncrona"""
+
+    def __init__(self, leer: Callable, guardar: Callable, directorio: str = 'data',
+                 db=None, migrar: Optional[Callable] = None):
+        """
+        Args:
+            leer / guardar: Funciones de E/S JSON por ruta; database.py pasa
+                            las suyas (caché, escritura atómica y backups)
+            directorio: Carpeta de los archivos pvd_cola_<grupo>.json
+            db: Módulo del backend SQLite (pvd_cola_db); se usa cuando
+                db.backend_activo()
+            migrar: migrar(cola) -> bool, pone al día en sitio una cola
+                    recién cargada (migraciones.migrar_cola_pvd)
+        """
+        self._leer = leer
+        self._guardar = guardar
+        self._migrar = migrar
+        self.directorio = directorio
+        self._db = db
+
+        self._colas: Dict[str, List[Dict]] = {}
+        self._indices: Dict[str, Dict[str, int]] = {}   # {grupo: {id_pausa: posición}}
+        self._versiones: Dict[str, int] = {}
+        self._firmas: Dict[str, Optional[tuple]] = {}   # firma del archivo tras leer/escribir
+        self._locks: Dict[str, threading.RLock] = {}
+        self._locks_lock = threading.Lock()
+
+        self._observadores: List[Callable] = []
+        self._vigilante = None
+
+        # Persistencia en segundo plano
+        self._pendientes = set()      # grupos con cambios sin escribir
+        self._escribiendo = set()     # grupos que el escritor está volcando
+        self._condicion = threading.Condition()
+        self._escritor = None
+        atexit.register(self.esperar_persistencia)
+
+    # ------------------------------------------
+    # Utilidades internas
+    # ------------------------------------------
+
+    def usa_db(self) -> bool:
+        return self._db is not None and self._db.backend_activo()
+
+    def ruta(self, grupo_id: str) -> str:
+        return os.path.join(self.directorio, f"pvd_cola_{grupo_id}.json")
+
+    def _lock(self, grupo_id: str) -> threading.RLock:
+        with self._locks_lock:
+            lock = self._locks.get(grupo_id)
+            if lock is None:
+                lock = self._locks[grupo_id] = threading.RLock()
+            return lock
+
+    def _firma(self, grupo_id: str) -> Optional[tuple]:
+        try:
+            stat = os.stat(self.ruta(grupo_id))
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _reindexar(self, grupo_id: str) -> None:
+        self._indices[grupo_id] = {
+            pausa.get('id'): i for i, pausa in enumerate(self._colas[grupo_id])
+        }
+
+    def _cargar_desde_disco(self, grupo_id: str) -> None:
+        firma = self._firma(grupo_id)
+        try:
+            cola = self._leer(self.ruta(grupo_id)) if firma is not None else []
+        except (FileNotFoundError, ValueError):
+            cola = []
+        primera_carga = grupo_id not in self._colas
+
+        self._colas[grupo_id] = cola if isinstance(cola, list) else []
+        self._firmas[grupo_id] = firma
+        self._reindexar(grupo_id)
+
+        if self._migrar is not None and self._migrar(self._colas[grupo_id]):
+            # Se reescribe ya con el esquema actual
+            self._cambio(grupo_id)
+        elif not primera_carga:
+            self._cambio(grupo_id, persistir=False)
+
+    def _cargar_desde_db(self, grupo_id: str) -> None:
+        version, cola = self._db.leer_cola(grupo_id)
+        primera_carga = grupo_id not in self._colas
+
+        self._colas[grupo_id] = cola if isinstance(cola, list) else []
+        self._versiones[grupo_id] = version
+        self._reindexar(grupo_id)
+        if self._migrar is not None:
+            # Sin transacción aquí: en la base queda migrada con el próximo cambio
+            self._migrar(self._colas[grupo_id])
+
+        if not primera_carga:
+            self._avisar(grupo_id)
+
+    def _asegurar_cargado(self, grupo_id: str) -> None:
+        """Carga el grupo la primera vez y lo recarga si cambió por fuera"""
+        if self.usa_db():
+            if grupo_id not in self._colas or self._db.version_cola(grupo_id) != self._versiones.get(grupo_id):
+                self._cargar_desde_db(grupo_id)
+            return
+
+        if grupo_id not in self._colas:
+            self._cargar_desde_disco(grupo_id)
+            return
+
+        with self._condicion:
+            ocupado = grupo_id in self._pendientes or grupo_id in self._escribiendo
+        if not ocupado and self._firma(grupo_id) != self._firmas.get(grupo_id):
+            self._cargar_desde_disco(grupo_id)
+
+    def _cambio(self, grupo_id: str, persistir: bool = True) -> None:
+        """Registra un cambio: versión nueva, guardado (o pendiente) y avisos"""
+        if persistir and self.usa_db():
+            # Dentro de _transaccion: nadie más ha podido escribir el grupo
+            self._versiones[grupo_id] = self._db.guardar_cola(
+                grupo_id, self._colas[grupo_id], self._versiones.get(grupo_id, 0)
+            )
+        else:
+            self._versiones[grupo_id] = self._versiones.get(grupo_id, 0) + 1
+
+            if persistir:
+                with self._condicion:
+                    self._pendientes.add(grupo_id)
+                    self._arrancar_escritor()
+                    self._condicion.notify_all()
+
+        self._avisar(grupo_id)
+
+    def _avisar(self, grupo_id: str) -> None:
+        for funcion in list(self._observadores):
+            try:
+                funcion(grupo_id)
+            except Exception as e:
+                print(f"Error en observador de colas PVD: {e}")
+
+    @contextmanager
+    def _transaccion(self, grupo_id: str):
+        """Lock del grupo y, con SQLite, transacción exclusiva entre procesos"""
+        with self._lock(grupo_id):
+            if not self.usa_db():
+                yield
+                return
+
+            try:
+                with self._db.transaccion():
+                    yield
+            except BaseException:
+                # Lo escrito en la transacción se ha deshecho: releer al próximo acceso
+                self._versiones[grupo_id] = -1
+                raise
+
+    # ------------------------------------------
+    # Persistencia
+    # ------------------------------------------
+
+    def _arrancar_escritor(self) -> None:
+        # Llamar con self._condicion tomado
+        if self._escritor is None or not self._escritor.is_alive():
+            self._escritor = threading.Thread(target=self._bucle_escritor, daemon=True)
+            self._escritor.start()
+
+    def _bucle_escritor(self) -> None:
+        while True:
+            with self._condicion:
+                while not self._pendientes:
+                    self._condicion.wait()
+                grupo_id = self._pendientes.pop()
+                self._escribiendo.add(grupo_id)
+
+            try:
+                self._persistir(grupo_id)
+            except Exception as e:
+                print(f"Error guardando cola PVD grupo {grupo_id}: {e}")
+            finally:
+                with self._condicion:
+                    self._escribiendo.discard(grupo_id)
+                    self._condicion.notify_all()
+
+    def _persistir(self, grupo_id: str) -> None:
+        # El lock del grupo solo se toma para copiar; la escritura va fuera
+        with self._lock(grupo_id):
+            contenido = codec_json.loads(codec_json.dumps(self._colas[grupo_id]))
+
+        self._guardar(self.ruta(grupo_id), contenido)
+
+        with self._lock(grupo_id):
+            self._firmas[grupo_id] = self._firma(grupo_id)
+
+    def esperar_persistencia(self, timeout: Optional[float] = None) -> bool:
+        """Bloquea hasta que todos los cambios estén escritos en disco"""
+        with self._condicion:
+            return self._condicion.wait_for(
+                lambda: not self._pendientes and not self._escribiendo, timeout=timeout
+            )
+
+    # ------------------------------------------
+    # Lectura
+    # ------------------------------------------
+
+    def grupos(self) -> List[str]:
+        """Grupos en memoria más los que tienen archivo en disco (o fila en la base)"""
+        grupos = set(self._colas)
+        if self.usa_db():
+            return sorted(grupos | set(self._db.versiones()))
+        try:
+            for nombre in os.listdir(self.directorio):
+                if nombre.startswith('pvd_cola_') and nombre.endswith('.json'):
+                    grupos.add(nombre[len('pvd_cola_'):-len('.json')])
+        except FileNotFoundError:
+            pass
+        return sorted(grupos)
+
+    def cola(self, grupo_id: str) -> List[Dict]:
+        """Copia independiente de la cola de un grupo"""
+        with self._lock(grupo_id):
+            self._asegurar_cargado(grupo_id)
+            return codec_json.loads(codec_json.dumps(self._colas[grupo_id]))
+
+    def version(self, grupo_id: str) -> int:
+        """Contador de cambios del grupo en este proceso"""
+        with self._lock(grupo_id):
+            self._asegurar_cargado(grupo_id)
+            return self._versiones.get(grupo_id, 0)
+
+    def registrar_observador(self, funcion: Callable) -> None:
+        """funcion(grupo_id) se llama tras cada cambio de una cola (también de otras réplicas)"""
+        if funcion not in self._observadores:
+            self._observadores.append(funcion)
+
+        if self._db is not None and self._vigilante is None:
+            self._vigilante = threading.Thread(target=self._vigilar_db, daemon=True)
+            self._vigilante.start()
+
+    def _vigilar_db(self) -> None:
+        """Avisa de los grupos que otra réplica ha cambiado en la base"""
+        vistas = {}
+        while True:
+            time.sleep(VIGILANCIA_SEGUNDOS)
+            try:
+                if not self.usa_db():
+                    continue
+                for grupo_id, version in self._db.versiones().items():
+                    if vistas.get(grupo_id) != version:
+                        vistas[grupo_id] = version
+                        if version != self._versiones.get(grupo_id):
+                            self._avisar(grupo_id)
+            except Exception as e:
+                print(f"Error vigilando colas PVD: {e}")
+
+    # ------------------------------------------
+    # Modificación
+    # ------------------------------------------
+
+    @contextmanager
+    def modificar(self, grupo_id: str):
+        """
+        Da la cola viva del grupo con su lock tomado, para cambios que
+        afectan a varias pausas. Si el bloque lanza una excepción la cola
+        vuelve a como estaba; si no cambia nada no se guarda.
+        """
+        with self._transaccion(grupo_id):
+            self._asegurar_cargado(grupo_id)
+            cola = self._colas[grupo_id]
+            antes = codec_json.dumps(cola)
+            try:
+                yield cola
+            except BaseException:
+                cola[:] = codec_json.loads(antes)
+                self._reindexar(grupo_id)
+                raise
+
+            if codec_json.dumps(cola) != antes:
+                for pausa in cola:
+                    pvd_tiempos.sellar(pausa)
+                self._reindexar(grupo_id)
+                self._cambio(grupo_id)
+
+    def reemplazar(self, grupo_id: str, cola: List[Dict]) -> None:
+        """Sustituye la cola completa del grupo"""
+        with self._transaccion(grupo_id):
+            self._asegurar_cargado(grupo_id)
+            self._colas[grupo_id] = codec_json.loads(codec_json.dumps(cola))
+            for pausa in self._colas[grupo_id]:
+                pvd_tiempos.sellar(pausa)
+            self._reindexar(grupo_id)
+            self._cambio(grupo_id)
+
+    def agregar_pausa(self, grupo_id: str, pausa: Dict) -> None:
+        """Añade una pausa al final de la cola del grupo"""
+        with self._transaccion(grupo_id):
+            self._asegurar_cargado(grupo_id)
+            cola = self._colas[grupo_id]
+            nueva = dict(pausa)
+            pvd_tiempos.sellar(nueva)
+            cola.append(nueva)
+            self._indices[grupo_id][pausa.get('id')] = len(cola) - 1
+            self._cambio(grupo_id)
+
+    def actualizar_pausa(self, grupo_id: str, pausa_id: str, cambios: Dict) -> Optional[Dict]:
+        """
+        Aplica 'cambios' a una pausa localizada por id.
+
+        Returns:
+            Copia de la pausa actualizada, o None si no existe
+        """
+        with self._transaccion(grupo_id):
+            self._asegurar_cargado(grupo_id)
+            posicion = self._indices[grupo_id].get(pausa_id)
+            if posicion is None:
+                return None
+
+            pausa = self._colas[grupo_id][posicion]
+            pausa.update(cambios)
+            # Marcas cambiadas sin su epoch: recalcularlo
+            pvd_tiempos.sellar(pausa, [campo for campo in cambios
+                                       if campo + pvd_tiempos.SUFIJO not in cambios], forzar=True)
+            self._cambio(grupo_id)
+            return dict(pausa)
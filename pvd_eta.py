@@ -0,0 +1,105 @@
+import heapq
+import threading
+from typing import Dict, Optional
+
+from database import estado_pvd, cargar_config_sistema
+from pvd_lista_espera import ListaEspera
+from pvd_tiempos import epoch
+from utils import obtener_hora_madrid
+
+# ==============================================
+# TIEMPOS ESTIMADOS DE ESPERA PVD
+# ==============================================
+#
+# Una sola simulación por grupo calcula cuándo empezará cada pausa en
+# espera: los huecos del grupo (maximo_simultaneo) quedan libres cuando
+# acaba cada pausa en curso, y cada agente en espera, por orden, ocupa el
+# primer hueco libre durante la duración que eligió (corta o larga).
+#
+# El resultado son instantes absolutos (epoch), así que sigue valiendo
+# mientras la cola no cambie: se guarda por grupo junto a la versión de la
+# cola (estado_pvd) y la configuración del grupo, y todas las sesiones que
+# miran el mismo grupo comparten el cálculo.
+
+DURACIONES_DEFECTO = {'maximo_simultaneo': 2, 'duracion_corta': 5, 'duracion_larga': 10}
+
+# {grupo_id: (clave, {'pausas': {id: epoch}, 'usuarios': {usuario_id: epoch}})}
+_cache_etas = {}
+_cache_lock = threading.Lock()
+
+
+def _config_grupo(grupo_id):
+    grupos_config = cargar_config_sistema().get('grupos_pvd', {})
+    config_grupo = grupos_config.get(grupo_id, {})
+    return tuple(config_grupo.get(campo, defecto) for campo, defecto in DURACIONES_DEFECTO.items())
+
+
+def _simular(cola_grupo, maximo_simultaneo, duracion_corta, duracion_larga):
+    """Instante estimado de inicio de cada pausa en espera"""
+    ahora = obtener_hora_madrid().timestamp()
+    duraciones = {'corta': duracion_corta * 60, 'larga': duracion_larga * 60}
+
+    # Cuándo acaba cada pausa en curso (las ya vencidas, ahora)
+    fines = []
+    for pausa in cola_grupo:
+        if pausa['estado'] == 'EN_CURSO':
+            fin = ahora
+            inicio = epoch(pausa, 'timestamp_inicio')
+            if inicio is not None:
+                fin = max(ahora, inicio + duraciones.get(pausa.get('duracion_elegida', 'corta'), duraciones['corta']))
+            fines.append(fin)
+    fines.sort()
+
+    # Huecos: los libres ya, más los que dejan las pausas en curso. Si hay
+    # más pausas en curso que huecos, solo cuentan las que acaban las últimas
+    maximo_simultaneo = max(1, maximo_simultaneo)
+    huecos = [ahora] * max(0, maximo_simultaneo - len(fines)) + fines[-maximo_simultaneo:]
+    heapq.heapify(huecos)
+
+    etas = {'pausas': {}, 'usuarios': {}}
+    for pausa in ListaEspera(cola_grupo):
+        inicio = heapq.heappop(huecos)
+        etas['pausas'][pausa['id']] = inicio
+        etas['usuarios'].setdefault(pausa['usuario_id'], inicio)
+        heapq.heappush(huecos, inicio + duraciones.get(pausa.get('duracion_elegida', 'corta'), duraciones['corta']))
+    return etas
+
+
+def etas_grupo(grupo_id) -> Dict[str, Dict[str, float]]:
+    """
+    Inicio estimado (epoch) de todas las pausas en espera de un grupo
+
+    Returns:
+        {'pausas': {id_pausa: epoch}, 'usuarios': {usuario_id: epoch}}
+    """
+    clave = (estado_pvd.version(grupo_id), _config_grupo(grupo_id))
+
+    with _cache_lock:
+        entrada = _cache_etas.get(grupo_id)
+    if entrada is not None and entrada[0] == clave:
+        return entrada[1]
+
+    etas = _simular(estado_pvd.cola(grupo_id), *clave[1])
+
+    with _cache_lock:
+        _cache_etas[grupo_id] = (clave, etas)
+    return etas
+
+
+def _a_minutos(inicio):
+    segundos = inicio - obtener_hora_madrid().timestamp()
+    if segundos <= 0:
+        return 0
+    return max(1, int(segundos / 60 + 0.5))
+
+
+def minutos_espera_usuario(grupo_id, usuario_id) -> Optional[int]:
+    """Minutos estimados hasta la pausa del usuario (None si no está en espera)"""
+    inicio = etas_grupo(grupo_id)['usuarios'].get(usuario_id)
+    return None if inicio is None else _a_minutos(inicio)
+
+
+def minutos_espera_pausa(grupo_id, pausa_id) -> Optional[int]:
+    """Minutos estimados hasta que empiece una pausa (None si no está en espera)"""
+    inicio = etas_grupo(grupo_id)['pausas'].get(pausa_id)
+    return None if inicio is None else _a_minutos(inicio)
@@ -0,0 +1,245 @@
+import csv
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+import codec_json
+from pvd_tiempos import epoch
+
+# ==============================================
+# HISTÓRICO DIARIO DE PAUSAS PVD
+# ==============================================
+#
+# Las colas vivas solo guardan las pausas del día: _limpiar_cola_antigua
+# quita las terminadas de días anteriores. Antes de eso, cada pausa
+# terminada (COMPLETADO o CANCELADO) se añade a un CSV por día, solo de
+# escritura al final:
+#
+#   data/pvd_historico/AAAA-MM-DD.csv    una fila por pausa
+#   data/pvd_historico/AAAA-MM-DD.json   agregados del día por grupo y agente
+#
+# Los agregados (pausas, minutos, espera y cancelaciones) se actualizan al
+# archivar, así que consultarlos no obliga a recorrer el CSV. Si no cuadran
+# con el CSV (p.ej. el proceso murió entre una escritura y otra), se
+# recalculan desde él. Una pausa solo se archiva una vez: se lleva la
+# cuenta de los ids de cada CSV.
+
+DIRECTORIO = 'data/pvd_historico'
+
+ESTADOS_TERMINADOS = ('COMPLETADO', 'CANCELADO')
+
+CAMPOS = [
+    'id', 'grupo', 'usuario_id', 'usuario_nombre', 'duracion_elegida', 'estado',
+    'motivo_cancelacion', 'timestamp_solicitud', 'timestamp_inicio', 'timestamp_fin',
+    'espera_min', 'minutos_pausa', 'finalizado_auto'
+]
+
+_lock = threading.Lock()
+# {fecha: (tamaño del CSV, {ids archivados})}
+_ids_cache = {}
+
+
+def ruta_csv(fecha: str) -> str:
+    """CSV del histórico de un día ('AAAA-MM-DD')"""
+    return os.path.join(DIRECTORIO, f"{fecha}.csv")
+
+
+def _ruta_agregados(fecha: str) -> str:
+    return os.path.join(DIRECTORIO, f"{fecha}.json")
+
+
+def _minutos_entre(pausa, desde, hasta):
+    inicio, fin = epoch(pausa, desde), epoch(pausa, hasta)
+    if inicio is None or fin is None:
+        return None
+    return round((fin - inicio) / 60, 2)
+
+
+def _fecha_pausa(pausa) -> str:
+    """Día al que pertenece una pausa (el de la solicitud)"""
+    for campo in ('timestamp_solicitud', 'timestamp_fin', 'timestamp_cancelacion'):
+        if pausa.get(campo):
+            try:
+                return datetime.fromisoformat(pausa[campo]).date().isoformat()
+            except (TypeError, ValueError):
+                continue
+    return 'sin_fecha'
+
+
+def _fila(grupo_id, pausa) -> Dict:
+    completada = pausa.get('estado') == 'COMPLETADO'
+    return {
+        'id': pausa.get('id', ''),
+        'grupo': grupo_id,
+        'usuario_id': pausa.get('usuario_id', ''),
+        'usuario_nombre': pausa.get('usuario_nombre', ''),
+        'duracion_elegida': pausa.get('duracion_elegida', ''),
+        'estado': pausa.get('estado', ''),
+        'motivo_cancelacion': pausa.get('motivo_cancelacion', ''),
+        'timestamp_solicitud': pausa.get('timestamp_solicitud') or '',
+        'timestamp_inicio': pausa.get('timestamp_inicio') or '',
+        'timestamp_fin': pausa.get('timestamp_fin') or pausa.get('timestamp_cancelacion') or '',
+        'espera_min': _minutos_entre(pausa, 'timestamp_solicitud', 'timestamp_inicio'),
+        'minutos_pausa': _minutos_entre(pausa, 'timestamp_inicio', 'timestamp_fin') if completada else None,
+        'finalizado_auto': bool(pausa.get('finalizado_auto', False)),
+    }
+
+
+# ------------------------------------------
+# Agregados
+# ------------------------------------------
+
+def _agregados_vacios() -> Dict:
+    return {'archivadas': 0, 'grupos': {}, 'agentes': {}}
+
+
+def _acumular(agregados, fila) -> None:
+    """Suma una fila del CSV (valores como texto o números) a los agregados"""
+    agregados['archivadas'] += 1
+    destinos = [
+        agregados['grupos'].setdefault(fila['grupo'], {}),
+        agregados['agentes'].setdefault(fila['usuario_id'], {'nombre': fila['usuario_nombre']}),
+    ]
+    for acumulado in destinos:
+        for campo in ('pausas', 'minutos', 'espera_total', 'esperas', 'canceladas'):
+            acumulado.setdefault(campo, 0)
+
+        if fila['estado'] == 'CANCELADO':
+            acumulado['canceladas'] += 1
+            continue
+
+        acumulado['pausas'] += 1
+        if fila['minutos_pausa'] not in (None, ''):
+            acumulado['minutos'] += float(fila['minutos_pausa'])
+        if fila['espera_min'] not in (None, ''):
+            acumulado['espera_total'] += float(fila['espera_min'])
+            acumulado['esperas'] += 1
+
+
+def _leer_agregados(fecha: str) -> Dict:
+    try:
+        return codec_json.leer_archivo(_ruta_agregados(fecha))
+    except (FileNotFoundError, ValueError):
+        return _agregados_vacios()
+
+
+def leer_dia(fecha: str) -> List[Dict]:
+    """Filas del histórico de un día ('AAAA-MM-DD'); [] si no hay"""
+    try:
+        with open(ruta_csv(fecha), 'r', encoding='utf-8', newline='') as f:
+            return list(csv.DictReader(f))
+    except FileNotFoundError:
+        return []
+
+
+def recalcular_agregados(fecha: str) -> Dict:
+    """Rehace los agregados de un día desde su CSV"""
+    agregados = _agregados_vacios()
+    for fila in leer_dia(fecha):
+        _acumular(agregados, fila)
+    codec_json.escribir_archivo(_ruta_agregados(fecha), agregados)
+    return agregados
+
+
+def _ids_archivados(fecha: str) -> set:
+    """Ids ya en el CSV del día (se relee si otro proceso lo ha ampliado)"""
+    ruta = ruta_csv(fecha)
+    tamano = os.path.getsize(ruta) if os.path.exists(ruta) else 0
+
+    entrada = _ids_cache.get(fecha)
+    if entrada is not None and entrada[0] == tamano:
+        return entrada[1]
+
+    filas = leer_dia(fecha)
+    ids = {fila['id'] for fila in filas}
+    _ids_cache[fecha] = (tamano, ids)
+
+    if _leer_agregados(fecha).get('archivadas') != len(filas):
+        recalcular_agregados(fecha)
+    return ids
+
+
+# ------------------------------------------
+# API
+# ------------------------------------------
+
+def archivar_pausas(grupo_id: str, pausas: Iterable[Dict]) -> int:
+    """
+    Añade al histórico las pausas terminadas que aún no estén archivadas.
+    Si falla, lanza la excepción: quien limpia la cola no debe quitarlas.
+
+    Returns:
+        int: Pausas archivadas ahora
+    """
+    por_fecha = {}
+    with _lock:
+        for pausa in pausas:
+            if pausa.get('estado') not in ESTADOS_TERMINADOS or not pausa.get('id'):
+                continue
+            fecha = _fecha_pausa(pausa)
+            if pausa['id'] in _ids_archivados(fecha):
+                continue
+            filas = por_fecha.setdefault(fecha, {})
+            filas[pausa['id']] = _fila(grupo_id, pausa)
+
+        for fecha, filas in por_fecha.items():
+            ruta = ruta_csv(fecha)
+            os.makedirs(DIRECTORIO, exist_ok=True)
+            nuevo = not os.path.exists(ruta) or os.path.getsize(ruta) == 0
+
+            with open(ruta, 'a', encoding='utf-8', newline='') as f:
+                escritor = csv.DictWriter(f, fieldnames=CAMPOS)
+                if nuevo:
+                    escritor.writeheader()
+                escritor.writerows(filas.values())
+                f.flush()
+                os.fsync(f.fileno())
+
+            agregados = _leer_agregados(fecha)
+            for fila in filas.values():
+                _acumular(agregados, fila)
+            codec_json.escribir_archivo(_ruta_agregados(fecha), agregados)
+
+            ids = _ids_cache[fecha][1]
+            ids.update(filas)
+            _ids_cache[fecha] = (os.path.getsize(ruta), ids)
+
+    return sum(len(filas) for filas in por_fecha.values())
+
+
+def resumen_dia(fecha: str) -> Dict:
+    """
+    Estadísticas de un día ('AAAA-MM-DD') desde los agregados
+
+    Returns:
+        {'grupos': {grupo: stats}, 'agentes': {usuario_id: stats}} con
+        stats = pausas, minutos, espera_media (min), canceladas (y nombre
+        en los agentes)
+    """
+    agregados = _leer_agregados(fecha)
+    resumen = {}
+    for seccion in ('grupos', 'agentes'):
+        resumen[seccion] = {}
+        for clave, acumulado in agregados.get(seccion, {}).items():
+            stats = {
+                'pausas': acumulado.get('pausas', 0),
+                'minutos': round(acumulado.get('minutos', 0), 1),
+                'espera_media': round(acumulado['espera_total'] / acumulado['esperas'], 1)
+                                if acumulado.get('esperas') else None,
+                'canceladas': acumulado.get('canceladas', 0),
+            }
+            if 'nombre' in acumulado:
+                stats['nombre'] = acumulado['nombre']
+            resumen[seccion][clave] = stats
+    return resumen
+
+
+def fechas_disponibles() -> List[str]:
+    """Días con histórico, del más reciente al más antiguo"""
+    if not os.path.isdir(DIRECTORIO):
+        return []
+    return sorted(
+        (nombre[:-4] for nombre in os.listdir(DIRECTORIO) if nombre.endswith('.csv')),
+        reverse=True
+    )
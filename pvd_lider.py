@@ -0,0 +1,119 @@
+import os
+import socket
+import threading
+import uuid
+from typing import Callable, Optional
+
+import pvd_cola_db
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo de archivos, un solo proceso
+    fcntl = None
+
+# ==============================================
+# ELECCIÓN DE LÍDER DEL TEMPORIZADOR PVD
+# ==============================================
+#
+# Cada proceso de Streamlit crea su TemporizadorPVDMejorado al importar
+# pvd_system, pero solo uno debe finalizar pausas y avisar al siguiente:
+# con varios a la vez se promociona dos veces al mismo agente.
+#
+# - Con el backend SQLite de colas (pvd_cola_db), el líder es quien tiene
+#   el arrendamiento en la tabla 'lideres'. Se renueva cada RENOVACION
+#   segundos; si el proceso muere, otro lo toma al caducar (DURACION).
+# - Con los archivos JSON, el líder es quien tiene el flock de
+#   data/<nombre>.lock; el sistema lo libera al morir el proceso.
+
+DURACION = 30      # segundos de validez del arrendamiento
+RENOVACION = 10    # cada cuánto se renueva / se intenta tomar
+
+
+class EleccionLider:
+    """Decide qué proceso ejecuta una tarea única"""
+
+    def __init__(self, nombre: str, al_ganar: Optional[Callable] = None,
+                 directorio: str = 'data'):
+        """
+        Args:
+            nombre: Tarea (p.ej. 'temporizador_pvd')
+            al_ganar: Se llama al pasar a ser líder
+            directorio: Dónde va el archivo de bloqueo (modo JSON)
+        """
+        self.nombre = nombre
+        self.propietario = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.al_ganar = al_ganar
+        self.ruta_bloqueo = os.path.join(directorio, f"{nombre}.lock")
+        self._archivo_bloqueo = None
+        self._lider = False
+        self._hilo = None
+        self._parar = threading.Event()
+
+    def es_lider(self) -> bool:
+        return self._lider
+
+    def iniciar(self) -> None:
+        """Arranca el hilo que toma y renueva el liderazgo"""
+        if self._hilo is not None:
+            return
+        self._parar.clear()
+
+        def bucle():
+            while not self._parar.is_set():
+                try:
+                    lider = self._intentar()
+                except Exception as e:
+                    print(f"Error en elección de líder {self.nombre}: {e}")
+                    lider = False
+
+                era_lider, self._lider = self._lider, lider
+                if lider and not era_lider:
+                    print(f"✅ {self.propietario} es líder de {self.nombre}")
+                    if self.al_ganar:
+                        self.al_ganar()
+                self._parar.wait(RENOVACION)
+
+        self._hilo = threading.Thread(target=bucle, daemon=True)
+        self._hilo.start()
+
+    def detener(self) -> None:
+        """Para el hilo y suelta el liderazgo para que lo tome otro proceso"""
+        hilo, self._hilo = self._hilo, None
+        if hilo is None:
+            return
+        self._parar.set()
+        hilo.join(RENOVACION)
+        self._lider = False
+
+        try:
+            if pvd_cola_db.backend_activo():
+                pvd_cola_db.soltar_lider(self.nombre, self.propietario)
+            elif self._archivo_bloqueo is not None:
+                # Cerrar el archivo libera el flock
+                self._archivo_bloqueo.close()
+                self._archivo_bloqueo = None
+        except Exception as e:
+            print(f"Error soltando liderazgo {self.nombre}: {e}")
+
+    def _intentar(self) -> bool:
+        if pvd_cola_db.backend_activo():
+            return pvd_cola_db.adquirir_lider(self.nombre, self.propietario, DURACION)
+        return self._bloquear_archivo()
+
+    def _bloquear_archivo(self) -> bool:
+        if fcntl is None:
+            return True
+        if self._archivo_bloqueo is not None:
+            return True
+
+        os.makedirs(os.path.dirname(self.ruta_bloqueo) or '.', exist_ok=True)
+        archivo = open(self.ruta_bloqueo, 'a')
+        try:
+            fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            archivo.close()
+            return False
+
+        # Se mantiene abierto mientras viva el proceso
+        self._archivo_bloqueo = archivo
+        return True
@@ -0,0 +1,93 @@
+from typing import Dict, Iterator, List, Optional
+
+from pvd_tiempos import epoch
+
+# ==============================================
+# LISTA DE ESPERA PVD ORDENADA
+# ==============================================
+#
+# Las pausas ESPERANDO de un grupo ordenadas por hora de solicitud (a igual
+# hora, por orden en la cola, como el sorted() estable de antes). Se ordena
+# una sola vez al construirla, por timestamp_solicitud_epoch; después el
+# primero y la posición de una pausa o de un usuario se consultan en O(1).
+#
+# Guarda referencias a los dicts de la cola: si una pausa deja de estar en
+# espera (se cancela, se inicia...), hay que llamar a quitar() para que la
+# lista siga reflejando la cola.
+
+
+class ListaEspera:
+    """Pausas en espera de un grupo, en orden de solicitud"""
+
+    def __init__(self, cola_grupo: List[Dict]):
+        entradas = [
+            (epoch(pausa, 'timestamp_solicitud'), orden, pausa)
+            for orden, pausa in enumerate(cola_grupo)
+            if pausa.get('estado') == 'ESPERANDO'
+        ]
+        entradas.sort(key=lambda entrada: entrada[:2])
+
+        self._pausas = [pausa for _, _, pausa in entradas]
+        self._solicitud = {pausa['id']: epoch for epoch, _, pausa in entradas}
+        self._inicio = 0    # pausas ya quitadas por la cabeza
+        self._indexar()
+
+    def _indexar(self) -> None:
+        self._posicion = {}
+        self._posicion_usuario = {}
+        for i in range(self._inicio, len(self._pausas)):
+            pausa = self._pausas[i]
+            self._posicion[pausa['id']] = i
+            # Posición de la primera pausa en espera de cada usuario
+            self._posicion_usuario.setdefault(pausa.get('usuario_id'), i)
+
+    def __len__(self) -> int:
+        return len(self._pausas) - self._inicio
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self._pausas[self._inicio:])
+
+    def primero(self) -> Optional[Dict]:
+        """Pausa que va primera (None si no hay nadie esperando)"""
+        return self._pausas[self._inicio] if self else None
+
+    def es_primero(self, pausa_id: str) -> bool:
+        return bool(self) and self._pausas[self._inicio]['id'] == pausa_id
+
+    def posicion(self, pausa_id: str) -> Optional[int]:
+        """Posición 1..n de una pausa (None si no está en espera)"""
+        i = self._posicion.get(pausa_id)
+        return None if i is None else i - self._inicio + 1
+
+    def posicion_usuario(self, usuario_id: str) -> Optional[int]:
+        """Posición 1..n de la primera pausa en espera del usuario"""
+        i = self._posicion_usuario.get(usuario_id)
+        return None if i is None else i - self._inicio + 1
+
+    def epoch_solicitud(self, pausa_id: str) -> Optional[float]:
+        return self._solicitud.get(pausa_id)
+
+    def quitar(self, pausa_id: str) -> None:
+        """Saca una pausa de la espera (O(1) si es la primera)"""
+        i = self._posicion.get(pausa_id)
+        if i is None:
+            return
+
+        if i == self._inicio:
+            self._inicio += 1
+            del self._posicion[pausa_id]
+            usuario_id = self._pausas[i].get('usuario_id')
+            if self._posicion_usuario.get(usuario_id) == i:
+                del self._posicion_usuario[usuario_id]
+                # Otra pausa del mismo usuario más atrás, si la hay
+                for j in range(i + 1, len(self._pausas)):
+                    if self._pausas[j].get('usuario_id') == usuario_id:
+                        self._posicion_usuario[usuario_id] = j
+                        break
+        else:
+            del self._pausas[i]
+            self._indexar()
+        self._solicitud.pop(pausa_id, None)
@@ -0,0 +1,122 @@
+import heapq
+import threading
+import time
+from typing import Callable, Iterable, Optional, Set
+
+# ==============================================
+# PLANIFICADOR DE PLAZOS PVD
+# ==============================================
+#
+# Montículo (min-heap) con el próximo plazo de cada grupo PVD: fin de una
+# pausa, caducidad de la confirmación (7 min) o de la espera bloqueada
+# (10 min). El hilo del temporizador duerme hasta el primer plazo o hasta
+# que alguien avisa de un cambio en una cola, y entonces procesa solo los
+# grupos afectados. Los tiempos son time.monotonic(), inmunes a cambios
+# del reloj del sistema (el simulador de carga pasa un reloj virtual).
+
+
+class PlanificadorPlazos:
+    """Próximo plazo por grupo + grupos con cambios pendientes de revisar"""
+
+    def __init__(self, reloj: Callable[[], float] = time.monotonic):
+        self._reloj = reloj
+        self._condicion = threading.Condition()
+        self._monticulo = []         # [(instante_monotonic, grupo_id)]
+        self._plazo_grupo = {}       # {grupo_id: instante vigente}
+        self._cambiados = set()      # grupos a revisar cuanto antes
+        self._revision_completa = False
+
+    def programar(self, grupo_id: str, segundos: Optional[float]) -> None:
+        """
+        Fija el próximo plazo de un grupo dentro de 'segundos' (None = sin
+        plazos). Sustituye al anterior; las entradas viejas del montículo se
+        descartan al salir.
+        """
+        with self._condicion:
+            if segundos is None:
+                self._plazo_grupo.pop(grupo_id, None)
+                return
+
+            instante = self._reloj() + max(0.0, segundos)
+            self._plazo_grupo[grupo_id] = instante
+            heapq.heappush(self._monticulo, (instante, grupo_id))
+            self._condicion.notify()
+
+    def marcar_cambio(self, grupo_id: str) -> None:
+        """Avisa de que la cola de un grupo ha cambiado"""
+        with self._condicion:
+            self._cambiados.add(grupo_id)
+            self._condicion.notify()
+
+    def solicitar_revision_completa(self) -> None:
+        """Pide revisar todos los grupos en la próxima vuelta"""
+        with self._condicion:
+            self._revision_completa = True
+            self._condicion.notify()
+
+    def _extraer_vencidos(self, ahora: float) -> Set[str]:
+        vencidos = set()
+        while self._monticulo and self._monticulo[0][0] <= ahora:
+            instante, grupo_id = heapq.heappop(self._monticulo)
+            if self._plazo_grupo.get(grupo_id) == instante:
+                del self._plazo_grupo[grupo_id]
+                vencidos.add(grupo_id)
+        return vencidos
+
+    def _descartar_obsoletos(self) -> None:
+        while self._monticulo and self._plazo_grupo.get(self._monticulo[0][1]) != self._monticulo[0][0]:
+            heapq.heappop(self._monticulo)
+
+    def segundos_hasta_proximo(self) -> Optional[float]:
+        """Segundos hasta el próximo plazo (None si no hay ninguno)"""
+        with self._condicion:
+            self._descartar_obsoletos()
+            if not self._monticulo:
+                return None
+            return max(0.0, self._monticulo[0][0] - self._reloj())
+
+    def recoger(self) -> Optional[Set[str]]:
+        """
+        Como esperar() pero sin bloquear: grupos con plazo vencido o con
+        cambios (vacío si no hay), o None si se pidió una revisión completa
+        """
+        with self._condicion:
+            if self._revision_completa:
+                self._revision_completa = False
+                self._cambiados.clear()
+                return None
+
+            grupos = self._extraer_vencidos(self._reloj()) | self._cambiados
+            self._cambiados = set()
+            return grupos
+
+    def esperar(self, maximo_segundos: float) -> Optional[Iterable[str]]:
+        """
+        Bloquea hasta que venza algún plazo o haya cambios.
+
+        Returns:
+            Grupos a procesar, o None si toca revisar todos (se pidió una
+            revisión completa o pasaron maximo_segundos sin actividad)
+        """
+        limite = self._reloj() + maximo_segundos
+        with self._condicion:
+            while True:
+                if self._revision_completa:
+                    self._revision_completa = False
+                    self._cambiados.clear()
+                    return None
+
+                ahora = self._reloj()
+                grupos = self._extraer_vencidos(ahora) | self._cambiados
+                if grupos:
+                    self._cambiados = set()
+                    return grupos
+
+                if ahora >= limite:
+                    return None
+
+                self._descartar_obsoletos()
+                espera = limite - ahora
+                if self._monticulo:
+                    espera = min(espera, self._monticulo[0][0] - ahora)
+                self._condicion.wait(timeout=max(0.0, espera))
@@ -0,0 +1,55 @@
+import streamlit as st
+
+from database import estado_pvd
+
+# ==============================================
+# REFRESCO DE LA PÁGINA SOLO CUANDO CAMBIA LA COLA PVD
+# ==============================================
+#
+# Para enterarse de que es su turno, el agente tenía que relanzar la app
+# entera (botón "Refrescar página"), y cada relanzamiento vuelve a cargar
+# todos los datos. Ahora un fragmento de Streamlit se ejecuta solo cada
+# INTERVALO_SONDEO segundos y compara el contador de versión de las colas
+# que mira la página (estado_pvd.version: en memoria, o la versión de la
+# base con SQLite, común a todas las réplicas) con el que había al pintarla.
+# Solo si ha cambiado se relanza la app completa.
+#
+# Sin API de fragmentos (versiones antiguas de Streamlit) no se sondea y
+# queda el botón de refresco manual.
+
+INTERVALO_SONDEO = 3  # segundos
+
+_fragmento = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
+
+
+def _versiones(grupos):
+    return tuple(estado_pvd.version(grupo_id) for grupo_id in grupos)
+
+
+def _sondear(clave_estado, grupos):
+    vistas = st.session_state.get(clave_estado)
+    if vistas is not None and _versiones(grupos) != vistas:
+        # st.rerun dentro de un fragmento relanza la app completa
+        st.rerun()
+
+
+_sondeo = _fragmento(run_every=INTERVALO_SONDEO)(_sondear) if _fragmento else None
+
+
+def refrescar_al_cambiar(grupos, clave='pvd'):
+    """
+    Relanza la app cuando cambie la cola de alguno de los grupos.
+
+    Llamar antes de pintar lo que depende de las colas: la versión anotada
+    es la de ahora, así que un cambio posterior siempre provoca refresco.
+
+    Args:
+        grupos: Grupos PVD que muestra la página
+        clave: Distingue varias vigilancias en la misma página
+    """
+    grupos = tuple(grupos)
+    clave_estado = f"pvd_versiones_{clave}"
+    st.session_state[clave_estado] = _versiones(grupos)
+
+    if _sondeo is not None:
+        _sondeo(clave_estado, grupos)
@@ -0,0 +1,195 @@
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional
+
+from database import estado_pvd, lote_escritura
+
+# ==============================================
+# SUPERVISOR DEL TEMPORIZADOR PVD
+# ==============================================
+#
+# Dueño del hilo de fondo del temporizador: uno por proceso (lock del
+# módulo), con arranque y parada explícitos. Lleva las métricas que antes
+# no se veían en ningún sitio: si el hilo está vivo, cuándo fue la última
+# vuelta, cuánto tardan las vueltas (histograma) y cuántos errores ha
+# habido. El panel de administración PVD las muestra con estado().
+#
+# El hilo duerme hasta el próximo plazo o cambio de cola (planificador del
+# temporizador), o como mucho INTERVALO_REVISION_COMPLETA segundos.
+
+# Límites superiores (ms) de los tramos del histograma de vueltas
+TRAMOS_MS = (1, 5, 10, 50, 100, 500, 1000, float('inf'))
+
+# Duraciones recientes guardadas para los percentiles
+VUELTAS_RECIENTES = 500
+
+
+class MetricasTemporizador:
+    """Duración de las vueltas y errores del temporizador"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.vueltas = 0
+        self.errores = 0
+        self.ultima_vuelta: Optional[datetime] = None
+        self.ultima_duracion_ms: Optional[float] = None
+        self.ultimo_error: Optional[str] = None
+        self.momento_ultimo_error: Optional[datetime] = None
+        self.histograma = [0] * len(TRAMOS_MS)
+        self._recientes = deque(maxlen=VUELTAS_RECIENTES)
+
+    def registrar_vuelta(self, duracion_ms: float) -> None:
+        with self._lock:
+            self.vueltas += 1
+            self.ultima_vuelta = datetime.now()
+            self.ultima_duracion_ms = duracion_ms
+            self._recientes.append(duracion_ms)
+            for i, limite in enumerate(TRAMOS_MS):
+                if duracion_ms <= limite:
+                    self.histograma[i] += 1
+                    break
+
+    def registrar_error(self, contexto: str, error: Exception) -> None:
+        with self._lock:
+            self.errores += 1
+            self.ultimo_error = f"{contexto}: {error}"
+            self.momento_ultimo_error = datetime.now()
+
+    def percentil(self, p: float) -> Optional[float]:
+        """Percentil p (0-100) de las últimas vueltas, en ms"""
+        with self._lock:
+            ordenadas = sorted(self._recientes)
+        if not ordenadas:
+            return None
+        return ordenadas[min(len(ordenadas) - 1, int(p / 100 * len(ordenadas)))]
+
+    def histograma_etiquetado(self) -> Dict[str, int]:
+        """{'≤ 1 ms': n, ..., '> 1000 ms': n}"""
+        with self._lock:
+            conteos = list(self.histograma)
+        etiquetas = {}
+        for i, limite in enumerate(TRAMOS_MS):
+            etiqueta = f"≤ {limite:g} ms" if limite != float('inf') else f"> {TRAMOS_MS[i - 1]:g} ms"
+            etiquetas[etiqueta] = conteos[i]
+        return etiquetas
+
+
+class SupervisorPVD:
+    """Arranca, para y vigila el hilo del temporizador PVD"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hilo: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+        self._temporizador = None
+        self.iniciado: Optional[datetime] = None
+
+    @property
+    def metricas(self) -> Optional[MetricasTemporizador]:
+        return self._temporizador.metricas if self._temporizador else None
+
+    def vivo(self) -> bool:
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def iniciar(self, temporizador, intervalo_maximo: float) -> bool:
+        """
+        Arranca el hilo si no está ya en marcha.
+
+        Returns:
+            bool: Si se ha arrancado ahora
+        """
+        with self._lock:
+            if self.vivo():
+                return False
+
+            self._temporizador = temporizador
+            self._parar.clear()
+            temporizador.conectar()
+            temporizador.planificador.solicitar_revision_completa()
+
+            self._hilo = threading.Thread(
+                target=self._bucle, args=(temporizador, intervalo_maximo),
+                name='temporizador_pvd', daemon=True
+            )
+            self._hilo.start()
+            self.iniciado = datetime.now()
+            return True
+
+    def detener(self, timeout: float = 5) -> bool:
+        """Para el hilo y suelta el liderazgo. Devuelve si se paró a tiempo"""
+        with self._lock:
+            hilo, temporizador = self._hilo, self._temporizador
+            if hilo is None:
+                return True
+
+            self._parar.set()
+            # Despierta al hilo si está esperando un plazo
+            temporizador.planificador.solicitar_revision_completa()
+            hilo.join(timeout)
+            temporizador.lider.detener()
+
+            parado = not hilo.is_alive()
+            if parado:
+                self._hilo = None
+            return parado
+
+    def _bucle(self, temporizador, intervalo_maximo: float) -> None:
+        grupos = None  # None = revisar todos los grupos
+        while not self._parar.is_set():
+            try:
+                if temporizador.lider.es_lider():
+                    # Un solo volcado a disco por archivo y vuelta
+                    with lote_escritura():
+                        temporizador._verificar_y_actualizar(grupos)
+            except Exception as e:
+                print(f"Error en temporizador background: {e}")
+                temporizador.metricas.registrar_error('bucle', e)
+
+            grupos = temporizador.planificador.esperar(intervalo_maximo)
+
+    def estado(self) -> Dict:
+        """Foto del supervisor para el panel de administración"""
+        temporizador = self._temporizador
+        metricas = self.metricas
+
+        colas = {}
+        for grupo_id in estado_pvd.grupos():
+            cola = estado_pvd.cola(grupo_id)
+            colas[grupo_id] = {
+                'esperando': sum(1 for p in cola if p.get('estado') == 'ESPERANDO'),
+                'en_curso': sum(1 for p in cola if p.get('estado') == 'EN_CURSO'),
+                'total': len(cola),
+            }
+
+        ultima = metricas.ultima_vuelta if metricas else None
+        return {
+            'vivo': self.vivo(),
+            'lider': bool(temporizador and temporizador.lider.es_lider()),
+            'iniciado': self.iniciado,
+            'ultima_vuelta': ultima,
+            'segundos_desde_ultima': (datetime.now() - ultima).total_seconds() if ultima else None,
+            'vueltas': metricas.vueltas if metricas else 0,
+            'errores': metricas.errores if metricas else 0,
+            'ultimo_error': metricas.ultimo_error if metricas else None,
+            'momento_ultimo_error': metricas.momento_ultimo_error if metricas else None,
+            'ultima_duracion_ms': metricas.ultima_duracion_ms if metricas else None,
+            'p50_ms': metricas.percentil(50) if metricas else None,
+            'p95_ms': metricas.percentil(95) if metricas else None,
+            'histograma': metricas.histograma_etiquetado() if metricas else {},
+            'proximo_plazo_segundos': temporizador.planificador.segundos_hasta_proximo() if temporizador else None,
+            'colas': colas,
+        }
+
+
+_lock_supervisor = threading.Lock()
+_supervisor: Optional[SupervisorPVD] = None
+
+
+def obtener_supervisor() -> SupervisorPVD:
+    """El supervisor del proceso (se crea la primera vez)"""
+    global _supervisor
+    with _lock_supervisor:
+        if _supervisor is None:
+            _supervisor = SupervisorPVD()
+        return _supervisor
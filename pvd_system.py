@@ -1,7 +1,7 @@
 import streamlit as st
 from datetime import datetime, timedelta
 import json
-import threading
+import os
 import time
 import uuid
 
@@ -9,13 +9,34 @@ from utils import obtener_hora_madrid, formatear_hora_madrid
 from database import (
     cargar_config_pvd, 
     cargar_cola_pvd_grupo, 
-    guardar_cola_pvd_grupo,
+    modificar_cola_pvd_grupo,
+    agregar_pausa_pvd,
+    estado_pvd,
     cargar_configuracion_usuarios, 
     cargar_config_sistema,
     obtener_todas_colas_pvd,
     consolidar_colas_pvd,
-    limpiar_todas_colas_antiguas
+    limpiar_todas_colas_antiguas,
+    registrar_observador_escritura
 )
+from pvd_planificador import PlanificadorPlazos
+from pvd_lider import EleccionLider
+from pvd_lista_espera import ListaEspera
+from pvd_eta import minutos_espera_usuario
+from pvd_tiempos import marcar, epoch, limites_dia, es_del_dia
+from pvd_supervisor import MetricasTemporizador, obtener_supervisor
+
+# Caducidades de la cola (minutos)
+MINUTOS_CONFIRMACION = 7        # notificado sin confirmar
+MINUTOS_ESPERA_BLOQUEADA = 10   # primero en cola sin llegar a ser notificado
+
+# Red de seguridad: revisar todos los grupos aunque no venza ningún plazo
+# (cambios hechos por otro proceso, relojes, etc.)
+INTERVALO_REVISION_COMPLETA = 300
+
+# Si falla el procesado de un grupo, se reintenta a los pocos segundos en
+# vez de esperar a la revisión completa (los plazos son de 7 y 10 minutos)
+SEGUNDOS_REINTENTO_GRUPO = 15
 
 # ==============================================
 # CLASE PRINCIPAL TEMPORIZADOR PVD MEJORADO
@@ -29,49 +50,81 @@ class TemporizadorPVDMejorado:
         self.notificaciones_pendientes = {}  # {usuario_id: {timestamp: tiempo, reintentos: 0}}
         self.grupos_activos = {}  # {grupo_id: {usuarios: [], max_simultaneo: X}}
         self.ultima_actualizacion = datetime.now()
-        self._iniciar_temporizador_background()
+        self.planificador = PlanificadorPlazos()
+        # Con varios procesos, solo el líder finaliza pausas y avisa al siguiente
+        self.lider = EleccionLider('temporizador_pvd',
+                                   al_ganar=self.planificador.solicitar_revision_completa)
+        # Duración de las vueltas y errores (los muestra el supervisor)
+        self.metricas = MetricasTemporizador()
+        self._conectado = False
     
-    def _iniciar_temporizador_background(self):
-        """Inicia el temporizador en segundo plano que se ejecuta cada 60 segundos"""
-        def background_task():
-            while True:
-                try:
-                    time.sleep(60)  # Esperar 60 segundos
-                    self._verificar_y_actualizar()
-                except Exception as e:
-                    print(f"Error en temporizador background: {e}")
-        
-        thread = threading.Thread(target=background_task, daemon=True)
-        thread.start()
+    def conectar(self):
+        """
+        Engancha el planificador a los cambios de colas y de configuración
+        y arranca la elección de líder. Lo llama el supervisor (pvd_supervisor)
+        antes de arrancar el hilo, que duerme hasta el próximo plazo de
+        alguna cola (fin de pausa, confirmación o espera caducada) o hasta
+        que cambia una cola, y entonces procesa solo esos grupos.
+        """
+        if not self._conectado:
+            # Una sola vez aunque el supervisor pare y vuelva a arrancar
+            estado_pvd.registrar_observador(self.planificador.marcar_cambio)
+            registrar_observador_escritura(self._al_escribir_archivo)
+            self._conectado = True
+        self.lider.iniciar()
+    
+    def _al_escribir_archivo(self, ruta):
+        """Observador de escrituras (los cambios de colas llegan por estado_pvd)"""
+        nombre = os.path.basename(ruta)
+        if nombre in ('config_pvd.json', 'config_sistema.json'):
+            # Cambian duraciones o máximos: todos los plazos pueden moverse
+            self.planificador.solicitar_revision_completa()
     
-    def _verificar_y_actualizar(self):
-        """Verifica y actualiza estados automáticamente"""
+    def _verificar_y_actualizar(self, grupos=None):
+        """
+        Verifica y actualiza estados automáticamente
+        
+        Args:
+            grupos: Grupos a revisar; None = todos
+        """
+        inicio = time.perf_counter()
         try:
             # 1. Cargar configuración
             config_pvd = cargar_config_pvd()
             
-            # 2. Limpiar pausas bloqueadas en TODOS los grupos
-            todas_colas = obtener_todas_colas_pvd()
-            limpieza_realizada = False
+            if grupos is None:
+                grupos = estado_pvd.grupos()
             
-            for grupo_id, cola_grupo in todas_colas.items():
-                if self._limpiar_pausas_bloqueadas_grupo(grupo_id, cola_grupo):
-                    guardar_cola_pvd_grupo(grupo_id, cola_grupo)
-                    limpieza_realizada = True
-            
-            # 3. Verificar pausas finalizadas automáticamente
-            if config_pvd.get('auto_finalizar_pausa', True):
-                for grupo_id, cola_grupo in todas_colas.items():
-                    if self._finalizar_pausas_completadas_grupo(grupo_id, cola_grupo, config_pvd):
-                        guardar_cola_pvd_grupo(grupo_id, cola_grupo)
-                        limpieza_realizada = True
+            limpieza_realizada = False
             
-            # 4. Verificar notificaciones pendientes
-            if config_pvd.get('notificacion_automatica', True):
-                for grupo_id, cola_grupo in todas_colas.items():
-                    if self._enviar_notificaciones_pendientes_grupo(grupo_id, cola_grupo, config_pvd):
-                        guardar_cola_pvd_grupo(grupo_id, cola_grupo)
-                        limpieza_realizada = True
+            for grupo_id in grupos:
+                try:
+                    # Cola viva del grupo: nadie la toca mientras se procesa
+                    with modificar_cola_pvd_grupo(grupo_id) as cola_grupo:
+                        # 2. Limpiar pausas bloqueadas
+                        modificado = self._limpiar_pausas_bloqueadas_grupo(grupo_id, cola_grupo)
+                    
+                        # 3. Verificar pausas finalizadas automáticamente
+                        if config_pvd.get('auto_finalizar_pausa', True):
+                            if self._finalizar_pausas_completadas_grupo(grupo_id, cola_grupo, config_pvd):
+                                modificado = True
+                    
+                        # 4. Verificar notificaciones pendientes
+                        if config_pvd.get('notificacion_automatica', True):
+                            if self._enviar_notificaciones_pendientes_grupo(grupo_id, cola_grupo, config_pvd):
+                                modificado = True
+                    
+                        if modificado:
+                            limpieza_realizada = True
+                    
+                        # Despertar de nuevo justo en el próximo plazo del grupo
+                        self.planificador.programar(
+                            grupo_id, self._segundos_hasta_plazo_grupo(grupo_id, cola_grupo, config_pvd)
+                        )
+                except Exception as e:
+                    print(f"Error procesando grupo PVD {grupo_id}: {e}")
+                    self.metricas.registrar_error(f"grupo {grupo_id}", e)
+                    self.planificador.programar(grupo_id, SEGUNDOS_REINTENTO_GRUPO)
             
             # 5. Actualizar grupos
             self._actualizar_grupos()
@@ -84,41 +137,47 @@ class TemporizadorPVDMejorado:
             
         except Exception as e:
             print(f"Error en verificación automática: {e}")
+            self.metricas.registrar_error('verificacion', e)
+            # Los plazos de estos grupos ya salieron del planificador
+            for grupo_id in (grupos or ()):
+                self.planificador.programar(grupo_id, SEGUNDOS_REINTENTO_GRUPO)
+        finally:
+            self.metricas.registrar_vuelta((time.perf_counter() - inicio) * 1000)
     
     def _limpiar_pausas_bloqueadas_grupo(self, grupo_id, cola_grupo):
         """Limpia pausas que están bloqueadas en estado ESPERANDO en un grupo específico"""
         ahora = obtener_hora_madrid()
+        ahora_epoch = ahora.timestamp()
         modificado = False
         
+        # Orden de espera calculado una vez; se actualiza al cancelar
+        en_espera_grupo = ListaEspera(cola_grupo)
+        
         for pausa in cola_grupo:
             if pausa['estado'] == 'ESPERANDO':
                 # Verificar si lleva mucho tiempo esperando confirmación
-                tiempo_solicitud = datetime.fromisoformat(pausa['timestamp_solicitud'])
-                tiempo_espera = (ahora - tiempo_solicitud).total_seconds() / 60  # minutos
+                tiempo_espera = (ahora_epoch - en_espera_grupo.epoch_solicitud(pausa['id'])) / 60  # minutos
                 
                 # Si lleva más de 10 minutos esperando y no ha sido notificado
-                if tiempo_espera > 10 and not pausa.get('notificado', False):
+                if tiempo_espera > MINUTOS_ESPERA_BLOQUEADA and not pausa.get('notificado', False):
                     # Verificar si es el primero en su grupo
-                    en_espera_grupo = [p for p in cola_grupo if p['estado'] == 'ESPERANDO']
-                    en_espera_grupo = sorted(en_espera_grupo, 
-                                            key=lambda x: datetime.fromisoformat(x['timestamp_solicitud']))
-                    
-                    if en_espera_grupo and en_espera_grupo[0]['id'] == pausa['id']:
+                    if en_espera_grupo.es_primero(pausa['id']):
                         # Está bloqueado como primero en cola
                         pausa['estado'] = 'CANCELADO'
                         pausa['motivo_cancelacion'] = 'bloqueado_sin_notificar'
-                        pausa['timestamp_cancelacion'] = ahora.isoformat()
+                        marcar(pausa, 'timestamp_cancelacion', ahora)
+                        en_espera_grupo.quitar(pausa['id'])
                         modificado = True
                 
                 # Si ha sido notificado pero lleva más de 7 minutos esperando confirmación
                 elif pausa.get('notificado', False) and 'timestamp_notificacion' in pausa:
-                    tiempo_notificacion = datetime.fromisoformat(pausa['timestamp_notificacion'])
-                    tiempo_desde_notificacion = (ahora - tiempo_notificacion).total_seconds() / 60
+                    tiempo_desde_notificacion = (ahora_epoch - epoch(pausa, 'timestamp_notificacion')) / 60
                     
-                    if tiempo_desde_notificacion > 7:  # 7 minutos desde notificación
+                    if tiempo_desde_notificacion > MINUTOS_CONFIRMACION:  # 7 minutos desde notificación
                         pausa['estado'] = 'CANCELADO'
                         pausa['motivo_cancelacion'] = 'confirmacion_expirada'
-                        pausa['timestamp_cancelacion'] = ahora.isoformat()
+                        marcar(pausa, 'timestamp_cancelacion', ahora)
+                        en_espera_grupo.quitar(pausa['id'])
                         modificado = True
                         
                         # Cancelar temporizador si existe
@@ -126,6 +185,48 @@ class TemporizadorPVDMejorado:
         
         return modificado
     
+    def _segundos_hasta_plazo_grupo(self, grupo_id, cola_grupo, config_pvd):
+        """Segundos hasta el próximo plazo de la cola de un grupo (None si no tiene)"""
+        ahora = obtener_hora_madrid().timestamp()
+        plazos = []
+        
+        try:
+            if config_pvd.get('auto_finalizar_pausa', True):
+                config_sistema = cargar_config_sistema()
+                grupos_config = config_sistema.get('grupos_pvd', {})
+                config_grupo = grupos_config.get(grupo_id, {
+                    'duracion_corta': 5,
+                    'duracion_larga': 10
+                })
+                
+                for pausa in cola_grupo:
+                    if pausa['estado'] == 'EN_CURSO' and pausa.get('timestamp_inicio'):
+                        duracion_minutos = (config_grupo['duracion_corta']
+                                          if pausa.get('duracion_elegida', 'corta') == 'corta'
+                                          else config_grupo['duracion_larga'])
+                        plazos.append(epoch(pausa, 'timestamp_inicio') + duracion_minutos * 60)
+            
+            en_espera_grupo = ListaEspera(cola_grupo)
+            
+            for pausa in en_espera_grupo:
+                if pausa.get('notificado', False) and 'timestamp_notificacion' in pausa:
+                    plazos.append(epoch(pausa, 'timestamp_notificacion') + MINUTOS_CONFIRMACION * 60)
+            
+            # Solo el primero en cola puede quedar bloqueado sin notificar
+            primero = en_espera_grupo.primero()
+            if primero and not primero.get('notificado', False):
+                plazos.append(en_espera_grupo.epoch_solicitud(primero['id']) + MINUTOS_ESPERA_BLOQUEADA * 60)
+        except Exception as e:
+            print(f"Error calculando plazos del grupo {grupo_id}: {e}")
+            # Ante datos raros, volver a mirar en un minuto como antes
+            return 60
+        
+        if not plazos:
+            return None
+        
+        # Medio segundo de margen: las caducidades son "más de N minutos"
+        return min(plazo - ahora for plazo in plazos) + 0.5
+    
     def _finalizar_pausas_completadas_grupo(self, grupo_id, cola_grupo, config_pvd):
         """Finaliza pausas que han completado su tiempo automáticamente en un grupo"""
         modificado = False
@@ -147,13 +248,13 @@ class TemporizadorPVDMejorado:
                                   if duracion_elegida == 'corta' 
                                   else config_grupo['duracion_larga'])
                 
-                tiempo_inicio = datetime.fromisoformat(pausa['timestamp_inicio'])
-                tiempo_transcurrido = (obtener_hora_madrid() - tiempo_inicio).total_seconds() / 60
+                ahora = obtener_hora_madrid()
+                tiempo_transcurrido = (ahora.timestamp() - epoch(pausa, 'timestamp_inicio')) / 60
                 
                 if tiempo_transcurrido >= duracion_minutos:
                     # Finalizar pausa automáticamente
                     pausa['estado'] = 'COMPLETADO'
-                    pausa['timestamp_fin'] = obtener_hora_madrid().isoformat()
+                    marcar(pausa, 'timestamp_fin', ahora)
                     pausa['finalizado_auto'] = True
                     modificado = True
                     
@@ -165,32 +266,27 @@ class TemporizadorPVDMejorado:
     def _iniciar_siguiente_automatico_grupo(self, grupo_id):
         """Marca como disponible al siguiente en la cola del grupo específico"""
         try:
-            cola_grupo = cargar_cola_pvd_grupo(grupo_id)
-            
-            # Obtener configuración del grupo
-            config_sistema = cargar_config_sistema()
-            grupos_config = config_sistema.get('grupos_pvd', {})
-            config_grupo = grupos_config.get(grupo_id, {'maximo_simultaneo': 2})
-            max_grupo = config_grupo.get('maximo_simultaneo', 2)
-            
-            # Contar pausas activas en este grupo
-            en_pausa_grupo = len([p for p in cola_grupo if p['estado'] == 'EN_CURSO'])
-            
-            if en_pausa_grupo < max_grupo:
-                # Buscar siguiente en cola del mismo grupo
-                en_espera_grupo = [p for p in cola_grupo if p['estado'] == 'ESPERANDO']
-                en_espera_grupo = sorted(en_espera_grupo, 
-                                        key=lambda x: datetime.fromisoformat(x['timestamp_solicitud']))
+            # Si se llama desde el temporizador, es la misma cola viva (lock reentrante)
+            with modificar_cola_pvd_grupo(grupo_id) as cola_grupo:
+                # Obtener configuración del grupo
+                config_sistema = cargar_config_sistema()
+                grupos_config = config_sistema.get('grupos_pvd', {})
+                config_grupo = grupos_config.get(grupo_id, {'maximo_simultaneo': 2})
+                max_grupo = config_grupo.get('maximo_simultaneo', 2)
+                
+                # Contar pausas activas en este grupo
+                en_pausa_grupo = len([p for p in cola_grupo if p['estado'] == 'EN_CURSO'])
                 
-                if en_espera_grupo:
-                    siguiente = en_espera_grupo[0]
-                    # Marcar como listo para ser notificado
-                    siguiente['notificado'] = False
-                    siguiente['listo_para_confirmar'] = True
-                    siguiente['timestamp_disponible'] = obtener_hora_madrid().isoformat()
+                if en_pausa_grupo < max_grupo:
+                    # Buscar siguiente en cola del mismo grupo
+                    siguiente = ListaEspera(cola_grupo).primero()
                     
-                    guardar_cola_pvd_grupo(grupo_id, cola_grupo)
-                    return True
+                    if siguiente:
+                        # Marcar como listo para ser notificado
+                        siguiente['notificado'] = False
+                        siguiente['listo_para_confirmar'] = True
+                        marcar(siguiente, 'timestamp_disponible', obtener_hora_madrid())
+                        return True
             
             return False
             
@@ -211,20 +307,18 @@ class TemporizadorPVDMejorado:
         # Contar pausas activas en este grupo
         en_pausa_grupo = len([p for p in cola_grupo if p['estado'] == 'EN_CURSO'])
         
+        en_espera_grupo = ListaEspera(cola_grupo)
+        
         for pausa in cola_grupo:
             if pausa['estado'] == 'ESPERANDO' and not pausa.get('notificado', False):
                 # Verificar si es el primero en la cola de su grupo
-                en_espera_grupo = [p for p in cola_grupo if p['estado'] == 'ESPERANDO']
-                en_espera_grupo = sorted(en_espera_grupo, 
-                                        key=lambda x: datetime.fromisoformat(x['timestamp_solicitud']))
-                
-                if en_espera_grupo and en_espera_grupo[0]['id'] == pausa['id']:
+                if en_espera_grupo.es_primero(pausa['id']):
                     # Verificar si hay espacio en pausas para este grupo
                     if en_pausa_grupo < max_grupo:
                         # Programar notificación
                         self.programar_notificacion_usuario(pausa['usuario_id'])
                         pausa['notificado'] = True
-                        pausa['timestamp_notificacion'] = obtener_hora_madrid().isoformat()
+                        marcar(pausa, 'timestamp_notificacion', obtener_hora_madrid())
                         pausa['notificar_sidebar'] = True
                         modificado = True
         
@@ -238,7 +332,7 @@ class TemporizadorPVDMejorado:
             grupos_config = config_sistema.get('grupos_pvd', {})
             
             grupos = {}
-            hoy = obtener_hora_madrid().date()
+            hoy = limites_dia(obtener_hora_madrid())
             
             # Inicializar grupos desde configuración
             for grupo_id in grupos_config.keys():
@@ -273,13 +367,8 @@ class TemporizadorPVDMejorado:
                         grupos[grupo_id]['en_espera'] += 1
                     elif pausa['estado'] == 'COMPLETADO':
                         # Verificar si fue hoy
-                        if 'timestamp_fin' in pausa:
-                            try:
-                                fecha_fin = datetime.fromisoformat(pausa['timestamp_fin']).date()
-                                if fecha_fin == hoy:
-                                    grupos[grupo_id]['completados_hoy'] += 1
-                            except:
-                                pass
+                        if es_del_dia(pausa, 'timestamp_fin', hoy):
+                            grupos[grupo_id]['completados_hoy'] += 1
             
             self.grupos_activos = grupos
             
@@ -333,14 +422,15 @@ class TemporizadorPVDMejorado:
             'duracion': duracion_minutos
         }
     
-    def solicitar_pausa(self, duracion_tipo, grupo=None):
-        """Solicita una pausa PVD para el usuario actual"""
+    def solicitar_pausa(self, duracion_tipo, grupo=None, usuario_id=None):
+        """Solicita una pausa PVD para el usuario actual (o para usuario_id)"""
         try:
-            if not st.session_state.get('authenticated', False):
-                return False
-            
-            # Obtener usuario actual
-            usuario_id = st.session_state.username
+            if usuario_id is None:
+                if not st.session_state.get('authenticated', False):
+                    return False
+                
+                # Obtener usuario actual
+                usuario_id = st.session_state.username
             
             # Obtener grupo del usuario si no se especifica
             if grupo is None:
@@ -351,11 +441,10 @@ class TemporizadorPVDMejorado:
             cola_grupo = cargar_cola_pvd_grupo(grupo)
             
             # Verificar límite diario (máximo 5 pausas)
-            hoy = obtener_hora_madrid().date()
+            hoy = limites_dia(obtener_hora_madrid())
             pausas_hoy = len([p for p in cola_grupo 
                             if p['usuario_id'] == usuario_id and 
-                            'timestamp_solicitud' in p and
-                            datetime.fromisoformat(p['timestamp_solicitud']).date() == hoy and
+                            es_del_dia(p, 'timestamp_solicitud', hoy) and
                             p['estado'] != 'CANCELADO'])
             
             if pausas_hoy >= 5:
@@ -373,16 +462,15 @@ class TemporizadorPVDMejorado:
                 'usuario_nombre': usuario_nombre,
                 'duracion_elegida': duracion_tipo,
                 'estado': 'ESPERANDO',
-                'timestamp_solicitud': obtener_hora_madrid().isoformat(),
                 'timestamp_inicio': None,
                 'timestamp_fin': None,
                 'grupo': grupo,
                 'notificado': False,
                 'confirmado': False
             }
+            marcar(nueva_pausa, 'timestamp_solicitud', obtener_hora_madrid())
             
-            cola_grupo.append(nueva_pausa)
-            guardar_cola_pvd_grupo(grupo, cola_grupo)
+            agregar_pausa_pvd(grupo, nueva_pausa)
             
             # Calcular tiempo estimado
             tiempo_estimado = self.calcular_tiempo_estimado_grupo(grupo, usuario_id)
@@ -397,57 +485,9 @@ class TemporizadorPVDMejorado:
             return False
     
     def calcular_tiempo_estimado_grupo(self, grupo_id, usuario_id):
-        """Calcula tiempo estimado considerando grupos"""
+        """Calcula tiempo estimado considerando grupos (None si no está en espera)"""
         try:
-            cola_grupo = cargar_cola_pvd_grupo(grupo_id)
-            
-            if not cola_grupo:
-                return 0
-            
-            # Obtener configuración del grupo
-            config_sistema = cargar_config_sistema()
-            grupos_config = config_sistema.get('grupos_pvd', {})
-            config_grupo = grupos_config.get(grupo_id, {
-                'maximo_simultaneo': 2,
-                'duracion_corta': 5,
-                'duracion_larga': 10
-            })
-            max_grupo = config_grupo.get('maximo_simultaneo', 2)
-            
-            # Contar pausas activas en el grupo
-            en_pausa_grupo = len([p for p in cola_grupo if p['estado'] == 'EN_CURSO'])
-            
-            # Contar espera en el grupo
-            en_espera_grupo = [p for p in cola_grupo if p['estado'] == 'ESPERANDO']
-            en_espera_grupo = sorted(en_espera_grupo, 
-                                    key=lambda x: datetime.fromisoformat(x['timestamp_solicitud']))
-            
-            # Encontrar posición del usuario
-            posicion = None
-            for i, pausa in enumerate(en_espera_grupo):
-                if pausa['usuario_id'] == usuario_id:
-                    posicion = i + 1
-                    break
-            
-            if posicion is None:
-                return None
-            
-            # Usar duración corta como base para estimación
-            tiempo_base = config_grupo.get('duracion_corta', 5)
-            
-            if en_pausa_grupo < max_grupo:
-                # Hay espacio disponible
-                if posicion == 1:
-                    return 0  # Próximo en entrar
-                else:
-                    # Esperar que terminen las pausas actuales
-                    return (posicion - 1) * tiempo_base
-            else:
-                # Grupo lleno - calcular tiempo basado en pausas restantes
-                pausas_antes = max(0, posicion - 1)
-                tiempo_estimado = pausas_antes * tiempo_base
-                return max(0, tiempo_estimado)
-                
+            return minutos_espera_usuario(grupo_id, usuario_id)
         except Exception as e:
             print(f"Error calculando tiempo estimado para grupo {grupo_id}: {e}")
             return 5  # Valor por defecto seguro
@@ -455,6 +495,12 @@ class TemporizadorPVDMejorado:
 # Instancia global del temporizador mejorado
 temporizador_pvd_mejorado = TemporizadorPVDMejorado()
 
+# Hilo de fondo: uno por proceso, gestionado por el supervisor.
+# PVD_TEMPORIZADOR=0 lo deja parado (herramientas como benchmark_pvd)
+supervisor_pvd = obtener_supervisor()
+if os.environ.get('PVD_TEMPORIZADOR', '1') != '0':
+    supervisor_pvd.iniciar(temporizador_pvd_mejorado, INTERVALO_REVISION_COMPLETA)
+
 # ==============================================
 # FUNCIONES DE COMPATIBILIDAD
 # ==============================================
@@ -479,15 +525,12 @@ def verificar_confirmacion_pvd(usuario_id, cola_pvd, config_pvd):
         
         # Cargar cola del grupo
         cola_grupo = cargar_cola_pvd_grupo(grupo)
+        en_espera_grupo = ListaEspera(cola_grupo)
         
         for pausa in cola_grupo:
             if pausa['usuario_id'] == usuario_id and pausa['estado'] == 'ESPERANDO':
                 # Verificar si es el primero en su grupo
-                en_espera_grupo = [p for p in cola_grupo if p['estado'] == 'ESPERANDO']
-                en_espera_grupo = sorted(en_espera_grupo, 
-                                        key=lambda x: datetime.fromisoformat(x['timestamp_solicitud']))
-                
-                if en_espera_grupo and en_espera_grupo[0]['id'] == pausa['id']:
+                if en_espera_grupo.es_primero(pausa['id']):
                     # Verificar si hay espacio en el grupo
                     config_sistema = cargar_config_sistema()
                     grupos_config = config_sistema.get('grupos_pvd', {})
@@ -508,13 +551,12 @@ def verificar_confirmacion_pvd(usuario_id, cola_pvd, config_pvd):
 def verificar_pausas_completadas(cola_pvd, config_pvd):
     """Función de compatibilidad para verificar pausas completadas"""
     # Esta función ahora maneja todas las colas
-    todas_colas = obtener_todas_colas_pvd()
     modificado = False
     
-    for grupo_id, cola_grupo in todas_colas.items():
-        if temporizador_pvd_mejorado._finalizar_pausas_completadas_grupo(grupo_id, cola_grupo, config_pvd):
-            guardar_cola_pvd_grupo(grupo_id, cola_grupo)
-            modificado = True
+    for grupo_id in estado_pvd.grupos():
+        with modificar_cola_pvd_grupo(grupo_id) as cola_grupo:
+            if temporizador_pvd_mejorado._finalizar_pausas_completadas_grupo(grupo_id, cola_grupo, config_pvd):
+                modificado = True
     
     return modificado
 
@@ -0,0 +1,108 @@
+from datetime import datetime, time, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+# ==============================================
+# MARCAS DE TIEMPO DE LAS PAUSAS PVD (ESQUEMA v2)
+# ==============================================
+#
+# Cada timestamp_* de una pausa (ISO con zona de Madrid, para mostrar y
+# para el histórico) va acompañado desde el esquema v2 de su
+# timestamp_*_epoch: segundos epoch enteros, calculados una sola vez al
+# escribir la marca. Comparaciones, ordenaciones y "¿es de hoy?" se hacen
+# sobre el epoch, sin volver a parsear el texto y sin mezclar fechas
+# naive con fechas con zona.
+#
+# Las pausas anteriores a v2 se completan al cargar cada cola
+# (migraciones.migrar_cola_pvd). epoch() sigue aceptando una pausa sin el
+# campo, parseando el ISO, por si llega alguna de fuera.
+
+CAMPOS_TIEMPO = (
+    'timestamp_solicitud', 'timestamp_inicio', 'timestamp_fin',
+    'timestamp_notificacion', 'timestamp_disponible', 'timestamp_cancelacion'
+)
+
+SUFIJO = '_epoch'
+
+
+def epoch_iso(texto: str) -> float:
+    """'2024-03-15T10:00:00+01:00' → segundos epoch"""
+    return datetime.fromisoformat(texto).timestamp()
+
+
+def sello(campo: str, momento: datetime) -> Dict:
+    """{campo: ISO, campo_epoch: entero} para guardar una marca de tiempo"""
+    return {campo: momento.isoformat(), campo + SUFIJO: int(momento.timestamp())}
+
+
+def marcar(pausa: Dict, campo: str, momento: datetime) -> None:
+    """Escribe en la pausa una marca de tiempo con su epoch"""
+    pausa.update(sello(campo, momento))
+
+
+def epoch(pausa: Dict, campo: str) -> Optional[float]:
+    """Epoch de una marca de la pausa (None si no la tiene)"""
+    valor = pausa.get(campo + SUFIJO)
+    if valor is not None:
+        return valor
+    texto = pausa.get(campo)
+    if not texto:
+        return None
+    try:
+        return epoch_iso(texto)
+    except (TypeError, ValueError):
+        return None
+
+
+def sellar(pausa: Dict, campos: Optional[Iterable[str]] = None, forzar: bool = False) -> bool:
+    """
+    Calcula los epoch que falten (o todos los de 'campos' si forzar) a
+    partir de los ISO de la pausa. Solo para las marcas presentes; una
+    marca vacía (None) deja el epoch también a None.
+
+    Returns:
+        bool: Si la pausa cambió
+    """
+    cambiada = False
+    for campo in CAMPOS_TIEMPO if campos is None else campos:
+        if campo not in CAMPOS_TIEMPO:
+            continue
+        clave = campo + SUFIJO
+        if campo not in pausa and clave not in pausa:
+            continue
+        if clave in pausa and not forzar:
+            continue
+
+        texto = pausa.get(campo)
+        valor = None
+        if texto:
+            try:
+                valor = int(epoch_iso(texto))
+            except (TypeError, ValueError):
+                valor = None
+        if clave not in pausa or pausa[clave] != valor:
+            pausa[clave] = valor
+            cambiada = True
+    return cambiada
+
+
+def limites_dia(momento: datetime) -> Tuple[float, float]:
+    """(inicio, fin) en epoch del día de 'momento', en su zona horaria"""
+    zona = momento.tzinfo
+    dia = momento.date()
+
+    def medianoche(fecha):
+        ingenua = datetime.combine(fecha, time())
+        if zona is None:
+            return ingenua
+        if hasattr(zona, 'localize'):
+            # pytz: la medianoche puede tener otro desfase (cambio de hora)
+            return zona.localize(ingenua)
+        return ingenua.replace(tzinfo=zona)
+
+    return medianoche(dia).timestamp(), medianoche(dia + timedelta(days=1)).timestamp()
+
+
+def es_del_dia(pausa: Dict, campo: str, limites: Tuple[float, float]) -> bool:
+    """Si la marca 'campo' de la pausa cae dentro de limites_dia(...)"""
+    valor = epoch(pausa, campo)
+    return valor is not None and limites[0] <= valor < limites[1]
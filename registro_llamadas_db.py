@@ -0,0 +1,229 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from typing import Dict, List, Optional
+
+# ==============================================
+# BACKEND SQLITE PARA EL REGISTRO DE LLAMADAS
+# ==============================================
+#
+# Alternativa opcional a data/registro_llamadas.json. Cada fila es un
+# (fecha, agente) con sus contadores; el resto de campos del registro
+# (fecha, timestamp, ...) se conserva en la columna 'datos' como JSON.
+# El backend se activa en cuanto existe DB_PATH (ver
+# database.migrar_registro_llamadas_a_sqlite).
+
+DB_PATH = 'data/registro_llamadas.db'
+
+CAMPOS_CONTADORES = ('llamadas_totales', 'llamadas_15min', 'ventas')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS registro_llamadas (
+    fecha TEXT NOT NULL,
+    agent_id TEXT NOT NULL,
+    llamadas_totales INTEGER NOT NULL DEFAULT 0,
+    llamadas_15min INTEGER NOT NULL DEFAULT 0,
+    ventas INTEGER NOT NULL DEFAULT 0,
+    datos TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (fecha, agent_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_registro_agente_fecha
+    ON registro_llamadas (agent_id, fecha);
+"""
+
+_local = threading.local()
+
+
+def backend_activo(db_path: str = DB_PATH) -> bool:
+    """Indica si el registro de llamadas vive en SQLite"""
+    return os.path.exists(db_path)
+
+
+def obtener_conexion(db_path: str = DB_PATH) -> sqlite3.Connection:
+    """Devuelve la conexión del hilo actual (una por hilo y base de datos)"""
+    conexiones = getattr(_local, 'conexiones', None)
+    if conexiones is None:
+        conexiones = _local.conexiones = {}
+
+    conn = conexiones.get(db_path)
+    if conn is None:
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        conexiones[db_path] = conn
+    return conn
+
+
+def firma_archivos(db_path: str = DB_PATH) -> tuple:
+    """
+    Firma (mtime_ns, tamaño) de la base de datos y su WAL.
+
+    Cualquier escritura modifica uno de los dos, así que sirve para validar
+    cachés de lectura igual que con los archivos JSON.
+    """
+    firma = []
+    for ruta in (db_path, f"{db_path}-wal"):
+        try:
+            stat = os.stat(ruta)
+            firma.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            firma.append(None)
+    return tuple(firma)
+
+
+def _fila_a_registro(fila: sqlite3.Row) -> Dict:
+    """Reconstruye el dict del agente tal como estaba en el JSON"""
+    datos = json.loads(fila['datos']) if fila['datos'] else {}
+    for campo in CAMPOS_CONTADORES:
+        datos[campo] = fila[campo]
+    return datos
+
+
+def _registro_a_fila(fecha: str, agent_id: str, datos: Dict) -> tuple:
+    """Separa los contadores indexables del resto de campos"""
+    extra = {k: v for k, v in datos.items() if k not in CAMPOS_CONTADORES}
+    return (
+        fecha,
+        str(agent_id),
+        datos.get('llamadas_totales', 0),
+        datos.get('llamadas_15min', 0),
+        datos.get('ventas', 0),
+        json.dumps(extra, ensure_ascii=False),
+    )
+
+
+def cargar_registro(db_path: str = DB_PATH) -> Dict:
+    """Carga el registro completo con la estructura {fecha: {agent_id: datos}}"""
+    conn = obtener_conexion(db_path)
+    registro = {}
+    for fila in conn.execute(
+        "SELECT * FROM registro_llamadas ORDER BY fecha, agent_id"
+    ):
+        registro.setdefault(fila['fecha'], {})[fila['agent_id']] = _fila_a_registro(fila)
+    return registro
+
+
+def guardar_registro(registro: Dict, db_path: str = DB_PATH) -> None:
+    """Sustituye el contenido completo del registro en una sola transacción"""
+    filas = [
+        _registro_a_fila(fecha, agent_id, datos)
+        for fecha, datos_dia in registro.items()
+        for agent_id, datos in datos_dia.items()
+    ]
+    conn = obtener_conexion(db_path)
+    with conn:
+        conn.execute("DELETE FROM registro_llamadas")
+        conn.executemany(
+            "INSERT INTO registro_llamadas "
+            "(fecha, agent_id, llamadas_totales, llamadas_15min, ventas, datos) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            filas,
+        )
+
+
+def obtener_filas(fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
+                  agent_id: Optional[str] = None, db_path: str = DB_PATH) -> List[Dict]:
+    """
+    Filas del registro en un rango de fechas (ambos extremos incluidos),
+    opcionalmente de un solo agente. Las fechas van en formato 'YYYY-MM-DD'.
+    """
+    condiciones = []
+    parametros = []
+    if fecha_inicio is not None:
+        condiciones.append("fecha >= ?")
+        parametros.append(fecha_inicio)
+    if fecha_fin is not None:
+        condiciones.append("fecha <= ?")
+        parametros.append(fecha_fin)
+    if agent_id is not None:
+        condiciones.append("agent_id = ?")
+        parametros.append(str(agent_id))
+
+    sql = "SELECT * FROM registro_llamadas"
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    sql += " ORDER BY fecha, agent_id"
+
+    filas = []
+    for fila in obtener_conexion(db_path).execute(sql, parametros):
+        datos = _fila_a_registro(fila)
+        datos['fecha'] = fila['fecha']
+        datos['agent_id'] = fila['agent_id']
+        filas.append(datos)
+    return filas
+
+
+def totales_por_agente(fecha_inicio: str, fecha_fin: str, db_path: str = DB_PATH) -> Dict:
+    """Suma de contadores y días con registro por agente en el rango"""
+    sql = (
+        "SELECT agent_id, SUM(llamadas_totales) AS llamadas_totales, "
+        "SUM(llamadas_15min) AS llamadas_15min, SUM(ventas) AS ventas, "
+        "COUNT(*) AS dias "
+        "FROM registro_llamadas WHERE fecha BETWEEN ? AND ? GROUP BY agent_id"
+    )
+    return {
+        fila['agent_id']: {
+            'llamadas_totales': fila['llamadas_totales'],
+            'llamadas_15min': fila['llamadas_15min'],
+            'ventas': fila['ventas'],
+            'dias': fila['dias'],
+        }
+        for fila in obtener_conexion(db_path).execute(sql, (fecha_inicio, fecha_fin))
+    }
+
+
+def exportar_backup(destino: str, db_path: str = DB_PATH) -> None:
+    """Copia consistente de la base de datos (incluye lo pendiente en el WAL)"""
+    os.makedirs(os.path.dirname(destino) or '.', exist_ok=True)
+    origen = obtener_conexion(db_path)
+    copia = sqlite3.connect(destino)
+    try:
+        origen.backup(copia)
+    finally:
+        copia.close()
+
+
+def instantanea(db_path: str = DB_PATH) -> bytes:
+    """Contenido de una copia consistente de la base (para backup_store)"""
+    fd, tmp_path = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(db_path) or '.')
+    os.close(fd)
+    try:
+        exportar_backup(tmp_path, db_path)
+        with open(tmp_path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(tmp_path)
+
+
+def cerrar_conexion(db_path: str = DB_PATH) -> None:
+    """Cierra la conexión del hilo actual (vuelca el WAL al cerrar la última)"""
+    conexiones = getattr(_local, 'conexiones', None) or {}
+    conn = conexiones.pop(db_path, None)
+    if conn is not None:
+        conn.close()
+
+
+def upsert_dia(fecha: str, contadores_agentes: Dict, timestamp: str,
+               db_path: str = DB_PATH) -> None:
+    """Suma incrementos de un día; crea la fila del agente si no existe"""
+    filas = [
+        _registro_a_fila(fecha, agent_id, {**contadores, 'fecha': fecha, 'timestamp': timestamp})
+        for agent_id, contadores in contadores_agentes.items()
+    ]
+    conn = obtener_conexion(db_path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO registro_llamadas "
+            "(fecha, agent_id, llamadas_totales, llamadas_15min, ventas, datos) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (fecha, agent_id) DO UPDATE SET "
+            "llamadas_totales = llamadas_totales + excluded.llamadas_totales, "
+            "llamadas_15min = llamadas_15min + excluded.llamadas_15min, "
+            "ventas = ventas + excluded.ventas",
+            filas,
+        )
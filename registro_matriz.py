@@ -0,0 +1,88 @@
+import numpy as np
+from typing import Dict, Iterable
+
+# ==============================================
+# VISTA COLUMNAR DEL REGISTRO DE LLAMADAS
+# ==============================================
+#
+# El registro {fecha: {agent_id: {contadores}}} convertido en matrices NumPy
+# [días × agentes], una por contador, más la máscara 'presente' (el agente
+# tiene entrada ese día). Las fechas van ordenadas, así que un periodo es un
+# slice de filas y los totales, tendencias y filtros de días válidos son
+# operaciones sobre arrays en lugar de bucles sobre dicts.
+#
+# La instancia se comparte entre sesiones (ver database.obtener_matriz_registro)
+# y sus arrays son de solo lectura.
+
+CAMPOS = ('llamadas_totales', 'llamadas_15min', 'ventas')
+
+
+class MatrizRegistro:
+    """Registro de llamadas en formato columnar"""
+
+    def __init__(self, registro: Dict):
+        fechas = []
+        for fecha_str in registro:
+            try:
+                fechas.append((np.datetime64(fecha_str, 'D'), fecha_str))
+            except ValueError:
+                # Clave que no es una fecha 'YYYY-MM-DD'
+                continue
+        fechas.sort()
+
+        self.fechas = [fecha_str for _, fecha_str in fechas]
+        self.dias = np.array([dia for dia, _ in fechas], dtype='datetime64[D]')
+        self.indice_fecha = {fecha_str: i for i, fecha_str in enumerate(self.fechas)}
+
+        agentes = set()
+        for fecha_str in self.fechas:
+            agentes.update(registro[fecha_str].keys())
+        self.agentes = sorted(agentes)
+        self.indice_agente = {agent_id: j for j, agent_id in enumerate(self.agentes)}
+
+        forma = (len(self.fechas), len(self.agentes))
+        filas, columnas = [], []
+        valores = {campo: [] for campo in CAMPOS}
+        for i, fecha_str in enumerate(self.fechas):
+            for agent_id, datos_agente in registro[fecha_str].items():
+                filas.append(i)
+                columnas.append(self.indice_agente[agent_id])
+                for campo in CAMPOS:
+                    valores[campo].append(datos_agente.get(campo, 0))
+
+        self.presente = np.zeros(forma, dtype=bool)
+        self.presente[filas, columnas] = True
+        self.presente.setflags(write=False)
+
+        for campo in CAMPOS:
+            # np.asarray decide int64 o float64 según los datos
+            datos = np.asarray(valores[campo]) if valores[campo] else np.zeros(0, dtype=np.int64)
+            matriz = np.zeros(forma, dtype=datos.dtype)
+            matriz[filas, columnas] = datos
+            matriz.setflags(write=False)
+            setattr(self, campo, matriz)
+
+    def rango(self, fecha_inicio, fecha_fin) -> slice:
+        """Filas de las fechas entre fecha_inicio y fecha_fin (ambas incluidas)"""
+        inicio = np.searchsorted(self.dias, np.datetime64(fecha_inicio, 'D'), side='left')
+        fin = np.searchsorted(self.dias, np.datetime64(fecha_fin, 'D'), side='right')
+        return slice(int(inicio), int(fin))
+
+    def columnas(self, agent_ids: Iterable) -> np.ndarray:
+        """Columnas de los agentes indicados que tienen algún registro"""
+        return np.array(
+            [self.indice_agente[a] for a in agent_ids if a in self.indice_agente],
+            dtype=np.intp
+        )
+
+    def dias_validos(self, fecha_inicio, fecha_fin, minimo_llamadas_dia) -> np.ndarray:
+        """Máscara [días del rango × agentes] de días con ≥ minimo llamadas totales"""
+        filas = self.rango(fecha_inicio, fecha_fin)
+        return self.presente[filas] & (self.llamadas_totales[filas] >= minimo_llamadas_dia)
+
+    def total_agente(self, campo: str, agent_id, fecha_inicio, fecha_fin):
+        """Suma de un contador de un agente en el rango (0 si no tiene registros)"""
+        j = self.indice_agente.get(agent_id)
+        if j is None:
+            return 0
+        return getattr(self, campo)[self.rango(fecha_inicio, fecha_fin), j].sum().item()
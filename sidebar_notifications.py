@@ -5,13 +5,17 @@ from utils import obtener_hora_madrid, formatear_hora_madrid
 from database import (
     cargar_configuracion_usuarios, 
     cargar_cola_pvd_grupo, 
-    guardar_cola_pvd_grupo,
+    actualizar_pausa_pvd,
     cargar_config_pvd, 
     obtener_todas_colas_pvd,
     consolidar_colas_pvd,
     cargar_config_sistema
 )
 from pvd_system import temporizador_pvd_mejorado
+from pvd_lista_espera import ListaEspera
+from pvd_eta import minutos_espera_usuario
+from pvd_tiempos import sello, epoch
+from pvd_refresco import refrescar_al_cambiar
 
 # ==============================================
 # FUNCIONES DE CÁLCULO DE TIEMPOS
@@ -20,125 +24,9 @@ from pvd_system import temporizador_pvd_mejorado
 def calcular_tiempo_estimado_real(grupo_usuario, usuario_id):
     """Calcula tiempo estimado real considerando pausas activas y tiempos restantes (nuevo sistema)"""
     try:
-        # 1. Cargar datos necesarios
-        config_pvd = cargar_config_pvd()
-        todas_colas = obtener_todas_colas_pvd()
-        
-        if grupo_usuario not in todas_colas:
-            return 5  # Grupo no encontrado, valor por defecto
-        
-        cola_grupo = todas_colas[grupo_usuario]
-        
-        # 2. Obtener configuración del grupo
-        config_sistema = cargar_config_sistema()
-        grupos_config = config_sistema.get('grupos_pvd', {})
-        config_grupo = grupos_config.get(grupo_usuario, {
-            'maximo_simultaneo': 2,
-            'duracion_corta': 5,
-            'duracion_larga': 10
-        })
-        max_simultaneo = config_grupo.get('maximo_simultaneo', 2)
-        
-        # 3. Pausas activas en el grupo
-        pausas_activas = [p for p in cola_grupo if p['estado'] == 'EN_CURSO']
-        
-        # 4. Calcular EXACTAMENTE cuándo termina cada pausa activa
-        tiempos_fin_pausas = []
-        for pausa in pausas_activas:
-            duracion_elegida = pausa.get('duracion_elegida', 'corta')
-            
-            # Usar configuración del grupo
-            duracion_total = (config_grupo['duracion_corta'] 
-                            if duracion_elegida == 'corta' 
-                            else config_grupo['duracion_larga'])
-            
-            tiempo_inicio = datetime.fromisoformat(pausa['timestamp_inicio'])
-            tiempo_fin = tiempo_inicio + timedelta(minutes=duracion_total)
-            tiempo_restante = (tiempo_fin - obtener_hora_madrid()).total_seconds() / 60
-            
-            # Solo considerar pausas que aún no han terminado
-            if tiempo_restante > 0:
-                tiempos_fin_pausas.append({
-                    'pausa_id': pausa['id'],
-                    'usuario': pausa['usuario_nombre'],
-                    'tiempo_restante_minutos': tiempo_restante,
-                    'hora_fin': tiempo_fin
-                })
-        
-        # 5. Ordenar por tiempo restante (la que termina primero)
-        tiempos_fin_pausas.sort(key=lambda x: x['tiempo_restante_minutos'])
-        
-        # 6. Posición del usuario en espera
-        en_espera_grupo = [p for p in cola_grupo if p['estado'] == 'ESPERANDO']
-        en_espera_grupo = sorted(en_espera_grupo, 
-                                key=lambda x: datetime.fromisoformat(x['timestamp_solicitud']))
-        
-        posicion = 0
-        for i, pausa in enumerate(en_espera_grupo):
-            if pausa['usuario_id'] == usuario_id:
-                posicion = i + 1
-                break
-        
-        if posicion == 0:
-            return 0  # No está en espera
-        
-        # 7. Calcular espacios disponibles
-        espacios_disponibles = max(0, max_simultaneo - len(pausas_activas))
-        
-        # 8. Si hay espacio y es el primero, puede entrar inmediatamente
-        if espacios_disponibles > 0 and posicion == 1:
-            return 0
-        
-        # 9. Si no hay espacio (todos los huecos ocupados)
-        if espacios_disponibles <= 0:
-            # Necesita esperar a que termine una pausa
-            if tiempos_fin_pausas:
-                # Tomar la pausa que termine PRIMERO
-                tiempo_primera_pausa = tiempos_fin_pausas[0]['tiempo_restante_minutos']
-                
-                # Si es el primero en la cola, su tiempo es el de la primera pausa que termine
-                if posicion == 1:
-                    return max(1, int(tiempo_primera_pausa + 0.5))
-                
-                # Si no es el primero, necesita esperar más
-                else:
-                    # Cuántas personas delante también están esperando
-                    personas_delante = posicion - 1
-                    
-                    # Cuántas pausas necesita esperar
-                    pausas_necesarias = min(personas_delante, len(tiempos_fin_pausas))
-                    
-                    if pausas_necesarias > 0:
-                        # Tiempo hasta que terminen las pausas necesarias
-                        tiempo_estimado = tiempos_fin_pausas[pausas_necesarias - 1]['tiempo_restante_minutos']
-                        return max(1, int(tiempo_estimado + 0.5))
-            
-            # Si no hay información de pausas activas, usar duración promedio del grupo
-            duracion_promedio = (config_grupo['duracion_corta'] + config_grupo['duracion_larga']) / 2
-            tiempo_estimado = (posicion * duracion_promedio) / max_simultaneo
-            return max(1, int(tiempo_estimado + 0.5))
-        
-        # 10. Si hay espacio pero no es el primero
-        if espacios_disponibles > 0 and posicion > 1:
-            # Algunas personas delante entrarán inmediatamente
-            personas_que_entran_inmediatamente = min(posicion - 1, espacios_disponibles)
-            personas_que_esperan = max(0, (posicion - 1) - personas_que_entran_inmediatamente)
-            
-            if personas_que_esperan == 0:
-                # Todas las personas delante entran inmediatamente
-                return 0
-            else:
-                # Necesita esperar a que terminen pausas
-                if tiempos_fin_pausas and personas_que_esperan <= len(tiempos_fin_pausas):
-                    tiempo_estimado = tiempos_fin_pausas[personas_que_esperan - 1]['tiempo_restante_minutos']
-                    return max(1, int(tiempo_estimado + 0.5))
-                else:
-                    duracion_promedio = (config_grupo['duracion_corta'] + config_grupo['duracion_larga']) / 2
-                    tiempo_estimado = (personas_que_esperan * duracion_promedio) / max_simultaneo
-                    return max(1, int(tiempo_estimado + 0.5))
-        
-        # 11. Caso por defecto
-        return 5
+        # Cálculo compartido por grupo (ver pvd_eta)
+        tiempo_estimado = minutos_espera_usuario(grupo_usuario, usuario_id)
+        return 0 if tiempo_estimado is None else tiempo_estimado  # 0 = no está en espera
     
     except Exception as e:
         print(f"Error calculando tiempo estimado para grupo {grupo_usuario}: {e}")
@@ -175,7 +63,8 @@ def mostrar_info_detallada_pausas(grupo_usuario):
             
             tiempo_inicio = datetime.fromisoformat(pausa['timestamp_inicio'])
             tiempo_fin = tiempo_inicio + timedelta(minutes=duracion_total)
-            tiempo_restante = (tiempo_fin - obtener_hora_madrid()).total_seconds() / 60
+            tiempo_restante = (epoch(pausa, 'timestamp_inicio') + duracion_total * 60
+                               - obtener_hora_madrid().timestamp()) / 60
             
             hora_fin_str = tiempo_fin.strftime('%H:%M')
             
@@ -230,15 +119,8 @@ def mostrar_notificacion_sidebar(usuario_id, grupo_usuario):
             st.sidebar.markdown("---")
             
             # Calcular posición en el grupo
-            en_espera_grupo = [p for p in cola_grupo if p['estado'] == 'ESPERANDO']
-            en_espera_grupo = sorted(en_espera_grupo, 
-                                    key=lambda x: datetime.fromisoformat(x['timestamp_solicitud']))
-            
-            posicion = 0
-            for i, pausa in enumerate(en_espera_grupo):
-                if pausa['id'] == pausa_usuario['id']:
-                    posicion = i + 1
-                    break
+            en_espera_grupo = ListaEspera(cola_grupo)
+            posicion = en_espera_grupo.posicion(pausa_usuario['id']) or 0
             
             if posicion == 0:
                 return False  # No está en espera
@@ -293,9 +175,10 @@ def mostrar_notificacion_sidebar(usuario_id, grupo_usuario):
                     
                     # Mostrar alerta para confirmar
                     if not pausa_usuario.get('notificado', False):
-                        pausa_usuario['notificado'] = True
-                        pausa_usuario['timestamp_notificacion'] = obtener_hora_madrid().isoformat()
-                        guardar_cola_pvd_grupo(grupo_usuario, cola_grupo)
+                        actualizar_pausa_pvd(grupo_usuario, pausa_usuario['id'], {
+                            'notificado': True,
+                            **sello('timestamp_notificacion', obtener_hora_madrid())
+                        })
                     
                     # Contador de 7 minutos INDIVIDUAL
                     timer_key = f'confirmacion_inicio_{usuario_id}_{grupo_usuario}'
@@ -324,10 +207,11 @@ def mostrar_notificacion_sidebar(usuario_id, grupo_usuario):
                         if st.button("✅ **Confirmar**", 
                                    key=f"sidebar_confirmar_{usuario_id}_{grupo_usuario}", 
                                    use_container_width=True):
-                            pausa_usuario['estado'] = 'EN_CURSO'
-                            pausa_usuario['timestamp_inicio'] = obtener_hora_madrid().isoformat()
-                            pausa_usuario['confirmado'] = True
-                            guardar_cola_pvd_grupo(grupo_usuario, cola_grupo)
+                            actualizar_pausa_pvd(grupo_usuario, pausa_usuario['id'], {
+                                'estado': 'EN_CURSO',
+                                **sello('timestamp_inicio', obtener_hora_madrid()),
+                                'confirmado': True
+                            })
                             
                             # Limpiar temporizador individual
                             if timer_key in st.session_state:
@@ -343,9 +227,10 @@ def mostrar_notificacion_sidebar(usuario_id, grupo_usuario):
                         if st.button("❌ **Cancelar**", 
                                    key=f"sidebar_cancelar_{usuario_id}_{grupo_usuario}", 
                                    use_container_width=True):
-                            pausa_usuario['estado'] = 'CANCELADO'
-                            pausa_usuario['motivo_cancelacion'] = 'cancelado_por_usuario'
-                            guardar_cola_pvd_grupo(grupo_usuario, cola_grupo)
+                            actualizar_pausa_pvd(grupo_usuario, pausa_usuario['id'], {
+                                'estado': 'CANCELADO',
+                                'motivo_cancelacion': 'cancelado_por_usuario'
+                            })
                             
                             # Limpiar temporizador individual
                             if timer_key in st.session_state:
@@ -357,10 +242,11 @@ def mostrar_notificacion_sidebar(usuario_id, grupo_usuario):
                     # Verificar si se agotó el tiempo (7 MINUTOS INDIVIDUALES)
                     if tiempo_transcurrido > 420:
                         st.sidebar.error("⏰ **¡Tiempo agotado!**")
-                        pausa_usuario['estado'] = 'CANCELADO'
-                        pausa_usuario['motivo_cancelacion'] = 'tiempo_confirmacion_expirado'
-                        pausa_usuario['timestamp_cancelacion'] = obtener_hora_madrid().isoformat()
-                        guardar_cola_pvd_grupo(grupo_usuario, cola_grupo)
+                        actualizar_pausa_pvd(grupo_usuario, pausa_usuario['id'], {
+                            'estado': 'CANCELADO',
+                            'motivo_cancelacion': 'tiempo_confirmacion_expirado',
+                            **sello('timestamp_cancelacion', obtener_hora_madrid())
+                        })
                         
                         # Limpiar temporizador individual
                         if timer_key in st.session_state:
@@ -379,8 +265,7 @@ def mostrar_notificacion_sidebar(usuario_id, grupo_usuario):
                     if st.button("❌ Cancelar espera", 
                                key=f"sidebar_cancelar_espera_{usuario_id}_{grupo_usuario}", 
                                use_container_width=True):
-                        pausa_usuario['estado'] = 'CANCELADO'
-                        guardar_cola_pvd_grupo(grupo_usuario, cola_grupo)
+                        actualizar_pausa_pvd(grupo_usuario, pausa_usuario['id'], {'estado': 'CANCELADO'})
                         temporizador_pvd_mejorado.cancelar_temporizador(usuario_id)
                         st.rerun()
             
@@ -401,7 +286,7 @@ def mostrar_notificacion_sidebar(usuario_id, grupo_usuario):
             
             tiempo_inicio = datetime.fromisoformat(pausa_usuario['timestamp_inicio'])
             hora_actual = obtener_hora_madrid()
-            tiempo_transcurrido = int((hora_actual - tiempo_inicio).total_seconds() / 60)
+            tiempo_transcurrido = int((hora_actual.timestamp() - epoch(pausa_usuario, 'timestamp_inicio')) / 60)
             tiempo_restante = max(0, duracion_minutos - tiempo_transcurrido)
             
             # Mostrar información de pausa en curso
@@ -438,9 +323,10 @@ def mostrar_notificacion_sidebar(usuario_id, grupo_usuario):
                 if st.button("⏹️ Finalizar ahora", 
                            key=f"sidebar_finalizar_{usuario_id}_{grupo_usuario}", 
                            use_container_width=True):
-                    pausa_usuario['estado'] = 'COMPLETADO'
-                    pausa_usuario['timestamp_fin'] = obtener_hora_madrid().isoformat()
-                    guardar_cola_pvd_grupo(grupo_usuario, cola_grupo)
+                    actualizar_pausa_pvd(grupo_usuario, pausa_usuario['id'], {
+                        'estado': 'COMPLETADO',
+                        **sello('timestamp_fin', obtener_hora_madrid())
+                    })
                     
                     # Notificar al siguiente en este grupo
                     if hasattr(temporizador_pvd_mejorado, '_iniciar_siguiente_automatico_grupo'):
@@ -495,7 +381,7 @@ def verificar_turno_sidebar():
                 mes_key = f"{hoy.year}-{hoy.month:02d}"
                 
                 # Cálculo simple como fallback
-                metricas = cargar_metricas_agentes()
+                metricas = cargar_metricas_agentes(meses=[mes_key])
                 sph_objetivo = 0.07
                 if usuario_id in metricas and mes_key in metricas[usuario_id]:
                     sph_objetivo = metricas[usuario_id][mes_key].get("sph", 0.07)
@@ -518,6 +404,9 @@ def verificar_turno_sidebar():
         
         grupo_usuario = usuarios_config[usuario_id].get('grupo', 'basico')
         
+        # Relanzar la app solo cuando cambie la cola del grupo (turno, fin de pausa...)
+        refrescar_al_cambiar([grupo_usuario], clave='sidebar')
+        
         # Llamar a la función de notificación PVD
         return mostrar_notificacion_sidebar(usuario_id, grupo_usuario)
     
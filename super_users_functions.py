@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import json
 import os
 from datetime import datetime, timedelta, date
@@ -9,10 +10,13 @@ import plotly.express as px
 
 from database import (
     cargar_super_users, guardar_super_users,
-    cargar_registro_llamadas, guardar_registro_llamadas,
+    cargar_registro_llamadas, guardar_registro_llamadas, obtener_matriz_registro,
     cargar_configuracion_usuarios, cargar_config_sistema
 )
 from utils import obtener_hora_madrid, formatear_hora_madrid
+from clasificador_resultados import util_positivo
+from registro_matriz import MatrizRegistro
+import llamadas_procesadas
 
 
 # ============================================================================
@@ -439,7 +443,9 @@ def _gestionar_borrado_agente(super_users_config, agentes):
                     if agent_id in datos_dia:
                         del registro_llamadas[fecha_str][agent_id]
                 
-                guardar_registro_llamadas(registro_llamadas)
+                if guardar_registro_llamadas(registro_llamadas):
+                    # Sus llamadas se podrán volver a importar
+                    llamadas_procesadas.eliminar_agente(agent_id)
                 
                 st.success(f"✅ Agente {nombre_agente} borrado correctamente")
                 st.success(f"✅ {registros_historicos} registros históricos eliminados")
@@ -601,7 +607,9 @@ def _confirmar_reinicio_metricas():
     with col_conf_r1:
         if st.button("✅ SÍ, REINICIAR TODO", type="primary", use_container_width=True):
             registro_llamadas = {}
-            guardar_registro_llamadas(registro_llamadas)
+            if guardar_registro_llamadas(registro_llamadas):
+                # Sin registro, ninguna llamada cuenta ya como importada
+                llamadas_procesadas.vaciar()
             st.success("✅ Todas las métricas reiniciadas")
             st.session_state.confirmar_reinicio = False
             st.rerun()
@@ -778,15 +786,13 @@ def _mostrar_estadisticas_importacion(df):
     agentes_unicos = df['agente'].nunique()
     fechas_unicas = df['fecha'].nunique()
     
-    def contar_ventas_fila(row):
-        ventas = 0
-        if 'UTIL POSITIVO' in str(row.get('resultado_elec', '')).upper():
-            ventas += 1
-        if 'UTIL POSITIVO' in str(row.get('resultado_gas', '')).upper():
-            ventas += 1
-        return ventas
+    # Un UTIL POSITIVO por resultado de luz y de gas
+    ventas = pd.Series(0, index=df.index)
+    for columna in ('resultado_elec', 'resultado_gas'):
+        if columna in df.columns:
+            ventas += util_positivo(df[columna]).astype(int)
     
-    df['ventas_totales'] = df.apply(contar_ventas_fila, axis=1)
+    df['ventas_totales'] = ventas
     ventas_totales = df['ventas_totales'].sum()
     
     col_stats1, col_stats2, col_stats3, col_stats4 = st.columns(4)
@@ -992,25 +998,35 @@ def filtrar_dias_validos(agente_id, registro_llamadas, fecha_inicio, fecha_fin,
     """
     Filtra solo los días donde el agente superó el mínimo de llamadas
     
+    Los días salen de registro_llamadas (solo las entradas del agente pasan
+    a la vista columnar); con registro_llamadas=None se usa la vista
+    compartida del registro guardado (obtener_matriz_registro).
+    
     Returns:
         dict: {fecha_str: {llamadas_totales: X, llamadas_15min: Y, ventas: Z}}
     """
-    dias_validos = {}
+    if registro_llamadas is None:
+        matriz = obtener_matriz_registro()
+    else:
+        matriz = MatrizRegistro({
+            fecha: {agente_id: datos_dia[agente_id]}
+            for fecha, datos_dia in registro_llamadas.items()
+            if isinstance(datos_dia, dict) and agente_id in datos_dia
+        })
+    j = matriz.indice_agente.get(agente_id)
+    if j is None:
+        return {}
     
-    for fecha_str, datos_dia in registro_llamadas.items():
-        fecha = datetime.strptime(fecha_str, "%Y-%m-%d").date()
-        
-        if fecha_inicio <= fecha <= fecha_fin:
-            if agente_id in datos_dia:
-                datos_agente = datos_dia[agente_id]
-                llamadas_dia = datos_agente.get('llamadas_totales', 0)
-                
-                if llamadas_dia >= minimo_llamadas_dia:
-                    dias_validos[fecha_str] = {
-                        'llamadas_totales': datos_agente.get('llamadas_totales', 0),
-                        'llamadas_15min': datos_agente.get('llamadas_15min', 0),
-                        'ventas': datos_agente.get('ventas', 0)
-                    }
+    filas = matriz.rango(fecha_inicio, fecha_fin)
+    validos = matriz.dias_validos(fecha_inicio, fecha_fin, minimo_llamadas_dia)[:, j]
+    
+    dias_validos = {}
+    for i in np.flatnonzero(validos) + filas.start:
+        dias_validos[matriz.fechas[i]] = {
+            'llamadas_totales': matriz.llamadas_totales[i, j].item(),
+            'llamadas_15min': matriz.llamadas_15min[i, j].item(),
+            'ventas': matriz.ventas[i, j].item()
+        }
     
     return dias_validos
 
@@ -1130,6 +1146,16 @@ def _calcular_metricas_dias_validos(agentes, registro_llamadas, fecha_inicio, fe
     objetivos_data = cargar_objetivos_ventas()
     objetivos_dict = objetivos_data.get("objetivos", {})
     
+    # Sumas de los días válidos de todos los agentes de una vez
+    matriz = obtener_matriz_registro()
+    filas = matriz.rango(fecha_inicio, fecha_fin)
+    validos = matriz.dias_validos(fecha_inicio, fecha_fin, minimo_llamadas_dia)
+    dias_validos_por_agente = validos.sum(axis=0)
+    llamadas_totales_por_agente = np.where(validos, matriz.llamadas_totales[filas], 0).sum(axis=0)
+    llamadas_15min_por_agente = np.where(validos, matriz.llamadas_15min[filas], 0).sum(axis=0)
+    ventas_por_agente = np.where(validos, matriz.ventas[filas], 0).sum(axis=0)
+    fechas_periodo = matriz.fechas[filas]
+    
     for agent_id, info in agentes.items():
         if not info.get('activo', True):
             continue
@@ -1138,11 +1164,10 @@ def _calcular_metricas_dias_validos(agentes, registro_llamadas, fecha_inicio, fe
         grupo = info.get('grupo', 'Sin grupo')
         supervisor = info.get('supervisor', 'Sin asignar')
         
-        dias_validos_agente = filtrar_dias_validos(
-            agent_id, registro_llamadas, fecha_inicio, fecha_fin, minimo_llamadas_dia
-        )
+        j = matriz.indice_agente.get(agent_id)
+        dias_con_datos = int(dias_validos_por_agente[j]) if j is not None else 0
         
-        if not dias_validos_agente:
+        if not dias_con_datos:
             agentes_sin_dias_validos.append({
                 'id': agent_id,
                 'nombre': nombre,
@@ -1150,16 +1175,9 @@ def _calcular_metricas_dias_validos(agentes, registro_llamadas, fecha_inicio, fe
             })
             continue
         
-        llamadas_totales_agente = 0
-        llamadas_15min_agente = 0
-        ventas_agente = 0
-        
-        for fecha_str, datos_dia in dias_validos_agente.items():
-            llamadas_totales_agente += datos_dia['llamadas_totales']
-            llamadas_15min_agente += datos_dia['llamadas_15min']
-            ventas_agente += datos_dia['ventas']
-        
-        dias_con_datos = len(dias_validos_agente)
+        llamadas_totales_agente = llamadas_totales_por_agente[j].item()
+        llamadas_15min_agente = llamadas_15min_por_agente[j].item()
+        ventas_agente = ventas_por_agente[j].item()
         
         total_llamadas_totales_periodo += llamadas_totales_agente
         total_llamadas_15min_periodo += llamadas_15min_agente
@@ -1181,7 +1199,7 @@ def _calcular_metricas_dias_validos(agentes, registro_llamadas, fecha_inicio, fe
             'llamadas_15min': llamadas_15min_agente,
             'ventas': ventas_agente,
             'dias_validos': dias_con_datos,
-            'dias_validos_list': list(dias_validos_agente.keys())
+            'dias_validos_list': [fechas_periodo[i] for i in np.flatnonzero(validos[:, j])]
         })
     
     estadisticas = {
@@ -1614,24 +1632,13 @@ def _mostrar_tendencia_diaria(agentes, registro_llamadas, fecha_inicio, fecha_fi
     """Muestra la tendencia diaria de llamadas"""
     st.write("### 📅 Tendencia Diaria (Llamadas >15min)")
     
-    fechas = []
-    llamadas_diarias_15min = []
-    ventas_diarias = []
+    matriz = obtener_matriz_registro()
+    filas = matriz.rango(fecha_inicio, fecha_fin)
+    columnas = matriz.columnas(agentes)
     
-    for fecha_str in sorted(registro_llamadas.keys()):
-        fecha = datetime.strptime(fecha_str, "%Y-%m-%d").date()
-        if fecha_inicio <= fecha <= fecha_fin:
-            total_dia_llamadas_15min = 0
-            total_dia_ventas = 0
-            
-            for agent_id, datos_agente in registro_llamadas[fecha_str].items():
-                if agent_id in agentes:
-                    total_dia_llamadas_15min += datos_agente.get("llamadas_15min", 0)
-                    total_dia_ventas += datos_agente.get("ventas", 0)
-            
-            fechas.append(fecha.strftime("%d/%m"))
-            llamadas_diarias_15min.append(total_dia_llamadas_15min)
-            ventas_diarias.append(total_dia_ventas)
+    fechas = [f"{fecha_str[8:10]}/{fecha_str[5:7]}" for fecha_str in matriz.fechas[filas]]
+    llamadas_diarias_15min = matriz.llamadas_15min[filas][:, columnas].sum(axis=1).tolist()
+    ventas_diarias = matriz.ventas[filas][:, columnas].sum(axis=1).tolist()
     
     if fechas:
         df_tendencia = pd.DataFrame({
@@ -2207,12 +2214,13 @@ def _mostrar_gestion_objetivos_avanzada(agentes, context):
 def obtener_info_monitorizaciones_agentes(agentes_ids):
     """Obtiene información de monitorizaciones para una lista de agentes"""
     try:
-        from database import obtener_ultima_monitorizacion_empleado
+        from database import obtener_ultimas_monitorizaciones
         
         info_monitorizaciones = {}
+        ultimas_monitorizaciones = obtener_ultimas_monitorizaciones()
         
         for agent_id in agentes_ids:
-            ultima_mon = obtener_ultima_monitorizacion_empleado(agent_id)
+            ultima_mon = ultimas_monitorizaciones.get(str(agent_id))
             
             if ultima_mon:
                 fecha_mon = ultima_mon.get('fecha_monitorizacion', '')
@@ -2267,12 +2275,13 @@ def obtener_info_monitorizaciones_agentes(agentes_ids):
 def contar_agentes_con_monitorizacion_reciente(agentes, dias_reciente=30):
     """Cuenta agentes con monitorización reciente"""
     try:
-        from database import obtener_ultima_monitorizacion_empleado
+        from database import obtener_ultimas_monitorizaciones
         
         contador = 0
+        ultimas_monitorizaciones = obtener_ultimas_monitorizaciones()
         
         for agent_id in agentes.keys():
-            ultima_mon = obtener_ultima_monitorizacion_empleado(agent_id)
+            ultima_mon = ultimas_monitorizaciones.get(str(agent_id))
             
             if ultima_mon and ultima_mon.get('fecha_monitorizacion'):
                 try:
@@ -3349,13 +3358,15 @@ def calcular_alertas_monitorizaciones_pendientes(agentes):
     hoy = datetime.now().date()
     
     try:
-        from database import obtener_ultima_monitorizacion_empleado
+        from database import obtener_ultimas_monitorizaciones
+        
+        ultimas_monitorizaciones = obtener_ultimas_monitorizaciones()
         
         for agent_id, info in agentes.items():
             if not info.get('activo', True):
                 continue
             
-            ultima_mon = obtener_ultima_monitorizacion_empleado(agent_id)
+            ultima_mon = ultimas_monitorizaciones.get(str(agent_id))
             
             if ultima_mon and ultima_mon.get('fecha_proxima_monitorizacion'):
                 try:
@@ -4353,14 +4364,9 @@ def mostrar_panel_objetivos_sidebar():
             total_laborables_mes = obtener_total_dias_laborables_mes(fecha_inicio_mes, fecha_fin_mes)
             
             # Calcular ventas del mes actual
-            registro_llamadas = cargar_registro_llamadas()
-            
-            ventas_mes = 0
-            for fecha_str, datos_dia in registro_llamadas.items():
-                fecha = datetime.strptime(fecha_str, "%Y-%m-%d").date()
-                if fecha_inicio_mes <= fecha <= fecha_hoy:
-                    if username in datos_dia:
-                        ventas_mes += datos_dia[username].get("ventas", 0)
+            ventas_mes = obtener_matriz_registro().total_agente(
+                'ventas', username, fecha_inicio_mes, fecha_hoy
+            )
             
             # Calcular progreso
             progreso_individual = (ventas_mes / objetivo_individual * 100) if objetivo_individual > 0 else 0
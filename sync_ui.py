@@ -57,7 +57,7 @@ def show_sync_panel():
     - `config_excedentes.csv` - Precios excedentes
     - `config_pmg.json` - Configuración PMG
     - `config_sistema.json` - Configuración del sistema
-    - `monitorizaciones.json` - Datos de monitorización
+    - `monitorizaciones/` - Datos de monitorización (un archivo por mes)
     - `planes_gas.json` - Planes de gas
     - `precios_luz.csv` - Planes de electricidad
     - `registro_llamadas.json` - Datos CSV importados
@@ -187,7 +187,7 @@ def show_sync_panel():
     st.write("### ✅ Verificar Archivos Clave")
     
     archivos_importantes = {
-        "data/monitorizaciones.json": "📊 Métricas de monitorización",
+        "data/monitorizaciones/": "📊 Métricas de monitorización (un archivo por mes)",
         "data/usuarios.json": "👥 Usuarios del sistema",
         "data/precios_luz.csv": "⚡ Planes de electricidad",
         "data/planes_gas.json": "🔥 Planes de gas",
@@ -197,28 +197,39 @@ def show_sync_panel():
     for archivo, descripcion in archivos_importantes.items():
         col_check1, col_check2, col_check3 = st.columns([3, 1, 1])
         
+        # Los directorios (datos repartidos por meses) cuentan todos sus archivos
+        if archivo.endswith('/'):
+            rutas = [os.path.join(archivo, nombre) for nombre in sorted(os.listdir(archivo))] \
+                if os.path.isdir(archivo) else []
+            rutas = [ruta for ruta in rutas if os.path.isfile(ruta)]
+        else:
+            rutas = [archivo] if os.path.exists(archivo) else []
+        
         with col_check1:
-            nombre_corto = os.path.basename(archivo)
+            nombre_corto = os.path.basename(archivo.rstrip('/'))
             st.write(f"**{nombre_corto}**")
             st.caption(descripcion)
         
         with col_check2:
-            if os.path.exists(archivo):
-                size = os.path.getsize(archivo)
+            if rutas:
+                size = sum(os.path.getsize(ruta) for ruta in rutas)
                 st.success(f"✅ {size/1024:.1f} KB")
             else:
                 st.error("❌ No existe")
         
         with col_check3:
-            if os.path.exists(archivo) and archivo in changed_files:
+            pendientes = [ruta for ruta in rutas if ruta in changed_files]
+            if pendientes:
                 if st.button("⬆️", key=f"sync_{nombre_corto}"):
                     from sync_data_to_github import sync_file
-                    success, message = sync_file(archivo)
-                    if success:
+                    for ruta in pendientes:
+                        success, message = sync_file(ruta)
+                        if not success:
+                            st.error(message)
+                            break
+                    else:
                         st.success(message)
                         st.rerun()
-                    else:
-                        st.error(message)
     
     st.markdown("---")
     
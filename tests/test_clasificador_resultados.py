@@ -0,0 +1,127 @@
+import random
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("streamlit")  # llamadas_analyzer importa streamlit
+
+import clasificador_resultados as cr
+import llamadas_analyzer as la
+
+# ==============================================
+# EQUIVALENCIA CON LAS VERSIONES FILA A FILA
+# ==============================================
+#
+# ventas_resultado, ventas_resultado_mejorado y pendientes_sms deben dar
+# exactamente lo mismo que contar_ventas_resultado,
+# contar_ventas_resultado_mejorado y detectar_pendientes_sms_mejorado
+# (llamadas_analyzer) para cualquier valor que pueda traer el CSV.
+
+COLUMNAS = ['resultado_elec', 'resultado_gas', 'motivo_elec', 'motivo_gas']
+
+# Valores a mano: nulos, números, minúsculas, dúo con y sin tilde y
+# PENDIENTE SMS en resultado o en motivo
+RESULTADOS = [
+    None, float('nan'), '', ' ', 0, 1, 2.5,
+    'UTIL POSITIVO', 'util positivo', 'Util Positivo LUZ',
+    'UTIL POSITIVO LUZ GAS', 'util positivo luz y gas',
+    'UTIL POSITIVO DÚO', 'util positivo dúo', 'UTIL POSITIVO DUO', 'util positivo duo',
+    'UTIL POSITIVO PENDIENTE SMS', 'util positivo dúo pendiente sms',
+    'PENDIENTE SMS', 'pendiente sms luz gas', 'NO UTIL', 'NO UTIL DÚO',
+]
+MOTIVOS = [None, float('nan'), '', 0, 'PENDIENTE SMS', 'pendiente sms', 'OTRO MOTIVO']
+
+PIEZAS = ['UTIL POSITIVO', 'util positivo', 'PENDIENTE SMS', 'pendiente sms', 'LUZ', 'gas',
+          'GAS', 'DÚO', 'dúo', 'DUO', 'duo', ' ', 'X', 'NO UTIL', '-']
+
+
+def _valor_aleatorio(rng):
+    r = rng.random()
+    if r < 0.05:
+        return float('nan')
+    if r < 0.08:
+        return None
+    if r < 0.1:
+        return rng.choice([0, 1, 2.5])
+    if r < 0.12:
+        return ''
+    return ' '.join(rng.choice(PIEZAS) for _ in range(rng.randint(1, 4)))
+
+
+def _llamadas():
+    """Combinaciones a mano de resultado y motivo más filas aleatorias"""
+    filas = []
+    for resultado in RESULTADOS:
+        for motivo in MOTIVOS:
+            filas.append([resultado, resultado, motivo, None])
+            filas.append([None, resultado, None, motivo])
+            filas.append([resultado, 'UTIL POSITIVO', motivo, motivo])
+
+    rng = random.Random(5)
+    filas += [[_valor_aleatorio(rng) for _ in COLUMNAS] for _ in range(3000)]
+    return pd.DataFrame(filas, columns=COLUMNAS, dtype=object)
+
+
+@pytest.fixture(scope="module")
+def df():
+    return _llamadas()
+
+
+@pytest.fixture(params=["object", "category"])
+def columnas(request, df):
+    """Las columnas del CSV, como texto o categóricas (importación por bloques)"""
+    return df.astype('category') if request.param == "category" else df
+
+
+def test_ventas_resultado(df, columnas):
+    esperado = [la.contar_ventas_resultado(v) for v in df['resultado_elec']]
+    assert cr.ventas_resultado(columnas['resultado_elec']).tolist() == esperado
+
+
+def test_ventas_resultado_mejorado_con_motivo(df, columnas):
+    esperado = [la.contar_ventas_resultado_mejorado(r, m) for r, m in zip(df['resultado_gas'], df['motivo_gas'])]
+    obtenido = cr.ventas_resultado_mejorado(columnas['resultado_gas'], columnas['motivo_gas'])
+    assert obtenido.tolist() == esperado
+
+
+def test_ventas_resultado_mejorado_sin_motivo(df, columnas):
+    esperado = [la.contar_ventas_resultado_mejorado(r) for r in df['resultado_gas']]
+    assert cr.ventas_resultado_mejorado(columnas['resultado_gas']).tolist() == esperado
+
+
+def test_pendientes_sms(df, columnas):
+    esperado = [la.detectar_pendientes_sms_mejorado(fila) for _, fila in df.iterrows()]
+    tiene_pendiente, ventas = cr.pendientes_sms(
+        columnas['resultado_elec'], columnas['resultado_gas'],
+        columnas['motivo_elec'], columnas['motivo_gas']
+    )
+    assert list(zip(tiene_pendiente.tolist(), ventas.tolist())) == esperado
+
+
+@pytest.mark.parametrize("presentes", [
+    ['resultado_elec'],
+    ['resultado_gas'],
+    ['resultado_elec', 'resultado_gas'],
+    ['resultado_elec', 'motivo_gas'],
+])
+def test_pendientes_sms_columnas_que_faltan(df, presentes):
+    sub = df[presentes]
+    esperado = [la.detectar_pendientes_sms_mejorado(fila) for _, fila in sub.iterrows()]
+    tiene_pendiente, ventas = cr.pendientes_sms(
+        *(sub.get(col) for col in COLUMNAS), index=sub.index
+    )
+    assert list(zip(tiene_pendiente.tolist(), ventas.tolist())) == esperado
+
+
+def test_pendiente_sms_en_motivo_anula_la_venta():
+    resultado = pd.Series(['UTIL POSITIVO DÚO', 'UTIL POSITIVO DÚO'])
+    motivo = pd.Series(['pendiente sms', None])
+    assert cr.ventas_resultado_mejorado(resultado, motivo).tolist() == [0, 2]
+    assert cr.ventas_resultado(resultado).tolist() == [2, 2]
+
+
+def test_calcular_ventas_sin_columnas_de_motivo(df):
+    sub = df[['resultado_elec', 'resultado_gas']]
+    ventas_elec, ventas_gas = la.calcular_ventas(sub)
+    assert ventas_elec.tolist() == [la.contar_ventas_resultado_mejorado(v) for v in sub['resultado_elec']]
+    assert ventas_gas.tolist() == [la.contar_ventas_resultado_mejorado(v) for v in sub['resultado_gas']]
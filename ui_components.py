@@ -35,9 +35,9 @@ def mostrar_login():
                         
                         # Obtener objetivo
                         from agent_schedule_manager import cargar_metricas_agentes
-                        metricas = cargar_metricas_agentes()
                         hoy = datetime.now()
                         mes_key = f"{hoy.year}-{hoy.month:02d}"
+                        metricas = cargar_metricas_agentes(meses=[mes_key])
                         
                         if st.session_state.username in metricas and mes_key in metricas[st.session_state.username]:
                             sph_objetivo = metricas[st.session_state.username][mes_key].get("sph", 0.07)
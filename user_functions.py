@@ -15,7 +15,7 @@ from database import (
     cargar_config_pvd, 
     cargar_config_sistema,
     cargar_cola_pvd_grupo,
-    guardar_cola_pvd_grupo,
+    actualizar_pausa_pvd,
     obtener_todas_colas_pvd
 )
 from pvd_system import (
@@ -23,6 +23,9 @@ from pvd_system import (
     solicitar_pausa,
     crear_temporizador_html_simplificado
 )
+from pvd_lista_espera import ListaEspera
+from pvd_eta import minutos_espera_pausa
+from pvd_tiempos import sello, epoch, limites_dia, es_del_dia
 from utils import obtener_hora_madrid, formatear_hora_madrid
 
 # ==============================================
@@ -464,11 +467,10 @@ def gestion_pvd_usuario():
     espacios_disponibles_grupo = max_simultaneo_grupo - en_pausa_grupo
     
     # Calcular pausas hoy del usuario
-    hoy = obtener_hora_madrid().date()
+    hoy = limites_dia(obtener_hora_madrid())
     pausas_hoy = len([p for p in cola_grupo 
                      if p['usuario_id'] == usuario_id and 
-                     'timestamp_solicitud' in p and
-                     datetime.fromisoformat(p['timestamp_solicitud']).date() == hoy and
+                     es_del_dia(p, 'timestamp_solicitud', hoy) and
                      p['estado'] != 'CANCELADO'])
     
     col_stats1, col_stats2, col_stats3, col_stats4 = st.columns(4)
@@ -499,21 +501,13 @@ def gestion_pvd_usuario():
 def _mostrar_pausa_activa_usuario(pausa, cola_grupo, grupo_usuario, config_grupo, espacios_disponibles):
     """Muestra información de pausa activa del usuario"""
     estado_display = ESTADOS_PVD_USUARIO.get(pausa['estado'], pausa['estado'])
-    
-    usuario_id = st.session_state.username
 
     if pausa['estado'] == 'ESPERANDO':
         st.warning(f"⏳ **Tienes una pausa solicitada** - Grupo: {grupo_usuario}")
         
         # Calcular posición en el grupo
-        en_espera_grupo = [p for p in cola_grupo if p['estado'] == 'ESPERANDO']
-        en_espera_grupo = sorted(en_espera_grupo, key=lambda x: datetime.fromisoformat(x['timestamp_solicitud']))
-        
-        posicion = 1
-        for i, pausa_item in enumerate(en_espera_grupo):
-            if pausa_item['id'] == pausa['id']:
-                posicion = i + 1
-                break
+        en_espera_grupo = ListaEspera(cola_grupo)
+        posicion = en_espera_grupo.posicion(pausa['id']) or 1
         
         with st.expander("📊 Información de tu pausa en espera", expanded=True):
             col_info1, col_info2, col_info3, col_info4 = st.columns(4)
@@ -525,7 +519,7 @@ def _mostrar_pausa_activa_usuario(pausa, cola_grupo, grupo_usuario, config_grupo
                 st.metric("Espacios libres", espacios_disponibles)
             with col_info4:
                 # Calcular tiempo estimado
-                tiempo_estimado = _calcular_tiempo_estimado_grupo(cola_grupo, grupo_usuario, usuario_id, config_grupo)
+                tiempo_estimado = minutos_espera_pausa(grupo_usuario, pausa['id'])
                 if tiempo_estimado is None:
                     st.metric("Tiempo estimado", "N/A")
                 elif tiempo_estimado == 0:
@@ -542,8 +536,7 @@ def _mostrar_pausa_activa_usuario(pausa, cola_grupo, grupo_usuario, config_grupo
             else:
                 # Botón para cancelar si no es su turno
                 if st.button("❌ Cancelar mi pausa", type="secondary", use_container_width=True, key="cancelar_pausa_espera"):
-                    pausa['estado'] = 'CANCELADO'
-                    guardar_cola_pvd_grupo(grupo_usuario, cola_grupo)
+                    actualizar_pausa_pvd(grupo_usuario, pausa['id'], {'estado': 'CANCELADO'})
                     temporizador_pvd_mejorado.cancelar_temporizador(st.session_state.username)
                     st.success("✅ Pausa cancelada")
                     st.rerun()
@@ -556,7 +549,7 @@ def _mostrar_pausa_activa_usuario(pausa, cola_grupo, grupo_usuario, config_grupo
         
         tiempo_inicio = datetime.fromisoformat(pausa['timestamp_inicio'])
         hora_actual = obtener_hora_madrid()
-        tiempo_transcurrido = int((hora_actual - tiempo_inicio).total_seconds() / 60)
+        tiempo_transcurrido = int((hora_actual.timestamp() - epoch(pausa, 'timestamp_inicio')) / 60)
         tiempo_restante = max(0, duracion_minutos - tiempo_transcurrido)
         
         progreso = min(100, (tiempo_transcurrido / duracion_minutos) * 100)
@@ -576,9 +569,10 @@ def _mostrar_pausa_activa_usuario(pausa, cola_grupo, grupo_usuario, config_grupo
         
         # Botón para finalizar manualmente
         if st.button("✅ Finalizar pausa ahora", type="primary", key="finish_pause_now", use_container_width=True):
-            pausa['estado'] = 'COMPLETADO'
-            pausa['timestamp_fin'] = obtener_hora_madrid().isoformat()
-            guardar_cola_pvd_grupo(grupo_usuario, cola_grupo)
+            actualizar_pausa_pvd(grupo_usuario, pausa['id'], {
+                'estado': 'COMPLETADO',
+                **sello('timestamp_fin', obtener_hora_madrid())
+            })
             temporizador_pvd_mejorado._iniciar_siguiente_automatico_grupo(grupo_usuario)
             st.success("✅ Pausa completada manualmente")
             st.rerun()
@@ -633,9 +627,11 @@ def _mostrar_confirmacion_turno(pausa, cola_grupo, grupo_usuario):
         st.error("⏰ **¡TIEMPO AGOTADO!** No confirmaste en 7 minutos")
         
         # Cancelar pausa automáticamente
-        pausa['estado'] = 'CANCELADO'
-        pausa['motivo_cancelacion'] = 'tiempo_confirmacion_expirado'
-        pausa['timestamp_cancelacion'] = obtener_hora_madrid().isoformat()
+        actualizar_pausa_pvd(grupo_usuario, pausa['id'], {
+            'estado': 'CANCELADO',
+            'motivo_cancelacion': 'tiempo_confirmacion_expirado',
+            **sello('timestamp_cancelacion', obtener_hora_madrid())
+        })
         
         # Limpiar temporizador
         temporizador_pvd_mejorado.cancelar_temporizador(st.session_state.username)
@@ -644,9 +640,6 @@ def _mostrar_confirmacion_turno(pausa, cola_grupo, grupo_usuario):
         if timer_key in st.session_state:
             del st.session_state[timer_key]
         
-        # Guardar cambios
-        guardar_cola_pvd_grupo(grupo_usuario, cola_grupo)
-        
         # Iniciar siguiente automáticamente
         temporizador_pvd_mejorado._iniciar_siguiente_automatico_grupo(grupo_usuario)
         
@@ -662,17 +655,16 @@ def _mostrar_confirmacion_turno(pausa, cola_grupo, grupo_usuario):
                    key=f"confirmar_pausa_si_{pausa['id']}"):
             
             # Iniciar pausa SOLO SI EL USUARIO CONFIRMA
-            pausa['estado'] = 'EN_CURSO'
-            pausa['timestamp_inicio'] = obtener_hora_madrid().isoformat()
-            pausa['confirmado'] = True
+            actualizar_pausa_pvd(grupo_usuario, pausa['id'], {
+                'estado': 'EN_CURSO',
+                **sello('timestamp_inicio', obtener_hora_madrid()),
+                'confirmado': True
+            })
             
             # Limpiar estado de confirmación
             if timer_key in st.session_state:
                 del st.session_state[timer_key]
             
-            # Guardar cambios
-            guardar_cola_pvd_grupo(grupo_usuario, cola_grupo)
-            
             st.success("✅ **Pausa confirmada e iniciada.** ¡Disfruta de tu descanso!")
             st.rerun()
     
@@ -682,8 +674,10 @@ def _mostrar_confirmacion_turno(pausa, cola_grupo, grupo_usuario):
                    use_container_width=True,
                    key=f"cancelar_turno_no_{pausa['id']}"):
             
-            pausa['estado'] = 'CANCELADO'
-            pausa['motivo_cancelacion'] = 'usuario_rechazo'
+            actualizar_pausa_pvd(grupo_usuario, pausa['id'], {
+                'estado': 'CANCELADO',
+                'motivo_cancelacion': 'usuario_rechazo'
+            })
             
             # Limpiar temporizador
             temporizador_pvd_mejorado.cancelar_temporizador(st.session_state.username)
@@ -692,9 +686,6 @@ def _mostrar_confirmacion_turno(pausa, cola_grupo, grupo_usuario):
             if timer_key in st.session_state:
                 del st.session_state[timer_key]
             
-            # Guardar cambios
-            guardar_cola_pvd_grupo(grupo_usuario, cola_grupo)
-            
             st.warning("❌ **Turno cancelado.** Has sido eliminado de la cola.")
             st.rerun()
 
@@ -754,182 +745,6 @@ def _mostrar_formulario_solicitud_pausa(config_pvd, cola_grupo, grupo_usuario, p
                 st.success("✅ Pausa solicitada. Estás en la cola de tu grupo.")
                 st.rerun()
 
-def _calcular_tiempo_estimado_grupo(cola_grupo, grupo_id, usuario_id, config_grupo):
-    """Calcula tiempo estimado REAL basado en horas de finalización de pausas en curso"""
-    try:
-        # 1. Encontrar la pausa del usuario en ESPERANDO
-        pausa_usuario = None
-        for pausa in cola_grupo:
-            if pausa['usuario_id'] == usuario_id and pausa['estado'] == 'ESPERANDO':
-                pausa_usuario = pausa
-                break
-        
-        if not pausa_usuario:
-            return None  # Usuario no tiene pausa en espera
-        
-        # 2. Encontrar posición en la cola de ESPERANDO
-        en_espera_grupo = [p for p in cola_grupo if p['estado'] == 'ESPERANDO']
-        en_espera_grupo = sorted(en_espera_grupo, key=lambda x: datetime.fromisoformat(x['timestamp_solicitud']))
-        
-        posicion = None
-        for i, pausa in enumerate(en_espera_grupo):
-            if pausa['id'] == pausa_usuario['id']:
-                posicion = i + 1
-                break
-        
-        if posicion is None:
-            return None
-        
-        # 3. Calcular espacios disponibles en el grupo
-        en_pausa_grupo = len([p for p in cola_grupo if p['estado'] == 'EN_CURSO'])
-        max_simultaneo = config_grupo.get('maximo_simultaneo', 2)
-        espacios_disponibles = max_simultaneo - en_pausa_grupo
-        
-        # 4. Si hay espacios disponibles y eres el primero, puedes entrar ahora
-        if posicion == 1 and espacios_disponibles > 0:
-            return 0  # ¡Puede entrar inmediatamente!
-        
-        # 5. Si no hay espacios disponibles, calcular cuándo se liberará el próximo espacio
-        if espacios_disponibles == 0:
-            # Buscar la pausa EN_CURSO que terminará primero
-            ahora = obtener_hora_madrid()
-            proximo_termino = None
-            
-            for pausa in cola_grupo:
-                if pausa['estado'] == 'EN_CURSO' and 'timestamp_inicio' in pausa:
-                    tiempo_inicio = datetime.fromisoformat(pausa['timestamp_inicio'])
-                    duracion_elegida = pausa.get('duracion_elegida', 'corta')
-                    
-                    # Obtener duración según configuración del grupo
-                    if duracion_elegida == 'corta':
-                        duracion_minutos = config_grupo.get('duracion_corta', 5)
-                    else:
-                        duracion_minutos = config_grupo.get('duracion_larga', 10)
-                    
-                    # Calcular cuándo termina
-                    tiempo_fin = tiempo_inicio + timedelta(minutes=duracion_minutos)
-                    
-                    # Si aún no ha terminado
-                    if tiempo_fin > ahora:
-                        minutos_restantes = (tiempo_fin - ahora).total_seconds() / 60
-                        
-                        # Guardar el tiempo más corto
-                        if proximo_termino is None or minutos_restantes < proximo_termino:
-                            proximo_termino = minutos_restantes
-            
-            if proximo_termino is not None:
-                # Si eres el primero en espera, entrarás cuando se libere el primer espacio
-                if posicion == 1:
-                    return int(proximo_termino)
-                else:
-                    # Si hay más personas delante, cada una ocupará un espacio por duración completa
-                    # Calcular cuántas "vueltas" necesitas esperar
-                    personas_delante = posicion - 1
-                    
-                    # Cada persona delante toma una pausa completa
-                    # Necesitamos estimar la duración promedio
-                    duracion_corta = config_grupo.get('duracion_corta', 5)
-                    duracion_larga = config_grupo.get('duracion_larga', 10)
-                    duracion_promedio = (duracion_corta + duracion_larga) / 2
-                    
-                    # El tiempo total es: 
-                    # - Tiempo hasta que se libere el primer espacio (proximo_termino)
-                    # - Más el tiempo de las personas delante (cada una toma ~duracion_promedio minutos)
-                    # Pero debemos considerar que solo max_simultaneo personas pueden estar en pausa a la vez
-                    
-                    # Personas que entrarán en la primera "ronda" después de que se libere espacio
-                    personas_en_primera_ronda = min(personas_delante, max_simultaneo)
-                    
-                    # Tiempo estimado = tiempo para liberar espacio + (posicion-1) * duracion_promedio / max_simultaneo
-                    tiempo_estimado = proximo_termino + (personas_delante * duracion_promedio / max_simultaneo)
-                    
-                    return max(1, int(tiempo_estimado))
-        
-        # 6. Si hay espacios disponibles pero no eres el primero
-        if espacios_disponibles > 0 and posicion > 1:
-            # Las personas delante entrarán primero
-            # Calcular duración promedio
-            duracion_corta = config_grupo.get('duracion_corta', 5)
-            duracion_larga = config_grupo.get('duracion_larga', 10)
-            duracion_promedio = (duracion_corta + duracion_larga) / 2
-            
-            # Personas delante que entrarán antes que tú
-            personas_que_entran_antes = min(posicion - 1, espacios_disponibles)
-            
-            # Cada persona tomará aproximadamente duracion_promedio minutos
-            tiempo_estimado = personas_que_entran_antes * duracion_promedio
-            
-            return max(1, int(tiempo_estimado))
-        
-        # 7. Si no se pudo calcular, devolver estimación por defecto
-        return 5  # Valor por defecto seguro
-        
-    except Exception as e:
-        print(f"Error calculando tiempo estimado REAL para grupo {grupo_id}: {e}")
-        # Fallback: estimación simple
-        return _calcular_estimacion_simple(cola_grupo, grupo_id, usuario_id, config_grupo)
-
-def _calcular_estimacion_simple(cola_grupo, grupo_id, usuario_id, config_grupo):
-    """Estimación simple de fallback"""
-    try:
-        # Encontrar posición del usuario
-        en_espera_grupo = [p for p in cola_grupo if p['estado'] == 'ESPERANDO']
-        en_espera_grupo = sorted(en_espera_grupo, key=lambda x: datetime.fromisoformat(x['timestamp_solicitud']))
-        
-        posicion = None
-        for i, pausa in enumerate(en_espera_grupo):
-            if pausa['usuario_id'] == usuario_id:
-                posicion = i + 1
-                break
-        
-        if posicion is None:
-            return None
-        
-        # Contar pausas en curso
-        en_pausa_grupo = len([p for p in cola_grupo if p['estado'] == 'EN_CURSO'])
-        max_simultaneo = config_grupo.get('maximo_simultaneo', 2)
-        
-        if posicion == 1 and en_pausa_grupo < max_simultaneo:
-            return 0
-        
-        # Ver pausas en curso y sus tiempos restantes
-        ahora = obtener_hora_madrid()
-        tiempos_restantes = []
-        
-        for pausa in cola_grupo:
-            if pausa['estado'] == 'EN_CURSO' and 'timestamp_inicio' in pausa:
-                tiempo_inicio = datetime.fromisoformat(pausa['timestamp_inicio'])
-                duracion_elegida = pausa.get('duracion_elegida', 'corta')
-                duracion_minutos = config_grupo['duracion_corta'] if duracion_elegida == 'corta' else config_grupo['duracion_larga']
-                
-                tiempo_fin = tiempo_inicio + timedelta(minutes=duracion_minutos)
-                
-                if tiempo_fin > ahora:
-                    minutos_restantes = max(0, (tiempo_fin - ahora).total_seconds() / 60)
-                    tiempos_restantes.append(minutos_restantes)
-        
-        # Ordenar tiempos restantes
-        tiempos_restantes.sort()
-        
-        # Calcular estimación basada en posición
-        personas_delante = posicion - 1
-        
-        if personas_delante < len(tiempos_restantes):
-            # El usuario entrará cuando se libere uno de los espacios actuales
-            return int(tiempos_restantes[personas_delante])
-        else:
-            # Necesita esperar más tiempo
-            duracion_promedio = (config_grupo.get('duracion_corta', 5) + config_grupo.get('duracion_larga', 10)) / 2
-            espacios_faltantes = personas_delante - len(tiempos_restantes)
-            tiempo_adicional = (espacios_faltantes / max_simultaneo) * duracion_promedio
-            
-            tiempo_base = tiempos_restantes[-1] if tiempos_restantes else 0
-            return int(tiempo_base + tiempo_adicional)
-            
-    except Exception as e:
-        print(f"Error en estimación simple para {usuario_id}: {e}")
-        return 5  # Valor por defecto seguro
-
 def _mostrar_info_sistema_pvd():
     """Muestra información sobre el sistema PVD"""
     st.markdown("---")
@@ -984,10 +799,7 @@ def mostrar_temporizador_pvd_usuario():
         
         if pausa_usuario:
             # Verificar si es el primero en la cola
-            en_espera_grupo = [p for p in cola_grupo if p['estado'] == 'ESPERANDO']
-            en_espera_grupo = sorted(en_espera_grupo, key=lambda x: datetime.fromisoformat(x['timestamp_solicitud']))
-            
-            if en_espera_grupo and en_espera_grupo[0]['id'] == pausa_usuario['id']:
+            if ListaEspera(cola_grupo).es_primero(pausa_usuario['id']):
                 # Verificar si hay espacio en el grupo
                 config_sistema = cargar_config_sistema()
                 grupos_config = config_sistema.get('grupos_pvd', {})